@@ -0,0 +1,267 @@
+"""
+Affordability search: every listing an applicant can afford.
+
+``affordability`` applies the credit rules in ``credit.py`` to applicant
+profiles (score, salary, monthly debt) plus a down payment and loan term.
+The tier gives the rate, and the payment left under ``AFFORDABLE_DTI`` of
+monthly income gives the largest loan, so the maximum purchase price is
+that loan plus the down payment. A declined applicant can only pay cash, up
+to the down payment.
+
+``PriceIndex`` keeps the listing cache ordered by price, overall and within
+each ZIP code and property type. The listings at or under a price are then a
+prefix found with one ``searchsorted`` (one per ZIP when filtering by ZIP),
+and bed filters are masks over that prefix. Monthly payments are one array
+expression over the returned page. ``search_many`` prices a whole batch of
+profiles at once and counts each one's matches with a single
+``searchsorted`` over the filtered prices.
+
+    python affordability.py applicants.csv -o affordable.csv [--zip 07424,07001] [--min-beds 3]
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from amortization import annuity_factors, monthly_payment
+from credit import AFFORDABLE_DTI, INVALID_NUMBER, NEGATIVE_VALUE, parse_applicant, score_applicants
+
+DEFAULT_TERM_YEARS = 30
+MAX_TERM_YEARS = 50
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def parse_profile(values):
+    """Validated profile from a mapping of strings, as ``check_credit`` validates its form.
+
+    Raises ``ValueError`` with the message to show the user.
+    """
+    credit_score, salary, monthly_debt, _ = parse_applicant({
+        'credit_score': values.get('credit_score'), 'salary': values.get('salary'),
+        'monthly_debt': values.get('monthly_debt'), 'loan_amount': '0'})
+    try:
+        down_payment = float(values.get('down_payment') or 0)
+        loan_term = float(values.get('loan_term') or DEFAULT_TERM_YEARS)
+    except (TypeError, ValueError):
+        raise ValueError(INVALID_NUMBER)
+    if not all(math.isfinite(v) for v in (salary, monthly_debt, down_payment, loan_term)):
+        raise ValueError(INVALID_NUMBER)
+    if down_payment < 0:
+        raise ValueError(NEGATIVE_VALUE)
+    if not 1 <= loan_term <= MAX_TERM_YEARS:
+        raise ValueError(f"loan_term must be between 1 and {MAX_TERM_YEARS} years")
+    return {'credit_score': credit_score, 'salary': salary, 'monthly_debt': monthly_debt,
+            'down_payment': down_payment, 'loan_term': loan_term}
+
+
+def affordability(credit_score, salary, monthly_debt, down_payment, loan_term):
+    """Maximum purchase price and loan terms for arrays of profiles."""
+    salary = np.asarray(salary, dtype=float)
+    monthly_debt = np.asarray(monthly_debt, dtype=float)
+    down_payment = np.asarray(down_payment, dtype=float)
+    term_months = np.round(np.asarray(loan_term, dtype=float) * 12).astype(np.int64)
+
+    scored = score_applicants(credit_score, salary, monthly_debt, np.zeros(len(salary)))
+    approved = scored['loan_approved']
+    max_payment = np.where(approved, np.maximum(salary / 12 * AFFORDABLE_DTI - monthly_debt, 0.0), 0.0)
+    max_loan = max_payment / annuity_factors(scored['interest_rate'], term_months)
+    return {
+        'loan_approved': approved,
+        'interest_rate': scored['interest_rate'],
+        'dti': scored['dti'],
+        'term_months': term_months,
+        'down_payment': down_payment,
+        'max_monthly_payment': max_payment,
+        'max_loan': max_loan,
+        'max_price': max_loan + down_payment,
+    }
+
+
+def _profile(afford, i):
+    return {
+        'loan_approved': bool(afford['loan_approved'][i]),
+        'interest_rate': float(afford['interest_rate'][i]),
+        'dti': float(afford['dti'][i]),
+        'term_months': int(afford['term_months'][i]),
+        'down_payment': float(afford['down_payment'][i]),
+        'max_monthly_payment': round(float(afford['max_monthly_payment'][i]), 2),
+        'max_loan': round(float(afford['max_loan'][i]), 2),
+        'max_price': round(float(afford['max_price'][i]), 2),
+    }
+
+
+class PriceIndex:
+    """Listing cache rows sorted by price, overall and per ZIP and type."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.version = columns.manifest.get('version')
+        price = np.asarray(columns.price, dtype=float)
+        valid = np.flatnonzero(np.isfinite(price) & (price > 0))
+        # Everything below is indexed by position in price order
+        self.rows = valid[np.argsort(price[valid], kind='stable')]
+        self.prices = price[self.rows]
+        self.beds = np.asarray(columns.beds)[self.rows]
+        self.zipcodes = np.asarray(columns.zipcode)[self.rows]
+        self.types = np.asarray(columns.type)[self.rows]
+        self.groups = {'zip': self._group(self.zipcodes), 'type': self._group(self.types)}
+
+    def _group(self, keys):
+        # A stable sort by key keeps each key's positions in price order
+        order = np.argsort(keys, kind='stable')
+        unique, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        ranges = {key.decode(): (int(start), int(end)) for key, start, end in zip(unique, starts, ends)}
+        return order, self.prices[order], ranges
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _range(self, group, key, min_price, max_price):
+        order, prices, ranges = self.groups[group]
+        if key not in ranges:
+            return order[:0]
+        start, end = ranges[key]
+        within = prices[start:end]
+        return order[start + np.searchsorted(within, min_price, side='left'):
+                     start + np.searchsorted(within, max_price, side='right')]
+
+    def candidates(self, max_price=np.inf, zips=None, kind=None, min_beds=None, max_beds=None, min_price=0.0):
+        """Positions (in ascending price order) of listings priced in
+        ``[min_price, max_price]`` that pass the filters."""
+        if zips:
+            positions = np.sort(np.concatenate([self._range('zip', key, min_price, max_price) for key in zips]))
+        elif kind is not None:
+            positions = self._range('type', kind, min_price, max_price)
+        else:
+            # A contiguous range: filter through slices rather than gathers
+            positions = slice(np.searchsorted(self.prices, min_price, side='left'),
+                              np.searchsorted(self.prices, max_price, side='right'))
+        keep = None
+        if zips and kind is not None:
+            keep = self.types[positions] == kind.encode('utf-8')
+        if min_beds is not None:
+            keep = (self.beds[positions] >= min_beds) & (True if keep is None else keep)
+        if max_beds is not None:
+            keep = (self.beds[positions] <= max_beds) & (True if keep is None else keep)
+
+        if isinstance(positions, slice):
+            if keep is None:
+                return np.arange(positions.start, positions.stop)
+            return positions.start + np.flatnonzero(keep)
+        return positions if keep is None else positions[keep]
+
+    def listings(self, positions, afford, i):
+        """Listing records for ``positions`` with profile ``i``'s loan and payment."""
+        columns = self.columns
+        rows = self.rows[positions]
+        prices = self.prices[positions]
+        if afford['loan_approved'][i]:
+            loans = np.maximum(prices - afford['down_payment'][i], 0.0)
+            payments = monthly_payment(loans, afford['interest_rate'][i], afford['term_months'][i])
+        else:
+            loans = payments = np.zeros(len(prices))
+        return [{
+            'id': columns.property_id[row].decode(),
+            'address': columns.address[row],
+            'price': price,
+            'beds': None if math.isnan(beds) else beds,
+            'baths': None if math.isnan(baths) else baths,
+            'zipcode': columns.zipcode[row].decode(),
+            'type': columns.type[row].decode(),
+            'lat': None if math.isnan(lat) else lat,
+            'lon': None if math.isnan(lon) else lon,
+            'loan_amount': round(loan, 2),
+            'monthly_payment': round(payment, 2),
+        } for row, price, beds, baths, lat, lon, loan, payment in zip(
+            rows.tolist(), prices.tolist(), np.asarray(columns.beds[rows]).tolist(),
+            np.asarray(columns.baths[rows]).tolist(), np.asarray(columns.lat[rows]).tolist(),
+            np.asarray(columns.lon[rows]).tolist(), loans.tolist(), payments.tolist())]
+
+    def search(self, profile, limit=DEFAULT_LIMIT, offset=0, descending=True, **filters):
+        """Every listing ``profile`` (from ``parse_profile``) can afford.
+
+        Returns the profile's limits, the ``total`` number of matches and one
+        page of them, most expensive first unless ``descending`` is False.
+        """
+        afford = affordability(*([profile[name]] for name in
+                                 ('credit_score', 'salary', 'monthly_debt', 'down_payment', 'loan_term')))
+        positions = self.candidates(afford['max_price'][0], **filters)
+        ordered = positions[::-1] if descending else positions
+        return {
+            'profile': _profile(afford, 0),
+            'total': len(positions),
+            'listings': self.listings(ordered[offset:offset + limit], afford, 0),
+        }
+
+    def search_many(self, profiles, limit=0, **filters):
+        """``search`` for many profiles against one set of filters.
+
+        Every profile's price cap, and its count of matches, is computed in
+        one pass; ``limit`` adds each profile's most expensive matches.
+        """
+        afford = affordability(*(np.array([profile[name] for profile in profiles]) for name in
+                                 ('credit_score', 'salary', 'monthly_debt', 'down_payment', 'loan_term')))
+        positions = self.candidates(np.inf, **filters)
+        counts = np.searchsorted(self.prices[positions], afford['max_price'], side='right')
+        results = []
+        for i, count in enumerate(counts.tolist()):
+            result = {'profile': _profile(afford, i), 'total': count}
+            if limit:
+                result['listings'] = self.listings(positions[max(count - limit, 0):count][::-1], afford, i)
+            results.append(result)
+        return results
+
+
+def main(argv=None):
+    import csv
+    from listing_cache import open_listings, DATASET
+
+    parser = argparse.ArgumentParser(description="Count the listings each applicant can afford.")
+    parser.add_argument('input', help="applicant CSV: credit_score, salary, monthly_debt "
+                                      "[, down_payment, loan_term]")
+    parser.add_argument('-o', '--output', required=True, help="CSV to write")
+    parser.add_argument('--listings', default=DATASET)
+    parser.add_argument('--zip', help="comma-separated ZIP codes")
+    parser.add_argument('--type', help="property type, e.g. single_family")
+    parser.add_argument('--min-beds', type=float)
+    parser.add_argument('--max-beds', type=float)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = PriceIndex(open_listings(args.listings))
+    built = time.perf_counter()
+
+    with open(args.input, newline='') as f:
+        applicants = list(csv.DictReader(f))
+    profiles, errors = [], {}
+    for i, applicant in enumerate(applicants):
+        try:
+            profiles.append(parse_profile(applicant))
+        except ValueError as e:
+            errors[i] = str(e)
+    zips = [z.strip().zfill(5) for z in args.zip.split(',') if z.strip()] if args.zip else None
+    results = iter(index.search_many(profiles, zips=zips, kind=args.type,
+                                     min_beds=args.min_beds, max_beds=args.max_beds))
+
+    header = ['row', 'loan_approved', 'interest_rate', 'max_monthly_payment', 'max_loan', 'max_price',
+              'affordable_listings', 'error']
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, header)
+        writer.writeheader()
+        for i in range(len(applicants)):
+            if i in errors:
+                writer.writerow({'row': i, 'error': errors[i]})
+                continue
+            result = next(results)
+            writer.writerow(dict({name: result['profile'][name] for name in header[1:6]},
+                                 row=i, affordable_listings=result['total']))
+    print(f"✅ {len(profiles):,} applicants ({len(errors):,} invalid) against {len(index):,} listings "
+          f"in {time.perf_counter() - built:.2f}s (index {built - started:.2f}s): {args.output}")
+
+
+if __name__ == "__main__":
+    main()
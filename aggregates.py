@@ -0,0 +1,263 @@
+"""
+Materialized market statistics per ZIP code and per county.
+
+``MarketAggregates`` keeps, for every ZIP (``zipcode``) and county
+(``location/county/fips_code``), the listing count, running sums and
+mergeable quantile sketches (``sketch.py``) of list price, price per bed,
+price per square foot and price-reduction amount. Every statistic is a sum,
+so a new listing cache build is applied by subtracting the rows that
+disappeared or changed and adding the new ones (``listing_cache.diff_rows``)
+instead of recomputing from scratch. Quantiles are within
+``RELATIVE_ACCURACY`` of the exact values; counts and means are exact.
+
+    python aggregates.py [updated_dataset.csv] [--level county] [-o market.json]
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from listing_cache import diff_rows
+from sketch import QuantileSketch
+
+# Area level -> listing cache column holding its key
+LEVELS = {'zip': 'zipcode', 'county': 'fips'}
+
+# Sketch range per metric; values under the minimum are counted as zero
+SKETCHES = {
+    'price': (1e3, 1e9),
+    'price_per_bed': (1e2, 1e9),
+    'price_per_sqft': (1.0, 1e5),
+    'price_reduced': (1.0, 1e8),
+}
+RELATIVE_ACCURACY = 0.01
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+# Running sums per area, one column each; means are a sum over its count
+TOTALS = ['listings', 'price', 'bed_listings', 'price_per_bed', 'sqft_listings',
+          'price_per_sqft', 'reduced_listings', 'price_reduced', 'reduction_pct']
+
+
+class _Level:
+    """Totals and sketches for every area of one level, one row per area."""
+
+    def __init__(self):
+        self.keys = []
+        self.rows = {}
+        self.totals = np.zeros((0, len(TOTALS)))
+        self.sketches = {metric: QuantileSketch(0, RELATIVE_ACCURACY, low, high)
+                         for metric, (low, high) in SKETCHES.items()}
+
+    def row_ids(self, keys):
+        unique, inverse = np.unique(keys, return_inverse=True)
+        ids = np.empty(len(unique), dtype=np.int64)
+        for i, key in enumerate(unique):
+            key = key.decode() if isinstance(key, bytes) else str(key)
+            if key not in self.rows:
+                self.rows[key] = len(self.keys)
+                self.keys.append(key)
+            ids[i] = self.rows[key]
+        extra = len(self.keys) - len(self.totals)
+        if extra > 0:
+            self.totals = np.vstack([self.totals, np.zeros((extra, len(TOTALS)))])
+            for sketch in self.sketches.values():
+                sketch.resize(len(self.keys))
+        return ids[inverse]
+
+    def add(self, keys, totals, values, weight):
+        if not len(keys):
+            return
+        rows = self.row_ids(keys)
+        np.add.at(self.totals, rows, weight * totals)
+        # Sums of removed prices don't cancel exactly; reset areas with no listings left
+        touched = np.unique(rows)
+        self.totals[touched[self.totals[touched, 0] <= 0]] = 0
+        for metric, sketch in self.sketches.items():
+            sketch.add(values[metric], rows, weight)
+
+    def to_dict(self):
+        return {'keys': self.keys, 'totals': self.totals.tolist(),
+                'sketches': {metric: sketch.to_dict() for metric, sketch in self.sketches.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        level = cls()
+        level.keys = list(data['keys'])
+        level.rows = {key: i for i, key in enumerate(level.keys)}
+        level.totals = np.asarray(data['totals'], dtype=float).reshape(len(level.keys), len(TOTALS))
+        level.sketches = {metric: QuantileSketch.from_dict(sketch) for metric, sketch in data['sketches'].items()}
+        return level
+
+
+def _rounded(value, digits=2):
+    value = float(value)
+    return round(value, digits) if np.isfinite(value) else None
+
+
+def _stats(total, count, quantiles):
+    stats = {'mean': _rounded(total / count) if count else None}
+    for q, value in zip(QUANTILES, quantiles):
+        stats[f"p{round(q * 100)}"] = _rounded(value)
+    return stats
+
+
+class MarketAggregates:
+    """ZIP and county market statistics over a listing cache build."""
+
+    def __init__(self):
+        self.levels = {level: _Level() for level in LEVELS}
+        self.version = None
+        self.updated_at = None
+        self._columns = None
+
+    @classmethod
+    def from_columns(cls, columns):
+        aggregates = cls()
+        aggregates.add(columns)
+        aggregates._attach(columns)
+        return aggregates
+
+    def _attach(self, columns):
+        self._columns = columns
+        self.version = columns.manifest.get('version')
+        self.updated_at = time.time()
+
+    def add(self, columns, rows=None, weight=1):
+        """Add listing cache ``rows`` (all when omitted); ``weight=-1`` removes them."""
+        rows = slice(None) if rows is None else rows
+
+        def column(name):
+            return np.asarray(getattr(columns, name)[rows], dtype=float)
+
+        price, beds, sqft, reduced = column('price'), column('beds'), column('sqft'), column('price_reduced')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_bed = np.where(beds > 0, price / beds, np.nan)
+            per_sqft = np.where(sqft > 0, price / sqft, np.nan)
+            reduced = np.where(reduced > 0, reduced, np.nan)
+            # Reduction as a share of the price before it was cut
+            reduction_pct = 100 * reduced / (price + reduced)
+        values = {'price': price, 'price_per_bed': per_bed, 'price_per_sqft': per_sqft, 'price_reduced': reduced}
+        totals = np.column_stack([
+            np.ones(len(price)), price,
+            ~np.isnan(per_bed), np.nan_to_num(per_bed),
+            ~np.isnan(per_sqft), np.nan_to_num(per_sqft),
+            ~np.isnan(reduced), np.nan_to_num(reduced), np.nan_to_num(reduction_pct),
+        ])
+
+        for level, name in LEVELS.items():
+            keys = np.asarray(getattr(columns, name)[rows])
+            keep = keys != b''
+            self.levels[level].add(keys[keep], totals[keep],
+                                   {metric: v[keep] for metric, v in values.items()}, weight)
+
+    def refresh(self, columns):
+        """Apply a new listing cache build. Returns ``(added, removed)`` row counts.
+
+        Only rows whose hash changed are touched. Without the previous build
+        (e.g. after loading a saved copy for another version) everything is
+        rebuilt instead.
+        """
+        if self._columns is None:
+            self.levels = {level: _Level() for level in LEVELS}
+            self.add(columns)
+            self._attach(columns)
+            return len(columns), 0
+        removed, added = diff_rows(self._columns.row_hash, columns.row_hash)
+        self.add(self._columns, removed, weight=-1)
+        self.add(columns, added)
+        self._attach(columns)
+        return len(added), len(removed)
+
+    def areas(self, level, key=None, min_listings=1):
+        """Statistics for every area of ``level`` (or just ``key``), sorted by key."""
+        data = self.levels[level]
+        if key is not None:
+            rows = [data.rows[key]] if key in data.rows else []
+        else:
+            rows = sorted(range(len(data.keys)), key=data.keys.__getitem__)
+        rows = np.array([row for row in rows if data.totals[row, 0] >= max(min_listings, 1)], dtype=np.int64)
+        quantiles = {metric: sketch.quantiles(QUANTILES, rows) for metric, sketch in data.sketches.items()}
+
+        areas = []
+        for i, row in enumerate(rows):
+            totals = dict(zip(TOTALS, data.totals[row]))
+            listings, reduced = int(round(totals['listings'])), int(round(totals['reduced_listings']))
+            areas.append({
+                level: data.keys[row],
+                'listings': listings,
+                'price': _stats(totals['price'], listings, quantiles['price'][i]),
+                'price_per_bed': dict(_stats(totals['price_per_bed'], round(totals['bed_listings']),
+                                             quantiles['price_per_bed'][i]),
+                                      listings=int(round(totals['bed_listings']))),
+                'price_per_sqft': dict(_stats(totals['price_per_sqft'], round(totals['sqft_listings']),
+                                              quantiles['price_per_sqft'][i]),
+                                       listings=int(round(totals['sqft_listings']))),
+                'price_reductions': dict(_stats(totals['price_reduced'], reduced, quantiles['price_reduced'][i]),
+                                         listings=reduced,
+                                         share=_rounded(reduced / listings, 4),
+                                         mean_pct=_rounded(totals['reduction_pct'] / reduced) if reduced else None),
+            })
+        return areas
+
+    def to_dict(self):
+        return {'version': self.version, 'updated_at': self.updated_at,
+                'levels': {level: data.to_dict() for level, data in self.levels.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregates = cls()
+        aggregates.version = data['version']
+        aggregates.updated_at = data['updated_at']
+        aggregates.levels = {level: _Level.from_dict(data['levels'][level]) for level in LEVELS}
+        return aggregates
+
+    def save(self, path):
+        """Write the aggregates to ``path`` atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.to_dict()))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, columns):
+        """Saved aggregates if they were built from ``columns``' version, else None."""
+        try:
+            data = json.loads(Path(path).read_text())
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != columns.manifest.get('version'):
+            return None
+        aggregates = cls.from_dict(data)
+        aggregates._columns = columns
+        return aggregates
+
+
+def main(argv=None):
+    from listing_cache import open_listings, DATASET
+
+    parser = argparse.ArgumentParser(description="Market statistics per ZIP code or county.")
+    parser.add_argument('input', nargs='?', default=DATASET)
+    parser.add_argument('--level', choices=sorted(LEVELS), default='zip')
+    parser.add_argument('-o', '--output', help="JSON file to write the areas to")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    aggregates = MarketAggregates.from_columns(open_listings(args.input))
+    areas = aggregates.areas(args.level)
+    if args.output:
+        Path(args.output).write_text(json.dumps(areas, indent=2))
+    else:
+        for area in areas:
+            print(f"{area[args.level]}: {area['listings']:,} listings, "
+                  f"median ${area['price']['p50'] or 0:,.0f}, "
+                  f"{area['price_reductions']['listings']} reduced")
+    print(f"✅ {len(areas):,} {args.level} areas in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
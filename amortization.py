@@ -0,0 +1,148 @@
+"""
+Fixed-rate loan math shared by the credit check, underwriting and search.
+
+Rates are annual percentages and terms are in months, as in
+``check_credit()``. Annuity factors are memoized per (rate, term) pair, so a
+batch that repeats the same handful of rates and terms computes each factor
+once.
+
+Schedules are built in closed form (balance after k payments is
+``P(1+r)^k - pmt((1+r)^k - 1)/r``), so there is no month-by-month loop. Memory:
+each schedule column is one ``loans x months`` array, i.e. 8 bytes per cell
+in float64. 10,000 loans x 360 months is 28.8 MB per column and about 145 MB
+for the five columns ``schedule`` returns (half that with
+``dtype=np.float32``).
+
+    python amortization.py    # time 10k x 360-month schedules
+"""
+
+import time
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=4096)
+def annuity_factor(annual_rate, term_months):
+    """Monthly payment per dollar borrowed."""
+    monthly_rate = annual_rate / 100 / 12
+    if monthly_rate == 0:
+        return 1 / term_months
+    growth = (1 + monthly_rate) ** term_months
+    return monthly_rate * growth / (growth - 1)
+
+
+def annuity_factors(annual_rates, term_months):
+    """Annuity factors for arrays of rates and terms (broadcast together).
+
+    Each distinct (rate, term) pair is computed once through the memoized
+    ``annuity_factor``.
+    """
+    rates, terms = np.broadcast_arrays(np.asarray(annual_rates, dtype=float),
+                                       np.asarray(term_months, dtype=np.int64))
+    pairs, inverse = np.unique(np.stack([rates.ravel(), terms.ravel()], axis=1),
+                               axis=0, return_inverse=True)
+    factors = np.array([annuity_factor(float(rate), int(term)) for rate, term in pairs])
+    return factors[inverse.ravel()].reshape(rates.shape)
+
+
+def monthly_payment(principal, annual_rate, term_months=360):
+    """Fixed monthly payment; scalars in, scalar out, arrays broadcast."""
+    if np.ndim(annual_rate) == 0 and np.ndim(term_months) == 0:
+        factor = annuity_factor(float(annual_rate), int(term_months))
+    else:
+        factor = annuity_factors(annual_rate, term_months)
+    if np.ndim(principal) == 0:
+        return principal * factor
+    return np.asarray(principal, dtype=float) * factor
+
+
+def schedule(principal, annual_rate, term_months, down_payment=0.0, dtype=np.float64):
+    """Month-by-month schedules for many loans at once.
+
+    Returns a dict of ``loans x max(term)`` arrays: ``payment``,
+    ``interest``, ``principal``, ``balance`` (after each payment) and
+    ``equity`` (down payment plus principal repaid so far). Months past a
+    loan's own term are zero, except ``equity``, which stays at its final
+    value.
+    """
+    principal = np.atleast_1d(np.asarray(principal, dtype=float))
+    rates, terms = np.broadcast_arrays(np.asarray(annual_rate, dtype=float),
+                                       np.asarray(term_months, dtype=np.int64))
+    rates = np.broadcast_to(rates, principal.shape)
+    terms = np.broadcast_to(terms, principal.shape)
+    down_payment = np.broadcast_to(np.asarray(down_payment, dtype=float), principal.shape)
+
+    months = int(terms.max()) if terms.size else 0
+    payment = principal * annuity_factors(rates, terms)
+    monthly_rate = (rates / 100 / 12)[:, None]
+    k = np.arange(1, months + 1)[None, :]
+    active = k <= terms[:, None]
+
+    # balance_k = P*g - pmt*(g - 1)/r with g = (1 + r)^k; P - pmt*k when r == 0
+    growth = np.power(1 + monthly_rate, k, dtype=dtype)
+    zero_rate = (monthly_rate == 0).ravel()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balance = principal[:, None] * growth
+        growth -= 1
+        growth *= payment[:, None]
+        growth /= monthly_rate
+        balance -= growth
+    del growth
+    if zero_rate.any():
+        balance[zero_rate] = (principal[zero_rate, None]
+                              - payment[zero_rate, None] * k).astype(dtype)
+    np.maximum(balance, 0, out=balance)
+    balance[~active] = 0
+
+    previous = np.empty_like(balance)
+    previous[:, 0] = principal
+    previous[:, 1:] = balance[:, :-1]
+    interest = previous * monthly_rate.astype(dtype)
+    interest[~active] = 0
+    del previous
+
+    payments = np.where(active, payment[:, None], 0).astype(dtype)
+    principal_paid = payments - interest
+    equity = np.cumsum(principal_paid, axis=1, dtype=dtype)
+    equity += down_payment[:, None]
+
+    return {
+        'payment': payments,
+        'interest': interest,
+        'principal': principal_paid,
+        'balance': balance,
+        'equity': equity,
+    }
+
+
+def sensitivity_grid(amounts, annual_rates, term_months):
+    """Monthly payments for every amount x rate x term combination.
+
+    Returns an array shaped ``(len(amounts), len(annual_rates),
+    len(term_months))``. The rate x term factor table is computed once and
+    scaled by every amount.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    rates = np.asarray(annual_rates, dtype=float)
+    terms = np.asarray(term_months, dtype=np.int64)
+    factors = annuity_factors(rates[:, None], terms[None, :])
+    return amounts[:, None, None] * factors[None, :, :]
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    loans = 10_000
+    principal = rng.uniform(50_000, 1_500_000, loans)
+    rates = rng.choice([3.5, 4.0, 4.5, 5.0, 6.5, 7.5, 10.0], loans)
+
+    start = time.perf_counter()
+    result = schedule(principal, rates, 360)
+    elapsed = time.perf_counter() - start
+    size_mb = sum(a.nbytes for a in result.values()) / 1e6
+    print(f"{loans:,} loans x 360 months in {elapsed:.3f}s ({size_mb:,.0f} MB of schedules)")
+
+    start = time.perf_counter()
+    grid = sensitivity_grid(np.arange(100_000, 1_000_001, 10_000),
+                            np.arange(2.0, 12.01, 0.125), [120, 180, 240, 300, 360])
+    print(f"{grid.size:,}-cell sensitivity grid in {time.perf_counter() - start:.4f}s")
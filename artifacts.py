@@ -0,0 +1,127 @@
+"""
+Precompressed, content-addressed static artifacts (the generated map page).
+
+``write_variants`` runs at build time: next to ``path`` it writes ``.gz``
+and ``.br`` copies (brotli only when the ``brotli`` package is installed)
+and a ``.json`` manifest with the page's SHA-256. ``StaticArtifact`` serves
+whichever variant the client accepts, with the hash as its ETag, and answers
+``If-None-Match`` revalidations with an empty 304. If the variants are
+missing or older than the page, they are built in memory on first use.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Preferred first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+# Brotli's top quality gets superlinearly slow on big inputs (minutes for a
+# 20 MB marker shard); quality 9 there is ~80x faster and ~15% larger
+MAX_QUALITY_BYTES = 1024 * 1024
+
+
+def _compress(data, encoding, effort):
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    # effort 'max' at build time; a cheaper level when a request has to wait for it
+    if effort == 'max':
+        return brotli.compress(data, quality=11 if len(data) <= MAX_QUALITY_BYTES else 9)
+    return brotli.compress(data, quality=5)
+
+
+def _encodings():
+    return [(name, suffix) for name, suffix in ENCODINGS if name != 'br' or brotli is not None]
+
+
+def _write_bytes(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_variants(path):
+    """Write compressed copies and a manifest for the file at ``path``."""
+    with open(path, "rb") as f:
+        data = f.read()
+    stat = os.stat(path)
+    manifest = {
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'variants': {},
+    }
+    for name, suffix in _encodings():
+        compressed = _compress(data, name, 'max')
+        _write_bytes(path + suffix, compressed)
+        manifest['variants'][name] = len(compressed)
+    _write_bytes(path + ".json", json.dumps(manifest).encode('utf-8'))
+    return manifest
+
+
+class StaticArtifact:
+    """Serves one file and its precompressed variants from memory."""
+
+    def __init__(self, path, mimetype='text/html', cache_control='private, no-cache'):
+        self.path = path
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._sha256 = None
+        self._bodies = {}
+
+    def _load(self):
+        """(Re)load the file and its variants when it changes on disk."""
+        stat = os.stat(self.path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            with open(self.path, "rb") as f:
+                data = f.read()
+            try:
+                with open(self.path + ".json") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+
+            sha256 = hashlib.sha256(data).hexdigest()
+            bodies = {'identity': data}
+            fresh = manifest.get('sha256') == sha256
+            for name, suffix in _encodings():
+                body = None
+                if fresh and name in manifest.get('variants', {}):
+                    try:
+                        with open(self.path + suffix, "rb") as f:
+                            body = f.read()
+                    except OSError:
+                        pass
+                bodies[name] = body if body is not None else _compress(data, name, 'fast')
+
+            self._stamp, self._sha256, self._bodies = stamp, sha256, bodies
+
+    def response(self, request):
+        self._load()
+        encoding = next((name for name, _ in _encodings()
+                         if request.accept_encodings[name] and name in self._bodies), 'identity')
+        etag = self._sha256[:32] + ('' if encoding == 'identity' else f"-{encoding}")
+
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': self.cache_control, 'Vary': 'Accept-Encoding'}
+        # Any variant's tag for the same content is a match
+        known = {self._sha256[:32]} | {f"{self._sha256[:32]}-{name}" for name, _ in _encodings()}
+        if any(tag in known for tag in request.if_none_match.as_set(include_weak=True)):
+            return Response(status=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(self._bodies[encoding], mimetype=self.mimetype, headers=headers)
@@ -0,0 +1,153 @@
+"""
+Write-behind batching for small inserts.
+
+Rows saved from form posts arrive one per request. ``WriteBatcher`` queues
+them and a background thread writes everything queued for a table with one
+``executemany`` per flush, at most ``max_delay`` seconds later or as soon as
+``max_rows`` are waiting. Readers call ``flush()`` first so a user always
+sees their own writes.
+
+A failed batch is requeued. Retries are written one row at a time, so a row
+that can never be inserted fails alone, and each waits ``retry_delay``
+seconds, doubling per failed attempt, so a database that is briefly down
+isn't hammered. Rows are dropped after ``max_attempts`` failed writes.
+``add`` returns a future per row, so callers can report a dropped row
+instead of losing it silently.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+
+class WriteFailed(Exception):
+    """A queued row was dropped after ``max_attempts`` failed writes."""
+
+
+class WriteBatcher:
+    def __init__(self, write, max_rows=500, max_delay=0.05, max_attempts=3, retry_delay=0.1):
+        """``write(table, rows)`` must insert ``rows`` (a list of dicts) in one statement."""
+        self._write = write
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # table -> [(row, future)] not yet tried
+        self._pending = defaultdict(list)
+        self._count = 0
+        # table -> [(row, future, failed attempts, monotonic time it may be retried)]
+        self._retries = defaultdict(list)
+        self._retry_count = 0
+        self.written = 0
+        self.retried = 0
+        self.dropped = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='write-batcher', daemon=True)
+        self._thread.start()
+        atexit.register(self.drain)
+
+    def add(self, table, row):
+        """Queue ``row``. The returned future resolves to True once it is
+        written, or raises ``WriteFailed`` if it is dropped."""
+        future = Future()
+        with self._condition:
+            self._pending[table].append((row, future))
+            self._count += 1
+            # Wake the writer for the first row (to start the max_delay clock)
+            # and again once max_rows are waiting
+            if self._count == 1 or self._count >= self.max_rows:
+                self._condition.notify()
+        return future
+
+    def flush(self):
+        """Write everything queued so far, except retries still backing off;
+        returns the number of rows written."""
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._condition:
+                pending, self._pending = self._pending, defaultdict(list)
+                self._count = 0
+                retries = defaultdict(list)
+                for table, entries in self._retries.items():
+                    retries[table] = [entry for entry in entries if entry[3] <= now]
+                    entries[:] = [entry for entry in entries if entry[3] > now]
+                    self._retry_count -= len(retries[table])
+            written = 0
+            requeue = defaultdict(list)
+            for table in set(pending) | set(retries):
+                batches = [[(row, future, 0) for row, future in pending[table]]] if pending.get(table) else []
+                batches += [[entry[:3]] for entry in retries.get(table, ())]
+                for batch in batches:
+                    started = time.perf_counter()
+                    try:
+                        self._write(table, [row for row, _, _ in batch])
+                    except Exception as e:
+                        logging.exception(f"Failed to write {len(batch)} batched rows to {table}")
+                        self._failed(table, batch, e, requeue)
+                        continue
+                    written += len(batch)
+                    for _, future, _ in batch:
+                        future.set_result(True)
+                    logging.debug(f"Wrote {len(batch)} rows to {table} "
+                                  f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+            with self._condition:
+                self.written += written
+                for table, entries in requeue.items():
+                    self._retries[table].extend(entries)
+                    self._retry_count += len(entries)
+                    self.retried += len(entries)
+                if requeue:
+                    self._condition.notify()
+            return written
+
+    def _failed(self, table, batch, error, requeue):
+        for row, future, attempts in batch:
+            attempts += 1
+            if attempts < self.max_attempts:
+                not_before = time.monotonic() + self.retry_delay * 2 ** (attempts - 1)
+                requeue[table].append((row, future, attempts, not_before))
+                continue
+            with self._condition:
+                self.dropped += 1
+            logging.error(f"Dropped a row for {table} after {attempts} failed writes: {error}")
+            future.set_exception(WriteFailed(f"Could not write to {table}: {error}"))
+
+    def drain(self):
+        """Flush until nothing is queued, waiting out retry backoff (used at exit)."""
+        self.flush()
+        while True:
+            with self._condition:
+                wait = self._next_due()
+            if wait is None:
+                return
+            time.sleep(wait)
+            self.flush()
+
+    def _next_due(self):
+        """Seconds until something queued may be written, or None if nothing is.
+        Call with ``_condition`` held."""
+        if self._count:
+            return 0
+        due = [entry[3] for entries in self._retries.values() for entry in entries]
+        return max(0.0, min(due) - time.monotonic()) if due else None
+
+    def stats(self):
+        with self._condition:
+            return {'pending': self._count + self._retry_count, 'written': self.written,
+                    'retried': self.retried, 'dropped': self.dropped}
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # New rows notify; retries backing off are waited out with a timeout
+                wait = self._next_due()
+                while wait != 0:
+                    self._condition.wait(timeout=wait)
+                    wait = self._next_due()
+                self._condition.wait_for(lambda: self._count >= self.max_rows, timeout=self.max_delay)
+            self.flush()
@@ -0,0 +1,337 @@
+"""
+Benchmark suite: map build stages, comps queries, affordability search,
+calculator routes and login.
+
+    python bench.py generate --rows 1000000 -o synthetic.csv
+    python bench.py run --rows 100000 -o results.json
+    python bench.py compare baseline.json results.json --threshold 0.15
+
+``generate`` writes listings with the full scraper schema of
+``updated_dataset.csv``: every non-key column is sampled from real rows, and
+ids, prices, beds, baths, coordinates, addresses and ZIP codes are
+synthesized. Rows are written in chunks, so 10M-row files take bounded
+memory.
+
+``run`` times each stage and writes JSON with per-run p50/p99 latency,
+throughput (items/sec) and peak traced memory. ``compare`` exits non-zero
+when any stage's p50 latency or peak memory grew past the threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+DATASET = "updated_dataset.csv"
+CHUNK_ROWS = 100_000
+
+# New Jersey, where the scraped listings are
+LAT_RANGE = (38.93, 41.36)
+LON_RANGE = (-75.56, -73.89)
+STREETS = ["Main St", "Oak Ave", "Maple Dr", "Park Pl", "Washington St", "Cedar Ln",
+           "Hillside Ave", "Broad St", "Lake Rd", "Church St"]
+
+
+def generate_listings(path, rows, source=DATASET, seed=0):
+    """Write ``rows`` synthetic listings to ``path`` in the schema of ``source``."""
+    import pandas as pd
+    import listings as cols
+
+    template = pd.read_csv(source, dtype=str, keep_default_na=False)
+    rng = np.random.default_rng(seed)
+    zipcodes = template[cols.ZIPCODE].replace('', np.nan).dropna().to_numpy() \
+        if cols.ZIPCODE in template else np.array(['07001'])
+
+    for start in range(0, rows, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, rows - start)
+        chunk = template.iloc[rng.integers(0, len(template), n)].reset_index(drop=True)
+
+        zipcode = rng.choice(zipcodes, n)
+        baths = rng.choice(['1', '1.5', '2', '2.5', '3', '3.5', '4', '2.5+', '5+'], n)
+        synthesized = {
+            cols.PROPERTY_ID: (np.arange(start, start + n) + 9_000_000_000).astype(str),
+            cols.PRICE: np.round(rng.lognormal(12.9, 0.6, n), -2).astype(np.int64).astype(str),
+            cols.BEDS: rng.integers(1, 7, n).astype(str),
+            cols.BATHS: baths,
+            cols.LAT: np.round(rng.uniform(*LAT_RANGE, n), 6).astype(str),
+            cols.LON: np.round(rng.uniform(*LON_RANGE, n), 6).astype(str),
+            cols.ADDRESS: [f"{number} {street}" for number, street in
+                           zip(rng.integers(1, 9999, n).tolist(), rng.choice(STREETS, n).tolist())],
+            cols.ZIPCODE: zipcode,
+            cols.POSTAL_CODE: zipcode,
+        }
+        for column, values in synthesized.items():
+            if column in chunk:
+                chunk[column] = values
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def measure(name, fn, runs=1, items=1, trace_memory=True):
+    """Time ``fn`` over ``runs`` calls, plus one traced call for peak memory."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+    timings = np.array(timings)
+    result = {
+        'runs': runs,
+        'items_per_run': items,
+        'p50_ms': round(float(np.percentile(timings, 50)) * 1000, 3),
+        'p99_ms': round(float(np.percentile(timings, 99)) * 1000, 3),
+        'throughput': round(items * runs / timings.sum(), 1) if timings.sum() else None,
+        'peak_mb': round(peak_mb, 2) if peak_mb is not None else None,
+    }
+    print(f"  {name:<24} p50 {result['p50_ms']:>10.2f} ms  p99 {result['p99_ms']:>10.2f} ms  "
+          f"{result['throughput'] or 0:>12,.0f} items/s  peak {result['peak_mb'] or 0:>8.1f} MB")
+    return result
+
+
+def bench_map(csv_path, runs):
+    """load -> clean -> markers -> emit, each stage fed by the previous one."""
+    import pandas as pd
+    import map as map_build
+    from listings import USECOLS, DTYPES, LAT, LON, clean_listings
+    from markers import marker_colors
+
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [column for column in USECOLS if column in header]
+    dtypes = {column: DTYPES[column] for column in usecols}
+    stages = {}
+
+    def load():
+        return pd.read_csv(csv_path, usecols=usecols, dtype=dtypes)
+    raw = load()
+    stages['map_load'] = measure('map_load', load, runs, len(raw))
+
+    clean = lambda: clean_listings(raw.copy())
+    data = clean()
+    stages['map_clean'] = measure('map_clean', clean, runs, len(raw))
+
+    def markers():
+        _, colors = marker_colors(data)
+        return map_build.marker_payload(data.loc[colors.index], colors)
+    payload = markers()
+    stages['map_markers'] = measure('map_markers', markers, runs, len(data))
+
+    center = (data[LAT].mean(), data[LON].mean())
+    emit = lambda: map_build.render_page(center, payload)
+    stages['map_emit'] = measure('map_emit', emit, runs, len(data))
+    return stages
+
+
+def bench_comps(csv_path, cache_dir, queries):
+    """Comps index build and single-listing queries on the listing cache."""
+    from comps import CompsIndex
+    from listing_cache import build_cache, open_listings
+
+    build_cache(csv_path, cache_dir)
+    columns = open_listings(csv_path, cache_dir)
+    stages = {'comps_build': measure('comps_build', lambda: CompsIndex(columns), 1, len(columns))}
+
+    index = CompsIndex(columns)
+    rng = np.random.default_rng(0)
+    subjects = iter(rng.integers(0, len(columns), queries * 2).tolist())
+
+    def query():
+        row = next(subjects)
+        index.query(columns.lat[row], columns.lon[row], beds=columns.beds[row], baths=columns.baths[row],
+                    kind=columns.type[row], exclude=row)
+    stages['comps_query'] = measure('comps_query', query, queries, trace_memory=False)
+    return stages
+
+
+
+def bench_affordable(csv_path, cache_dir, queries, batch=1000):
+    """Price index build, single-profile searches and a batch of profiles."""
+    from affordability import PriceIndex
+    from listing_cache import open_listings
+
+    columns = open_listings(csv_path, cache_dir)
+    stages = {'affordable_build': measure('affordable_build', lambda: PriceIndex(columns), 1, len(columns))}
+
+    index = PriceIndex(columns)
+    rng = np.random.default_rng(0)
+
+    def profiles(n):
+        return [{'credit_score': int(score), 'salary': float(salary), 'monthly_debt': 900.0,
+                 'down_payment': float(salary) / 2, 'loan_term': 30.0}
+                for score, salary in zip(rng.integers(300, 851, n), rng.integers(30_000, 400_000, n))]
+
+    single = iter(profiles(queries * 2))
+    stages['affordable_query'] = measure(
+        'affordable_query', lambda: index.search(next(single), min_beds=3), queries, trace_memory=False)
+    many = profiles(batch)
+    stages['affordable_batch'] = measure(
+        'affordable_batch', lambda: index.search_many(many, min_beds=3), 3, batch, trace_memory=False)
+    return stages
+
+def _app(database):
+    """The Flask app against a throwaway database, with a logged-in client."""
+    os.environ['DATABASE_URL'] = f"sqlite:///{database}"
+    os.environ['RESULT_CACHE_SHARED'] = ''
+    import logging
+    import main
+    logging.getLogger().setLevel(logging.WARNING)
+    with main.app.app_context():
+        main.db.create_all()
+    return main
+
+
+def bench_routes(main, requests):
+    rng = np.random.default_rng(0)
+    client = main.app.test_client()
+    with client.session_transaction() as s:
+        s['username'] = 'bench'
+    stages = {}
+
+    forms = iter([{'category': 'acquisition_cost', 'purchase_price': str(p), 'closing_costs': '9000',
+                   'renovation_budget': '15000', 'downpayment': str(p // 5)}
+                  for p in rng.integers(100_000, 900_000, requests * 3).tolist()])
+    stages['calculate'] = measure('calculate', lambda: client.post('/calculate', data=next(forms)),
+                                  requests, trace_memory=True)
+    repeat = {'category': 'cash_flow', 'rent_revenue': '30000', 'coc_return_goal': '8'}
+    stages['calculate_cached'] = measure('calculate_cached', lambda: client.post('/calculate', data=repeat),
+                                         requests)
+
+    applicants = iter([{'credit_score': str(score), 'salary': str(salary), 'monthly_debt': '900',
+                        'loan_amount': '300000'}
+                       for score, salary in zip(rng.integers(300, 851, requests * 3).tolist(),
+                                                rng.integers(30_000, 250_000, requests * 3).tolist())])
+    stages['check_credit'] = measure('check_credit', lambda: client.post('/check_credit', data=next(applicants)),
+                                     requests)
+    repeat_applicant = {'credit_score': '720', 'salary': '95000', 'monthly_debt': '900', 'loan_amount': '300000'}
+    stages['check_credit_cached'] = measure(
+        'check_credit_cached', lambda: client.post('/check_credit', data=repeat_applicant), requests)
+    return stages
+
+
+def bench_login(main, logins):
+    client = main.app.test_client()
+    client.post('/register', data={'username': 'bench', 'password': 'pw', 'confirm-password': 'pw'})
+    form = {'username': 'bench', 'password': 'pw'}
+    return {'login': measure('login', lambda: client.post('/login', data=form), logins, trace_memory=False)}
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = args.csv
+        if csv_path is None:
+            csv_path = os.path.join(tmp, 'listings.csv')
+            print(f"Generating {args.rows:,} synthetic listings...")
+            generate_listings(csv_path, args.rows)
+
+        print("Map build stages:")
+        stages = bench_map(csv_path, args.runs)
+        print("Comps:")
+        stages.update(bench_comps(csv_path, os.path.join(tmp, 'listing_cache'), args.requests))
+        print("Affordability search:")
+        stages.update(bench_affordable(csv_path, os.path.join(tmp, 'listing_cache'), args.requests))
+        main = _app(os.path.join(tmp, 'bench.db'))
+        print("Routes:")
+        stages.update(bench_routes(main, args.requests))
+        print(f"Login ({main.app.config['PASSWORD_HASH_ITERATIONS']:,} PBKDF2 iterations):")
+        stages.update(bench_login(main, args.logins))
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'rows': args.rows if args.csv is None else None,
+            'csv': args.csv,
+        },
+        'stages': stages,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    return results
+
+
+def compare(baseline_path, current_path, threshold, memory_threshold):
+    """Print per-stage changes; returns the names of stages that regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['stages']
+    with open(current_path) as f:
+        current = json.load(f)['stages']
+
+    regressions = []
+    print(f"{'stage':<24}{'p50 before':>12}{'p50 after':>12}{'change':>9}{'peak MB':>16}")
+    for name, after in current.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<24}{'(new)':>12}{after['p50_ms']:>12.2f}")
+            continue
+        change = after['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        slower = change > threshold
+        grew = (before.get('peak_mb') and after.get('peak_mb')
+                and after['peak_mb'] / before['peak_mb'] - 1 > memory_threshold)
+        memory = (f"{before['peak_mb']:.1f} -> {after['peak_mb']:.1f}"
+                  if before.get('peak_mb') is not None and after.get('peak_mb') is not None else "")
+        flag = " ❌" if slower or grew else ""
+        print(f"{name:<24}{before['p50_ms']:>12.2f}{after['p50_ms']:>12.2f}{change:>+9.1%}{memory:>16}{flag}")
+        if slower or grew:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the map build, routes and login.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="write a synthetic listing CSV")
+    generate.add_argument('--rows', type=int, default=100_000)
+    generate.add_argument('-o', '--output', required=True)
+    generate.add_argument('--source', default=DATASET, help="CSV whose schema and values to sample")
+    generate.add_argument('--seed', type=int, default=0)
+
+    run_parser = commands.add_parser('run', help="run the suite")
+    run_parser.add_argument('--rows', type=int, default=10_000, help="synthetic listings to map")
+    run_parser.add_argument('--csv', help="map this CSV instead of generating one")
+    run_parser.add_argument('--runs', type=int, default=3, help="runs per map stage")
+    run_parser.add_argument('--requests', type=int, default=500, help="requests per route stage")
+    run_parser.add_argument('--logins', type=int, default=10)
+    run_parser.add_argument('-o', '--output', help="write results JSON here")
+
+    compare_parser = commands.add_parser('compare', help="fail on regressions against a baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.15,
+                                help="allowed p50 slowdown, as a fraction")
+    compare_parser.add_argument('--memory-threshold', type=float, default=0.25,
+                                help="allowed peak memory growth, as a fraction")
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        started = time.perf_counter()
+        generate_listings(args.output, args.rows, args.source, args.seed)
+        print(f"✅ Wrote {args.rows:,} listings to {args.output} in {time.perf_counter() - started:.1f}s")
+    elif args.command == 'run':
+        run(args)
+    else:
+        regressions = compare(args.baseline, args.current, args.threshold, args.memory_threshold)
+        if regressions:
+            print(f"❌ Regressed: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
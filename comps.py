@@ -0,0 +1,510 @@
+"""
+Comparable listings: the nearest similar properties to a listing or a point.
+
+``CompsIndex`` keeps a nearest-neighbour index over listing coordinates.
+It is a scipy ``cKDTree`` over points on the unit sphere, where
+straight-line (chord) distance ranks points exactly like great-circle
+distance. Without scipy, a numpy grid index is searched in widening rings;
+single queries stay fast but ``batch_summaries`` is several times slower.
+Each property type gets its own index, so a type filter never wades through
+other types. Beds and baths are filtered on the candidates, widening the
+search until enough comps are found.
+
+When the listing cache is rebuilt, ``refresh`` compares row hashes. Rows
+that disappeared are masked out, and new or changed rows go into a small
+delta that is searched by brute force alongside the index, so an update
+costs a diff instead of a rebuild. The index is rebuilt once the delta
+outgrows ``DELTA_MAX_ROWS`` (or ``DELTA_MAX_FRACTION`` of the listings).
+
+    python comps.py [updated_dataset.csv] -o comps.csv   # comps summary for every listing
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+
+from listing_cache import diff_rows
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # the grid index is used instead
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_K = 10
+MAX_K = 100
+DEFAULT_BEDS_RANGE = 1
+DEFAULT_BATHS_RANGE = 1
+GRID_DEGREES = 0.02           # ~2 km grid cells for the numpy fallback
+DELTA_MAX_ROWS = 20_000
+DELTA_MAX_FRACTION = 0.05
+DELTA_MIN_ROWS = 1_000        # small datasets still get a usable delta
+BATCH_ROWS = 50_000           # subjects per vectorized step in batch_summaries
+
+
+def unit_vectors(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos = np.cos(lat)
+    return np.column_stack([cos * np.cos(lon), cos * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    chord = np.asarray(chord, dtype=float)
+    km = np.full(chord.shape, np.inf)
+    finite = np.isfinite(chord)
+    km[finite] = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord[finite] / 2, 1.0))
+    return km
+
+
+def km_to_chord(km):
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class _TreeIndex:
+    """k-d tree over unit-sphere points (needs scipy)."""
+
+    def __init__(self, lat, lon):
+        self.n = len(lat)
+        self._tree = cKDTree(unit_vectors(lat, lon))
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """The ``k`` nearest points to each of ``lat``/``lon``, nearest first.
+
+        Returns ``(km, rows)`` arrays of shape (points, k); missing
+        neighbours are ``inf`` / ``-1``.
+        """
+        k = min(k, self.n)
+        if k == 0:
+            return np.empty((len(lat), 0)), np.empty((len(lat), 0), dtype=np.int64)
+        bound = km_to_chord(max_km) if max_km is not None else np.inf
+        chord, rows = self._tree.query(unit_vectors(lat, lon), k=k, distance_upper_bound=bound)
+        chord, rows = chord.reshape(len(lat), k), rows.reshape(len(lat), k).astype(np.int64)
+        rows[rows >= self.n] = -1
+        return chord_to_km(chord), rows
+
+
+class _GridIndex:
+    """Points sorted by lat/lon grid cell, searched in widening boxes."""
+
+    def __init__(self, lat, lon, degrees=GRID_DEGREES):
+        self.n = len(lat)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.degrees = degrees
+        self._cells_per_column = int(np.ceil(180 / degrees)) + 1
+        self._max_reach = int(np.ceil(360 / degrees))
+        ilat, ilon = self._cells(self.lat, self.lon)
+        keys = ilon * self._cells_per_column + ilat
+        self._order = np.argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    def _cells(self, lat, lon):
+        ilat = np.floor((np.asarray(lat) + 90) / self.degrees).astype(np.int64)
+        ilon = np.floor((np.asarray(lon) + 180) / self.degrees).astype(np.int64)
+        return ilat, ilon
+
+    def _covered_km(self, lat, lon, ilat, ilon, reach):
+        """Distance from the point within which the box has every point."""
+        south = (ilat - reach) * self.degrees - 90
+        north = (ilat + reach + 1) * self.degrees - 90
+        west = (ilon - reach) * self.degrees - 180
+        east = (ilon + reach + 1) * self.degrees - 180
+        lat_km = EARTH_RADIUS_KM * np.radians(min(lat - south, north - lat))
+        # Nearest point on a meridian ``dlon`` away: sin(d/R) = cos(lat) sin(dlon)
+        dlon = np.radians(min(lon - west, east - lon, 90.0))
+        lon_km = EARTH_RADIUS_KM * np.arcsin(np.cos(np.radians(lat)) * np.sin(dlon))
+        return min(lat_km, lon_km)
+
+    def _nearest_one(self, lat, lon, k, max_km):
+        ilat, ilon = self._cells(lat, lon)
+        limit = np.inf if max_km is None else max_km
+        reach = 1
+        while True:
+            columns = np.arange(ilon - reach, ilon + reach + 1, dtype=np.int64) * self._cells_per_column
+            starts = np.searchsorted(self._keys, columns + max(ilat - reach, 0), side='left')
+            ends = np.searchsorted(self._keys, columns + min(ilat + reach, self._cells_per_column - 1),
+                                   side='right')
+            rows = np.concatenate([self._order[s:e] for s, e in zip(starts, ends)])
+            km = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+            if max_km is not None:
+                rows, km = rows[km <= max_km], km[km <= max_km]
+
+            covered = self._covered_km(lat, lon, ilat, ilon, reach)
+            done = len(rows) >= k and np.partition(km, k - 1)[k - 1] <= covered
+            if done or covered >= limit or reach >= self._max_reach:
+                nearest = np.argsort(km, kind='stable')[:k]
+                return km[nearest], rows[nearest]
+            reach *= 2
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """Same contract as ``_TreeIndex.nearest``."""
+        k = min(k, self.n)
+        km_out = np.full((len(lat), k), np.inf)
+        rows_out = np.full((len(lat), k), -1, dtype=np.int64)
+        for i, (point_lat, point_lon) in enumerate(zip(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))):
+            if k == 0:
+                continue
+            km, rows = self._nearest_one(point_lat, point_lon, k, max_km)
+            km_out[i, :len(km)] = km
+            rows_out[i, :len(rows)] = rows
+        return km_out, rows_out
+
+
+def _spatial_index(lat, lon):
+    return _TreeIndex(lat, lon) if cKDTree is not None else _GridIndex(lat, lon)
+
+
+def _median(values):
+    values = values[np.isfinite(values)]
+    return round(float(np.median(values)), 2) if len(values) else None
+
+
+def summarize(price, beds, sqft):
+    """Count and median price, price per bed and price per square foot."""
+    price, beds, sqft = (np.asarray(v, dtype=float) for v in (price, beds, sqft))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_bed = np.where(beds > 0, price / beds, np.nan)
+        per_sqft = np.where(sqft > 0, price / sqft, np.nan)
+    return {
+        'count': len(price),
+        'median_price': _median(price),
+        'median_price_per_bed': _median(per_bed),
+        'median_price_per_sqft': _median(per_sqft),
+    }
+
+
+class _Entries:
+    """Every listing the index knows about: the indexed base rows followed by
+    the delta. Replaced wholesale on refresh, so readers never see a half
+    update."""
+
+    FIELDS = ['lat', 'lon', 'price', 'beds', 'baths', 'sqft', 'type', 'ids', 'row_hash',
+              'generation', 'source_row', 'alive']
+
+    def __init__(self, **arrays):
+        for name in self.FIELDS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_columns(cls, columns, generation, rows=None):
+        rows = np.arange(len(columns)) if rows is None else rows
+        return cls(
+            lat=np.asarray(columns.lat)[rows], lon=np.asarray(columns.lon)[rows],
+            price=np.asarray(columns.price)[rows], beds=np.asarray(columns.beds)[rows],
+            baths=np.asarray(columns.baths)[rows], sqft=np.asarray(columns.sqft)[rows],
+            type=np.asarray(columns.type)[rows], ids=np.asarray(columns.property_id)[rows],
+            row_hash=np.asarray(columns.row_hash)[rows],
+            generation=np.full(len(rows), generation, dtype=np.int32),
+            source_row=np.asarray(rows, dtype=np.int64), alive=np.ones(len(rows), dtype=bool),
+        )
+
+    def __len__(self):
+        return len(self.lat)
+
+    def concat(self, other):
+        return _Entries(**{name: np.concatenate([getattr(self, name), getattr(other, name)])
+                           for name in self.FIELDS})
+
+
+class _Snapshot:
+    def __init__(self, entries, base_rows, indexes, sources, id_order=None):
+        self.entries = entries
+        self.base_rows = base_rows  # entries before this are in the spatial indexes
+        self.indexes = indexes      # type (or None for all) -> (index, entry positions)
+        self.sources = sources      # generation -> ListingColumns, for addresses
+        ids = entries.ids[:base_rows]
+        self.id_order = np.argsort(ids, kind='stable') if id_order is None else id_order
+        self.sorted_ids = ids[self.id_order]
+
+
+class CompsIndex:
+    def __init__(self, columns):
+        self.version = None
+        self.rebuilds = 0
+        self._generation = 0
+        self._build(columns)
+
+    def _build(self, columns):
+        self._generation += 1
+        entries = _Entries.from_columns(columns, self._generation)
+        self._snapshot = self._index(entries, {self._generation: columns})
+        self.version = columns.manifest.get('version')
+        self.rebuilds += 1
+
+    @staticmethod
+    def _index(entries, sources):
+        positions = np.flatnonzero(entries.alive)
+        indexes = {None: (_spatial_index(entries.lat[positions], entries.lon[positions]), positions)}
+        for kind in np.unique(entries.type[positions]):
+            subset = positions[entries.type[positions] == kind]
+            indexes[kind] = (_spatial_index(entries.lat[subset], entries.lon[subset]), subset)
+        return _Snapshot(entries, len(entries), indexes, sources)
+
+    def __len__(self):
+        return int(self._snapshot.entries.alive.sum())
+
+    @property
+    def delta_rows(self):
+        snapshot = self._snapshot
+        return len(snapshot.entries) - snapshot.base_rows
+
+    def refresh(self, columns):
+        """Apply a new listing cache build. Returns ``(added, removed)`` row counts."""
+        snapshot = self._snapshot
+        entries = snapshot.entries
+        live = np.flatnonzero(entries.alive)
+        removed, added = diff_rows(entries.row_hash[live], columns.row_hash)
+        removed = live[removed]
+
+        limit = min(DELTA_MAX_ROWS, max(DELTA_MIN_ROWS, int(DELTA_MAX_FRACTION * len(columns))))
+        if self.delta_rows + len(added) > limit:
+            self._build(columns)
+            return len(added), len(removed)
+
+        self._generation += 1
+        alive = entries.alive.copy()
+        alive[removed] = False
+        updated = _Entries(**{name: getattr(entries, name) for name in _Entries.FIELDS if name != 'alive'},
+                           alive=alive)
+        if len(added):
+            updated = updated.concat(_Entries.from_columns(columns, self._generation, added))
+        in_use = set(np.unique(updated.generation[updated.alive]).tolist())
+        sources = {g: source for g, source in snapshot.sources.items() if g in in_use}
+        sources[self._generation] = columns
+
+        # The spatial indexes still cover the old base rows; removed ones are masked by ``alive``
+        self._snapshot = _Snapshot(updated, snapshot.base_rows, snapshot.indexes, sources, snapshot.id_order)
+        self.version = columns.manifest.get('version')
+        return len(added), len(removed)
+
+    def find(self, property_id):
+        """Entry position of a listing by id, or None. The newest version wins."""
+        return self._find(self._snapshot, property_id)
+
+    @staticmethod
+    def _find(snapshot, property_id):
+        entries = snapshot.entries
+        key = str(property_id).encode('utf-8')
+        delta = np.flatnonzero((entries.ids[snapshot.base_rows:] == key) & entries.alive[snapshot.base_rows:])
+        if len(delta):
+            return snapshot.base_rows + int(delta[-1])
+        start = np.searchsorted(snapshot.sorted_ids, key, side='left')
+        end = np.searchsorted(snapshot.sorted_ids, key, side='right')
+        for position in snapshot.id_order[start:end]:
+            if entries.alive[position]:
+                return int(position)
+        return None
+
+    @staticmethod
+    def _matches(entries, positions, beds, baths, kind, beds_range, baths_range, exclude):
+        ok = entries.alive[positions]
+        if beds is not None and not np.isnan(beds):
+            ok &= np.abs(entries.beds[positions] - beds) <= beds_range
+        if baths is not None and not np.isnan(baths):
+            ok &= np.abs(entries.baths[positions] - baths) <= baths_range
+        if kind is not None:
+            ok &= entries.type[positions] == kind
+        if exclude is not None:
+            ok &= positions != exclude
+        return ok
+
+    def query(self, lat, lon, k=DEFAULT_K, beds=None, baths=None, kind=None,
+              beds_range=DEFAULT_BEDS_RANGE, baths_range=DEFAULT_BATHS_RANGE, max_km=None, exclude=None):
+        """The ``k`` nearest listings within the filters, nearest first.
+
+        ``kind`` is the ``description/type`` (e.g. ``single_family``); beds
+        and baths match within their ranges. Returns ``(positions, km)``.
+        """
+        return self._query(self._snapshot, lat, lon, k, beds, baths, kind, beds_range, baths_range,
+                           max_km, exclude)
+
+    def _query(self, snapshot, lat, lon, k, beds, baths, kind, beds_range, baths_range, max_km, exclude):
+        # Every read below goes through ``snapshot``: a concurrent refresh
+        # swaps in a new one, and positions from one don't index the other
+        entries = snapshot.entries
+        k = min(int(k), MAX_K)
+        kind = kind.encode('utf-8') if isinstance(kind, str) else kind
+        filters = (beds, baths, kind, beds_range, baths_range, exclude)
+
+        found, found_km = [np.empty(0, dtype=np.int64)], [np.empty(0)]
+        index = snapshot.indexes.get(kind)
+        if index is not None and k > 0:
+            spatial, positions = index
+            want = max(2 * k, 16)
+            while True:
+                km, rows = spatial.nearest([lat], [lon], want, max_km)
+                valid = rows[0] >= 0
+                candidates, km = positions[rows[0][valid]], km[0][valid]
+                ok = self._matches(entries, candidates, *filters)
+                # Stop once enough passed, or the index (or radius) ran out of points
+                if ok.sum() >= k or want >= spatial.n or len(candidates) < want:
+                    break
+                want *= 4
+            found.append(candidates[ok][:k])
+            found_km.append(km[ok][:k])
+
+        delta = np.arange(snapshot.base_rows, len(entries))
+        if len(delta):
+            delta = delta[self._matches(entries, delta, *filters)]
+            km = haversine_km(lat, lon, entries.lat[delta], entries.lon[delta])
+            if max_km is not None:
+                delta, km = delta[km <= max_km], km[km <= max_km]
+            found.append(delta)
+            found_km.append(km)
+
+        positions, km = np.concatenate(found), np.concatenate(found_km)
+        nearest = np.argsort(km, kind='stable')[:k]
+        return positions[nearest], km[nearest]
+
+    def comps(self, property_id=None, lat=None, lon=None, k=DEFAULT_K, beds=None, baths=None, kind=None,
+              beds_range=DEFAULT_BEDS_RANGE, baths_range=DEFAULT_BATHS_RANGE, max_km=None):
+        """Comps and their medians for a listing (filters default to its own
+        beds, baths and type) or for a point. Returns None for an unknown id."""
+        snapshot = self._snapshot
+        entries = snapshot.entries
+        subject = position = None
+        if property_id is not None:
+            position = self._find(snapshot, property_id)
+            if position is None:
+                return None
+            subject = self._describe(snapshot, position)
+            lat, lon = entries.lat[position], entries.lon[position]
+            beds = entries.beds[position] if beds is None else beds
+            baths = entries.baths[position] if baths is None else baths
+            kind = entries.type[position] if kind is None else kind
+
+        positions, km = self._query(snapshot, lat, lon, k, beds, baths, kind, beds_range, baths_range, max_km,
+                                    exclude=position)
+        return {
+            'subject': subject,
+            'comps': [self._describe(snapshot, comp, distance) for comp, distance in zip(positions, km)],
+            'summary': summarize(entries.price[positions], entries.beds[positions], entries.sqft[positions]),
+        }
+
+    def describe(self, position, km=None):
+        return self._describe(self._snapshot, position, km)
+
+    @staticmethod
+    def _describe(snapshot, position, km=None):
+        entries = snapshot.entries
+        source = snapshot.sources.get(int(entries.generation[position]))
+
+        def number(value):
+            return None if np.isnan(value) else float(value)
+
+        listing = {
+            'property_id': entries.ids[position].decode('utf-8'),
+            'address': source.address[int(entries.source_row[position])] if source is not None else None,
+            'lat': float(entries.lat[position]),
+            'lon': float(entries.lon[position]),
+            'price': number(entries.price[position]),
+            'beds': number(entries.beds[position]),
+            'baths': number(entries.baths[position]),
+            'sqft': number(entries.sqft[position]),
+            'type': entries.type[position].decode('utf-8') or None,
+        }
+        if km is not None:
+            listing['distance_km'] = round(float(km), 3)
+        return listing
+
+    def batch_summaries(self, k=DEFAULT_K, beds_range=DEFAULT_BEDS_RANGE, baths_range=DEFAULT_BATHS_RANGE):
+        """Comps summary for every listing, as arrays aligned with ``ids``.
+
+        Each listing is compared with the same type and beds/baths within
+        range, excluding itself. Vectorized over blocks of ``BATCH_ROWS``
+        subjects; with the grid fallback each subject is still searched on
+        its own.
+        """
+        snapshot = self._snapshot
+        if snapshot.base_rows < len(snapshot.entries) or not snapshot.entries.alive.all():
+            # Fold the delta into indexes of our own; live queries keep the current snapshot
+            snapshot = self._index(self._compact(snapshot.entries), snapshot.sources)
+        entries = snapshot.entries
+        k = min(int(k), MAX_K)
+        n = len(entries)
+        result = {name: np.full(n, np.nan) for name in
+                  ('median_price', 'median_price_per_bed', 'median_price_per_sqft')}
+        result['count'] = np.zeros(n, dtype=np.int64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_bed = np.where(entries.beds > 0, entries.price / entries.beds, np.nan)
+            per_sqft = np.where(entries.sqft > 0, entries.price / entries.sqft, np.nan)
+
+        for kind, (spatial, positions) in snapshot.indexes.items():
+            if kind is None:
+                continue
+            for start in range(0, len(positions), BATCH_ROWS):
+                subjects = positions[start:start + BATCH_ROWS]
+                pending = np.arange(len(subjects))
+                want = max(2 * k, 16) + 1
+                while len(pending):
+                    rows_of = subjects[pending]
+                    _, rows = spatial.nearest(entries.lat[rows_of], entries.lon[rows_of], want)
+                    candidates = np.where(rows >= 0, positions[np.maximum(rows, 0)], -1)
+                    safe = np.maximum(candidates, 0)
+                    ok = (candidates >= 0) & (candidates != rows_of[:, None])
+                    for values, allowed in ((entries.beds, beds_range), (entries.baths, baths_range)):
+                        target = values[rows_of][:, None]
+                        ok &= np.isnan(target) | (np.abs(values[safe] - target) <= allowed)
+                    taken = ok & (np.cumsum(ok, axis=1) <= k)
+                    count = taken.sum(axis=1)
+
+                    finished = (count >= k) | (want >= spatial.n)
+                    done = rows_of[finished]
+                    result['count'][done] = count[finished]
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', RuntimeWarning)  # listings with no comps
+                        for name, values in (('median_price', entries.price), ('median_price_per_bed', per_bed),
+                                             ('median_price_per_sqft', per_sqft)):
+                            picked = np.where(taken[finished], values[safe[finished]], np.nan)
+                            result[name][done] = np.nanmedian(picked, axis=1) if picked.shape[1] else np.nan
+                    pending = pending[~finished]
+                    want *= 4
+
+        result['ids'] = np.char.decode(entries.ids, 'utf-8')
+        return result
+
+    @staticmethod
+    def _compact(entries):
+        keep = np.flatnonzero(entries.alive)
+        return _Entries(**{name: getattr(entries, name)[keep] for name in _Entries.FIELDS})
+
+
+def main(argv=None):
+    import pandas as pd
+    from listing_cache import open_listings, DATASET
+
+    parser = argparse.ArgumentParser(description="Comps summary (k nearest similar listings) for every listing.")
+    parser.add_argument('input', nargs='?', default=DATASET)
+    parser.add_argument('-o', '--output', required=True, help="CSV to write")
+    parser.add_argument('-k', type=int, default=DEFAULT_K)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    index = CompsIndex(open_listings(args.input))
+    built = time.perf_counter()
+    result = index.batch_summaries(args.k)
+    pd.DataFrame({
+        'property_id': result['ids'],
+        'comps': result['count'],
+        'median_price': np.round(result['median_price'], 2),
+        'median_price_per_bed': np.round(result['median_price_per_bed'], 2),
+        'median_price_per_sqft': np.round(result['median_price_per_sqft'], 2),
+    }).to_csv(args.output, index=False)
+    backend = 'cKDTree' if cKDTree is not None else 'grid'
+    print(f"✅ Comps for {len(index):,} listings written to {args.output} "
+          f"(index {built - started:.2f}s with {backend}, queries {time.perf_counter() - built:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+Credit rules engine behind ``/check_credit`` and bulk applicant screening.
+
+The score tiers, DTI limits and rates live in ``TIERS``. ``score_applicant``
+applies them to one applicant, exactly as ``check_credit()`` always has.
+``score_applicants`` applies them to whole columns at once: each rule is a
+boolean mask, so there is no per-row branching. Bulk input (CSV or JSON
+lines) is streamed in chunks, and results are written as each chunk
+finishes.
+
+    python credit.py leads.csv -o scored.csv          # or .jsonl in/out
+    python credit.py --generate 1000000 -o corpus.csv  # synthetic corpus
+    python credit.py corpus.csv --verify              # bulk == per-applicant
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+
+from amortization import monthly_payment
+
+FIELDS = ['credit_score', 'salary', 'monthly_debt', 'loan_amount']
+MIN_SCORE, MAX_SCORE = 300, 850
+RATE_DTI = 36          # DTI (%) at which each tier moves to its higher rate
+AFFORDABLE_DTI = 0.36  # share of monthly income available for debt
+TERM_MONTHS = 360
+CHUNK_ROWS = 100_000
+
+# (minimum score, approval: always / never / DTI it must stay under,
+#  rate below RATE_DTI, rate at or above it, tips)
+TIERS = [
+    (740, True, 3.5, 4.0, [
+        "Maintain your excellent credit by paying bills on time.",
+        "Keep credit utilization below 30%.",
+    ]),
+    (670, True, 4.5, 5.0, [
+        "Continue making timely payments.",
+        "Reduce outstanding debt to improve your score.",
+    ]),
+    (580, 43, 6.5, 7.5, [
+        "Pay down existing debt to lower your DTI.",
+        "Make all payments on time to build credit history.",
+        "Consider a secured credit card to improve your score.",
+    ]),
+    (MIN_SCORE, False, 10.0, 10.0, [
+        "Work on paying bills on time consistently.",
+        "Reduce debt through a payment plan.",
+        "Consider credit counseling services.",
+    ]),
+]
+
+INVALID_NUMBER = "Please enter valid numerical values"
+SCORE_RANGE = f"Credit score must be between {MIN_SCORE} and {MAX_SCORE}"
+NEGATIVE_VALUE = "Values cannot be negative"
+
+# Error codes, kept as a small integer array until output
+OK, BAD_NUMBER, BAD_SCORE, NEGATIVE = 0, 1, 2, 3
+ERROR_MESSAGES = {BAD_NUMBER: INVALID_NUMBER, BAD_SCORE: SCORE_RANGE, NEGATIVE: NEGATIVE_VALUE}
+
+RESULT_FIELDS = ['credit_score', 'loan_approved', 'interest_rate', 'dti',
+                 'requested_loan', 'max_affordable_loan', 'monthly_payment']
+
+
+def parse_applicant(form):
+    """Validated ``(credit_score, salary, monthly_debt, loan_amount)`` from a form.
+
+    Raises ``ValueError`` with the message to show the user.
+    """
+    try:
+        credit_score = int(form.get('credit_score'))
+        salary = float(form.get('salary'))
+        monthly_debt = float(form.get('monthly_debt'))
+        loan_amount = float(form.get('loan_amount'))
+    except (ValueError, TypeError):
+        raise ValueError(INVALID_NUMBER)
+
+    if not (MIN_SCORE <= credit_score <= MAX_SCORE):
+        raise ValueError(SCORE_RANGE)
+    if salary < 0 or monthly_debt < 0 or loan_amount < 0:
+        raise ValueError(NEGATIVE_VALUE)
+    return credit_score, salary, monthly_debt, loan_amount
+
+
+def score_applicant(credit_score, salary, monthly_debt, loan_amount):
+    """Score one validated applicant, returning the ``check_credit`` result."""
+    monthly_income = salary / 12
+    dti = (monthly_debt / monthly_income) * 100 if monthly_income > 0 else 100
+
+    tier = next((t for t in TIERS if credit_score >= t[0]), TIERS[-1])
+    _, approval, low_rate, high_rate, tips = tier
+    loan_approved = approval if isinstance(approval, bool) else dti < approval
+    interest_rate = low_rate if dti < RATE_DTI else high_rate
+
+    max_loan = (monthly_income * AFFORDABLE_DTI - monthly_debt) * TERM_MONTHS
+    payment = monthly_payment(loan_amount, interest_rate, TERM_MONTHS)
+
+    return {
+        'credit_score': credit_score,
+        'loan_approved': loan_approved,
+        'interest_rate': interest_rate,
+        'dti': round(dti, 2),
+        'requested_loan': loan_amount,
+        'max_affordable_loan': round(max_loan, 2),
+        'monthly_payment': round(payment, 2) if loan_approved else 0,
+        'tips': list(tips),
+    }
+
+
+def _to_numbers(values, convert, dtype):
+    """Convert a list of raw values with ``convert`` (``int`` or ``float``).
+
+    Whole columns go through numpy's object cast, which calls ``convert``
+    semantics in C; a column with any bad value falls back to a row loop
+    that marks the bad rows instead of failing.
+    """
+    try:
+        return np.array(values, dtype=object).astype(dtype), np.zeros(len(values), dtype=bool)
+    except (ValueError, TypeError, OverflowError):
+        numbers = np.zeros(len(values), dtype=dtype)
+        invalid = np.zeros(len(values), dtype=bool)
+        for i, value in enumerate(values):
+            try:
+                numbers[i] = convert(value)
+            except (ValueError, TypeError, OverflowError):
+                invalid[i] = True
+        return numbers, invalid
+
+
+def parse_applicants(columns, rows):
+    """Numeric arrays for the four inputs plus per-row error codes.
+
+    ``columns`` maps field names to lists of raw values (strings as posted
+    by the form, or ``None`` when missing); the same checks as
+    ``parse_applicant`` apply, in the same order.
+    """
+    values, invalid = {}, np.zeros(rows, dtype=bool)
+    for field in FIELDS:
+        raw = columns.get(field, [None] * rows)
+        # Parse text the way the form's strings are parsed, even for JSON numbers
+        raw = [None if v is None else str(v) for v in raw]
+        if field == 'credit_score':
+            numbers, bad = _to_numbers(raw, int, np.int64)
+            # Scores beyond int64 are simply out of range
+            if bad.any():
+                for i in np.flatnonzero(bad):
+                    try:
+                        score = int(raw[i])
+                    except (ValueError, TypeError):
+                        continue
+                    numbers[i] = MAX_SCORE + 1 if score > 0 else MIN_SCORE - 1
+                    bad[i] = False
+        else:
+            numbers, bad = _to_numbers(raw, float, np.float64)
+        values[field] = numbers
+        invalid |= bad
+
+    codes = np.zeros(rows, dtype=np.int8)
+    score = values['credit_score']
+    with np.errstate(invalid='ignore'):
+        negative = ((values['salary'] < 0) | (values['monthly_debt'] < 0)
+                    | (values['loan_amount'] < 0))
+    codes[negative] = NEGATIVE
+    codes[(score < MIN_SCORE) | (score > MAX_SCORE)] = BAD_SCORE
+    codes[invalid] = BAD_NUMBER
+    return values, codes
+
+
+def round_like_python(values, digits=2):
+    """``round(x, digits)`` for every element, matching Python bit for bit.
+
+    ``np.round`` scales by ``10**digits`` first, which can land on the other
+    side of a tie or lose precision for huge values; those few rows are
+    redone with Python's ``round``.
+    """
+    values = np.asarray(values, dtype=float)
+    scale = 10.0 ** digits
+    with np.errstate(over='ignore', invalid='ignore'):
+        rounded = np.round(values, digits)
+        scaled = values * scale
+        fraction = np.abs(scaled - np.trunc(scaled))
+        suspect = (np.abs(fraction - 0.5) < 1e-6) | (np.abs(values) >= 2.0 ** 52 / scale)
+    suspect &= np.isfinite(values)
+    for i in np.flatnonzero(suspect):
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+
+def score_applicants(credit_score, salary, monthly_debt, loan_amount):
+    """Score validated applicants column-wise; returns a dict of arrays."""
+    credit_score = np.asarray(credit_score, dtype=np.int64)
+    salary = np.asarray(salary, dtype=float)
+    monthly_debt = np.asarray(monthly_debt, dtype=float)
+    loan_amount = np.asarray(loan_amount, dtype=float)
+
+    monthly_income = salary / 12
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dti = np.where(monthly_income > 0, (monthly_debt / monthly_income) * 100, 100.0)
+
+    tier = np.select([credit_score >= t[0] for t in TIERS], np.arange(len(TIERS)), len(TIERS) - 1)
+    approvals = [np.full(len(dti), approval) if isinstance(approval, bool) else dti < approval
+                 for _, approval, _, _, _ in TIERS]
+    loan_approved = np.select([tier == i for i in range(len(TIERS))], approvals, False)
+    low_rates = np.array([t[2] for t in TIERS])
+    high_rates = np.array([t[3] for t in TIERS])
+    interest_rate = np.where(dti < RATE_DTI, low_rates[tier], high_rates[tier])
+
+    max_loan = (monthly_income * AFFORDABLE_DTI - monthly_debt) * TERM_MONTHS
+    payment = monthly_payment(loan_amount, interest_rate, TERM_MONTHS)
+
+    return {
+        'credit_score': credit_score,
+        'loan_approved': loan_approved,
+        'interest_rate': interest_rate,
+        'dti': round_like_python(dti),
+        'requested_loan': loan_amount,
+        'max_affordable_loan': round_like_python(max_loan),
+        'monthly_payment': np.where(loan_approved, round_like_python(payment), 0.0),
+        'has_income': monthly_income > 0,
+        'tier': tier,
+    }
+
+
+def _records(values, codes, scored, start, ids):
+    """Result dicts for one chunk, shaped like ``check_credit``'s (minus tips)."""
+    columns = {name: scored[name].tolist() for name in RESULT_FIELDS}
+    has_income = scored['has_income'].tolist()
+    codes = codes.tolist()
+    records = []
+    for i, code in enumerate(codes):
+        record = {'row': start + i}
+        if ids is not None:
+            record['id'] = ids[i]
+        if code:
+            record['error'] = ERROR_MESSAGES[code]
+        else:
+            record.update((name, columns[name][i]) for name in RESULT_FIELDS)
+            # check_credit's fallback values are ints, not floats
+            if not has_income[i]:
+                record['dti'] = 100
+            if not record['loan_approved']:
+                record['monthly_payment'] = 0
+        records.append(record)
+    return records
+
+
+def iter_input_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield ``(columns, rows)`` from a CSV or JSON-lines file, chunk by chunk."""
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path) as f:
+            while True:
+                lines = [line for line in (f.readline() for _ in range(chunk_rows)) if line]
+                if not lines:
+                    return
+                records = [json.loads(line) for line in lines if line.strip()]
+                keys = set().union(*records)
+                yield {key: [record.get(key) for record in records] for key in keys}, len(records)
+    else:
+        import pandas as pd
+        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            yield {column: chunk[column].tolist() for column in chunk.columns}, len(chunk)
+
+
+def score_file(path, output=None, chunk_rows=CHUNK_ROWS, verify=False):
+    """Score every applicant in ``path``, appending results to ``output``.
+
+    With ``verify``, every row is also scored with ``score_applicant`` and
+    the two results are compared. Returns ``(rows, errors, mismatches, seconds)``.
+    """
+    started = time.perf_counter()
+    rows = errors = mismatches = 0
+    out = open(output, 'w', newline='') if output else None
+    writer = None
+    try:
+        for columns, n in iter_input_chunks(path, chunk_rows):
+            values, codes = parse_applicants(columns, n)
+            scored = score_applicants(*(values[field] for field in FIELDS))
+            records = _records(values, codes, scored, rows, columns.get('id'))
+
+            if verify:
+                mismatches += _verify(columns, records)
+            if out is not None:
+                if output.endswith(('.jsonl', '.ndjson')):
+                    out.write("".join(json.dumps(record) + "\n" for record in records))
+                else:
+                    if writer is None:
+                        header = ['row'] + (['id'] if 'id' in columns else []) + RESULT_FIELDS + ['error']
+                        writer = csv.DictWriter(out, header)
+                        writer.writeheader()
+                    writer.writerows(records)
+            rows += n
+            errors += int(np.count_nonzero(codes))
+    finally:
+        if out is not None:
+            out.close()
+    return rows, errors, mismatches, time.perf_counter() - started
+
+
+def _verify(columns, records):
+    """Count records that differ from scoring each row with ``score_applicant``."""
+    mismatches = 0
+    for i, record in enumerate(records):
+        form = {field: columns[field][i] if field in columns else None for field in FIELDS}
+        form = {k: None if v is None else str(v) for k, v in form.items()}
+        try:
+            expected = score_applicant(*parse_applicant(form))
+            expected.pop('tips')
+        except ValueError as e:
+            expected = {'error': str(e)}
+        actual = {k: v for k, v in record.items() if k not in ('row', 'id')}
+        if repr(actual) != repr(expected):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ row {record['row']}: {actual} != {expected}")
+    return mismatches
+
+
+def generate_corpus(path, rows, seed=0):
+    """Write a synthetic applicant CSV, seeded with tier and DTI edge cases."""
+    rng = np.random.default_rng(seed)
+    salary = np.round(rng.lognormal(11, 0.6, rows), 2)
+    columns = {
+        'id': [f"A{i:07d}" for i in range(rows)],
+        'credit_score': rng.integers(280, 871, rows).astype(str).tolist(),
+        'salary': salary.astype(str).tolist(),
+        'monthly_debt': np.round(salary / 12 * rng.uniform(0, 0.6, rows), 2).astype(str).tolist(),
+        'loan_amount': np.round(rng.uniform(0, 1_500_000, rows), -2).astype(str).tolist(),
+    }
+    # Exact boundaries: scores at each tier, DTI at 36% and 43%, zero income,
+    # and inputs the form would reject
+    edges = [
+        ['740', '120000', '3600', '300000'], ['739', '120000', '4300', '300000'],
+        ['670', '60000', '1800', '200000'], ['580', '60000', '2150', '150000'],
+        ['579', '60000', '0', '150000'], ['300', '0', '500', '100000'],
+        ['850', '0', '0', '0'], ['851', '50000', '100', '1000'], ['299', '50000', '100', '1000'],
+        ['700.5', '50000', '100', '1000'], ['700', 'abc', '100', '1000'], ['700', '', '100', '1000'],
+        ['700', '-1', '100', '1000'], [' 700 ', '1e5', '2_000', '+250000'], ['700', 'nan', '100', '1000'],
+        ['700', 'inf', '100', '1000'], ['99999999999999999999', '50000', '100', '1000'],
+    ]
+    for i, edge in enumerate(edges[:rows]):
+        for field, value in zip(FIELDS, edge):
+            columns[field][i] = value
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id'] + FIELDS)
+        writer.writerows(zip(columns['id'], *(columns[field] for field in FIELDS)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score credit applicants in bulk.")
+    parser.add_argument('input', nargs='?', help="applicants as .csv or .jsonl")
+    parser.add_argument('-o', '--output', help="write results to this .csv or .jsonl")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--verify', action='store_true',
+                        help="also score every row one at a time and compare")
+    parser.add_argument('--generate', type=int, metavar='ROWS',
+                        help="write a synthetic corpus of ROWS applicants to --output")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        if not args.output:
+            parser.error("--generate needs --output")
+        generate_corpus(args.output, args.generate)
+        print(f"✅ Wrote {args.generate:,} applicants to {args.output}")
+        return
+    if not args.input:
+        parser.error("an input file is required")
+
+    rows, errors, mismatches, elapsed = score_file(args.input, args.output, args.chunk_rows, args.verify)
+    rate = rows / elapsed * 60 if elapsed else 0
+    print(f"✅ Scored {rows:,} applicants ({errors:,} rejected as invalid) in {elapsed:.2f}s "
+          f"({rate:,.0f} applicants/minute)")
+    if args.verify:
+        print(f"{'✅' if not mismatches else '❌'} {mismatches:,} rows differ from per-applicant scoring")
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
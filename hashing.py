@@ -0,0 +1,123 @@
+"""
+Bounded worker pool for password hashing.
+
+PBKDF2 is deliberately slow, so login bursts used to eat every request
+thread. ``HashPool`` runs hashes on a fixed number of worker threads
+(``hashlib`` releases the GIL while it works, so other routes keep being
+served) and accepts at most ``queue_depth`` waiting hashes on top of those.
+Beyond that, ``PoolBusy`` is raised straight away so the route can answer 503
+instead of queueing forever.
+
+A hash made with a different method or iteration count than the pool's is
+re-made on the next successful login, so raising the work factor needs no
+migration. Queue wait and hashing time are recorded for every call, and
+``stats()`` reports their percentiles.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+SALT_LENGTH = 8
+SAMPLES = 10_000
+
+
+class PoolBusy(Exception):
+    """Raised when the pool already has ``workers + queue_depth`` hashes in flight."""
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class HashPool:
+    def __init__(self, workers, queue_depth, iterations, salt_length=SALT_LENGTH):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.method = f"pbkdf2:sha256:{iterations}"
+        self.salt_length = salt_length
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._upgraded = 0
+        # kind: deque of (queue wait, hashing time) in seconds
+        self._samples = {'verify': deque(maxlen=SAMPLES), 'generate': deque(maxlen=SAMPLES)}
+
+    def _run(self, kind, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PoolBusy(f"{self.workers + self.queue_depth} password hashes already in flight")
+        queued = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._in_flight -= 1
+                    self._samples[kind].append((started - queued, elapsed))
+                self._slots.release()
+
+        return self._executor.submit(task).result()
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def generate(self, password):
+        """Hash ``password`` with the pool's method and work factor."""
+        return self._run('generate', generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """Check ``password`` against ``pwhash``.
+
+        Returns ``(valid, new_hash)``; ``new_hash`` is set when the password
+        matched but ``pwhash`` used an older method or work factor.
+        """
+        def check():
+            if not check_password_hash(pwhash, password):
+                return False, None
+            if self.needs_rehash(pwhash):
+                return True, generate_password_hash(password, self.method, self.salt_length)
+            return True, None
+
+        valid, new_hash = self._run('verify', check)
+        if new_hash:
+            with self._lock:
+                self._upgraded += 1
+        return valid, new_hash
+
+    def stats(self):
+        """Pool settings, counters and latency percentiles in milliseconds."""
+        with self._lock:
+            samples = {kind: list(values) for kind, values in self._samples.items()}
+            stats = {
+                'method': self.method,
+                'workers': self.workers,
+                'queue_depth': self.queue_depth,
+                'in_flight': self._in_flight,
+                'rejected': self._rejected,
+                'upgraded': self._upgraded,
+            }
+        for kind, values in samples.items():
+            waits = sorted(wait for wait, _ in values)
+            hashing = sorted(elapsed for _, elapsed in values)
+            totals = sorted(wait + elapsed for wait, elapsed in values)
+            stats[kind] = {'count': len(values)}
+            for name, ordered in (('total', totals), ('hashing', hashing), ('queue_wait', waits)):
+                stats[kind][name] = {
+                    f"p{q}": round(value * 1000, 2) if value is not None else None
+                    for q, value in ((q, _percentile(ordered, q)) for q in (50, 95, 99))
+                }
+        return stats
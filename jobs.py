@@ -0,0 +1,405 @@
+"""
+Background jobs for map, listing cache and dataset rebuilds.
+
+Jobs are rows in a SQLite file, so no outside broker is needed. Duplicate
+requests are coalesced: while a job with the same kind and arguments is
+still queued, enqueueing it again returns that job (counting the extra
+request) instead of adding another. A burst of rebuild triggers therefore
+costs one rebuild, plus at most one more queued behind a running job so
+changes made while it ran aren't missed.
+
+One worker process runs the jobs in order, holding an exclusive lock on
+``<db>.lock``. However many web workers try to start one, only one builds
+at a time. The worker records each job's progress in its row and exits
+after ``idle_timeout`` seconds without work. Every job publishes its output
+by writing a temporary file and renaming it over the old one, so readers
+see the old artifact or the new one, never a partial file.
+
+    python jobs.py worker [--idle-timeout 60]
+    python jobs.py enqueue map [--shard-by county] [--force]
+    python jobs.py enqueue listing_cache
+    python jobs.py enqueue ingest --store store/ --export new.csv [--export ...] [--output merged.csv]
+                                  [--processed-dir done/]
+    python jobs.py status [JOB_ID]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, so run a single worker by hand
+    fcntl = None
+
+JOBS_DB = os.path.join("instance", "jobs.db")
+POLL_INTERVAL = 0.5
+IDLE_TIMEOUT = 60
+STATES = ['queued', 'running', 'done', 'failed']
+
+# map.py's SHARD_COLUMNS; kept here so enqueueing doesn't import folium
+SHARD_BY = ['county', 'zip']
+MAP_STAGES = ['load', 'colors', 'markers', 'emit', 'write', 'compress']
+SHARDED_MAP_STAGES = ['load', 'colors', 'shard', 'markers', 'emit', 'write', 'compress']
+
+
+def stage_progress(progress, stages):
+    """``on_stage`` callback reporting each known stage as a fraction done."""
+    def on_stage(name):
+        if name in stages:
+            progress(stages.index(name) / len(stages), name)
+    return on_stage
+
+
+def run_map(args, progress):
+    import map as map_build
+    if args.get('shard_by'):
+        return map_build.build_sharded_map(args['csv'], args['output'], args['shard_dir'], args['cache_dir'],
+                                           shard_by=args['shard_by'], force=args.get('force', False),
+                                           on_stage=stage_progress(progress, SHARDED_MAP_STAGES))
+    return map_build.build_map(args['csv'], args['output'], args['cache_dir'], force=args.get('force', False),
+                               on_stage=stage_progress(progress, MAP_STAGES))
+
+
+def run_listing_cache(args, progress):
+    # open_listings builds under the cache's lock, so a web worker building
+    # the same version at the same time can't have its build removed
+    from listing_cache import open_listings
+    progress(0.0, 'cleaning')
+    return open_listings(args['csv'], args['cache_dir']).manifest
+
+
+def _move_processed(path, directory):
+    """Move an applied export into ``directory``, keeping earlier ones of the same name."""
+    os.makedirs(directory, exist_ok=True)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    target = os.path.join(directory, stem + ext)
+    copy = 1
+    while os.path.exists(target):
+        target = os.path.join(directory, f"{stem}.{copy}{ext}")
+        copy += 1
+    os.replace(path, target)
+    return target
+
+
+def run_ingest(args, progress):
+    """Merge scraper exports into a store and publish the merged CSV.
+
+    With ``processed_dir`` set, each export is moved there once it is in the
+    store, so it isn't merged again by the next ingest.
+    """
+    from merge import MergeStore, read_export
+    store = MergeStore(args['store'])
+    steps = len(args['exports']) + 1
+    merged, skipped = [], []
+    for i, path in enumerate(args['exports']):
+        if not os.path.exists(path):
+            # Already applied and moved by a job queued with the same exports
+            skipped.append(path)
+            continue
+        progress(i / steps, f"merging {os.path.basename(path)}")
+        entry = {'export': path, 'summary': store.apply(read_export(path)).summary()}
+        if args.get('processed_dir'):
+            entry['moved_to'] = _move_processed(path, args['processed_dir'])
+        merged.append(entry)
+    progress((steps - 1) / steps, 'exporting')
+    tmp = f"{args['output']}.{os.getpid()}.tmp"
+    rows = store.export(tmp)
+    os.replace(tmp, args['output'])
+    return {'merged': merged, 'skipped': skipped, 'rows': rows, 'output': args['output']}
+
+
+KINDS = {'map': run_map, 'listing_cache': run_listing_cache, 'ingest': run_ingest}
+
+
+def map_args(csv, output, shard_dir, cache_dir, shard_by=None, force=False):
+    """Arguments of a ``map`` job, with paths made absolute."""
+    if shard_by is not None and shard_by not in SHARD_BY:
+        raise ValueError(f"shard_by must be one of: {', '.join(SHARD_BY)}")
+    return {'csv': os.path.abspath(csv), 'output': os.path.abspath(output),
+            'shard_dir': os.path.abspath(shard_dir), 'cache_dir': os.path.abspath(cache_dir),
+            'shard_by': shard_by, 'force': bool(force)}
+
+
+def ingest_args(store, exports, output, processed_dir=None):
+    """Arguments of an ``ingest`` job, with paths made absolute."""
+    if not exports:
+        raise ValueError("ingest needs at least one export")
+    return {'store': os.path.abspath(store), 'exports': [os.path.abspath(path) for path in exports],
+            'output': os.path.abspath(output),
+            'processed_dir': os.path.abspath(processed_dir) if processed_dir else None}
+
+
+class JobQueue:
+    """Jobs table in a SQLite file shared by the web workers and the job worker."""
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, args TEXT NOT NULL, "
+            "key TEXT NOT NULL, state TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, "
+            "requests INTEGER NOT NULL DEFAULT 1, result TEXT, error TEXT, worker_pid INTEGER, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+        self._connection().execute("CREATE INDEX IF NOT EXISTS ix_jobs_state_key ON jobs (state, key)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _transaction(self, work):
+        # BEGIN IMMEDIATE takes the write lock up front, so the check and the
+        # write below can't interleave with another process's
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        del job['key']
+        job['args'] = json.loads(job['args'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def enqueue(self, kind, args=None):
+        """Queue a job, or join the identical one already queued.
+
+        Returns ``(job, created)``.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of: {', '.join(sorted(KINDS))}")
+        args = json.dumps(args or {}, sort_keys=True)
+        key = f"{kind}:{args}"
+
+        def work(connection):
+            row = connection.execute("SELECT id FROM jobs WHERE state = 'queued' AND key = ?", (key,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE jobs SET requests = requests + 1 WHERE id = ?", (row['id'],))
+                return row['id'], False
+            cursor = connection.execute(
+                "INSERT INTO jobs (kind, args, key, state, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (kind, args, key, time.time()))
+            return cursor.lastrowid, True
+
+        job_id, created = self._transaction(work)
+        return self.get(job_id), created
+
+    def get(self, job_id):
+        return self._job(self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def recent(self, limit=20, kind=None):
+        query, params = "SELECT * FROM jobs", ()
+        if kind is not None:
+            query, params = query + " WHERE kind = ?", (kind,)
+        rows = self._connection().execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def counts(self):
+        """Number of jobs in each state."""
+        rows = self._connection().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict({state: 0 for state in STATES}, **{state: count for state, count in rows})
+
+    def claim(self):
+        """Mark the oldest queued job running and return it, or None."""
+        def work(connection):
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' "
+                "AND key NOT IN (SELECT key FROM jobs WHERE state = 'running') ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE jobs SET state = 'running', started_at = ?, worker_pid = ? WHERE id = ?",
+                               (time.time(), os.getpid(), row['id']))
+            return row['id']
+
+        job_id = self._transaction(work)
+        return self.get(job_id) if job_id is not None else None
+
+    def progress(self, job_id, fraction, message=None):
+        self._connection().execute("UPDATE jobs SET progress = ?, message = ? WHERE id = ?",
+                                   (round(fraction, 4), message, job_id))
+
+    def finish(self, job_id, result=None, error=None):
+        self._connection().execute(
+            "UPDATE jobs SET state = ?, progress = ?, message = NULL, result = ?, error = ?, finished_at = ? "
+            "WHERE id = ?",
+            ('failed' if error else 'done', 0.0 if error else 1.0,
+             json.dumps(result) if result is not None else None, error, time.time(), job_id))
+
+    def fail_orphans(self):
+        """Fail jobs left running by a worker that died. Call with the worker lock held."""
+        return self._connection().execute(
+            "UPDATE jobs SET state = 'failed', error = 'worker exited before the job finished', finished_at = ? "
+            "WHERE state = 'running'", (time.time(),)).rowcount
+
+
+def run_job(queue, job):
+    started = time.perf_counter()
+    logging.info(f"Job {job['id']} ({job['kind']}) started")
+    try:
+        result = KINDS[job['kind']](job['args'], lambda fraction, message=None:
+                                    queue.progress(job['id'], fraction, message))
+    except Exception as e:
+        logging.exception(f"Job {job['id']} ({job['kind']}) failed")
+        queue.finish(job['id'], error=f"{type(e).__name__}: {e}")
+    else:
+        queue.finish(job['id'], result=result)
+        logging.info(f"Job {job['id']} ({job['kind']}) done in {time.perf_counter() - started:.2f}s")
+
+
+def _lock(path):
+    """Open and exclusively lock the worker lock file, or return None if it's held."""
+    lock = open(path + ".lock", 'w')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+    return lock
+
+
+def worker_running(path=JOBS_DB):
+    lock = _lock(path)
+    if lock is None:
+        return True
+    lock.close()
+    return False
+
+
+def run_worker(path=JOBS_DB, idle_timeout=None, poll_interval=POLL_INTERVAL):
+    """Run queued jobs until none arrive for ``idle_timeout`` seconds (forever if None).
+
+    Returns the number of jobs run, or None if another worker is running.
+    """
+    lock = _lock(path)
+    if lock is None:
+        return None
+    queue = JobQueue(path)
+    orphans = queue.fail_orphans()
+    if orphans:
+        logging.warning(f"Marked {orphans} job(s) left running by a previous worker as failed")
+
+    ran = 0
+    idle_since = time.monotonic()
+    while True:
+        job = queue.claim()
+        if job is not None:
+            run_job(queue, job)
+            ran += 1
+            idle_since = time.monotonic()
+        elif idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+            lock.close()
+            # A job queued just before the lock was released may have seen this
+            # worker as running and not started another, so look once more
+            if not queue.counts()['queued']:
+                return ran
+            lock = _lock(path)
+            if lock is None:
+                return ran
+            idle_since = time.monotonic()
+        else:
+            time.sleep(poll_interval)
+
+
+def spawn_worker(path=JOBS_DB, idle_timeout=IDLE_TIMEOUT):
+    """Start ``python jobs.py worker`` in the background unless a worker is running."""
+    if worker_running(path):
+        return None
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--db', os.path.abspath(path), 'worker',
+         '--idle-timeout', str(idle_timeout)],
+        stdin=subprocess.DEVNULL, start_new_session=True)
+
+
+def describe(job):
+    line = f"#{job['id']} {job['kind']} {job['state']}"
+    if job['state'] == 'running':
+        line += f" {job['progress']:.0%} {job['message'] or ''}"
+    if job['requests'] > 1:
+        line += f" ({job['requests']} requests)"
+    if job['error']:
+        line += f": {job['error']}"
+    return line
+
+
+def main(argv=None):
+    from listing_cache import CACHE_DIR, DATASET
+
+    parser = argparse.ArgumentParser(description="Queue and run map and dataset rebuilds.")
+    parser.add_argument('--db', default=JOBS_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    worker_cmd = commands.add_parser('worker', help="run queued jobs")
+    worker_cmd.add_argument('--idle-timeout', type=float, help="exit after this many idle seconds")
+
+    enqueue_cmd = commands.add_parser('enqueue', help="queue a job and start a worker if none is running")
+    enqueue_cmd.add_argument('kind', choices=sorted(KINDS))
+    enqueue_cmd.add_argument('--csv', default=DATASET)
+    enqueue_cmd.add_argument('--shard-by', choices=SHARD_BY)
+    enqueue_cmd.add_argument('--force', action='store_true')
+    enqueue_cmd.add_argument('--store', help="merge store directory (ingest)")
+    enqueue_cmd.add_argument('--export', action='append', default=[], dest='exports',
+                             help="scraper export to merge (ingest; repeatable)")
+    enqueue_cmd.add_argument('--output', help="merged CSV to publish (ingest; default --csv)")
+    enqueue_cmd.add_argument('--processed-dir', help="move exports here once merged (ingest)")
+    enqueue_cmd.add_argument('--no-worker', action='store_true', help="only queue the job")
+
+    status_cmd = commands.add_parser('status', help="show recent jobs or one job")
+    status_cmd.add_argument('job_id', nargs='?', type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == 'worker':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+        ran = run_worker(args.db, args.idle_timeout)
+        print("❌ Another worker is already running" if ran is None else f"✅ Worker ran {ran} job(s)")
+        return
+
+    queue = JobQueue(args.db)
+    if args.command == 'enqueue':
+        if args.kind == 'map':
+            from map import MAP_FILE, SHARD_DIR, CACHE_DIR as MAP_CACHE_DIR
+            job_args = map_args(args.csv, MAP_FILE, SHARD_DIR, MAP_CACHE_DIR, args.shard_by, args.force)
+        elif args.kind == 'listing_cache':
+            job_args = {'csv': os.path.abspath(args.csv), 'cache_dir': os.path.abspath(CACHE_DIR)}
+        else:
+            if not args.store or not args.exports:
+                parser.error("ingest needs --store and at least one export")
+            job_args = ingest_args(args.store, args.exports, args.output or args.csv, args.processed_dir)
+        job, created = queue.enqueue(args.kind, job_args)
+        print(f"✅ {'Queued' if created else 'Already queued'}: {describe(job)}")
+        if not args.no_worker and spawn_worker(args.db) is not None:
+            print("   Started a worker")
+    elif args.job_id is not None:
+        job = queue.get(args.job_id)
+        print(json.dumps(job, indent=2) if job else f"❌ No job {args.job_id}")
+    else:
+        for job in queue.recent():
+            print(describe(job))
+
+
+if __name__ == "__main__":
+    main()
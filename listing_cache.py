@@ -0,0 +1,239 @@
+"""
+Memory-mapped columnar cache of the cleaned listing dataset.
+
+``build_cache`` runs the cleaning in ``listings.py`` once and writes each
+column as a plain ``.npy`` file: numbers as float64, ZIP codes and ids as
+fixed-width bytes, and addresses/photo URLs as one UTF-8 blob plus an
+offsets array. ``open_listings`` memory-maps those files read-only, so every
+web worker shares the same page-cached copy and startup costs a few
+milliseconds instead of a CSV parse. The cache is keyed on the source file's
+size and mtime and rebuilt when either changes. ``row_hash`` fingerprints
+each cleaned row, so consumers can tell which listings changed between two
+builds.
+
+    python listing_cache.py [updated_dataset.csv]
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DATASET = "updated_dataset.csv"
+CACHE_DIR = os.path.join("instance", "listing_cache")
+MANIFEST = "manifest.json"
+# Bumped when the cached columns change, so older caches are rebuilt
+FORMAT = 3
+
+# Cached column names; build_cache maps them to the CSV columns. Reading a
+# cache never imports pandas. Columns missing from the CSV are cached as NaN
+# or empty strings.
+NUMERIC_COLUMNS = ['price', 'beds', 'baths', 'lat', 'lon', 'sqft', 'price_reduced']
+FIXED_COLUMNS = ['property_id', 'zipcode', 'type', 'fips']
+TEXT_COLUMNS = ['address', 'photo']
+
+
+def _source_columns():
+    import listings
+    return {
+        'price': listings.PRICE, 'beds': listings.BEDS, 'baths': listings.BATHS,
+        'lat': listings.LAT, 'lon': listings.LON, 'sqft': listings.SQFT,
+        'price_reduced': listings.PRICE_REDUCED,
+        'property_id': listings.PROPERTY_ID, 'zipcode': listings.ZIPCODE,
+        'type': listings.TYPE, 'fips': listings.FIPS,
+        'address': listings.ADDRESS, 'photo': listings.PHOTO,
+    }
+
+
+class TextColumn:
+    """Variable-length strings stored as a UTF-8 blob and an offsets array."""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def take(self, rows):
+        return [self[i] for i in rows]
+
+
+class ListingColumns:
+    """Read-only view of a cache build; columns are attributes."""
+
+    def __init__(self, path, manifest):
+        self.path = Path(path)
+        self.manifest = manifest
+        self.rows = manifest['rows']
+        for name in NUMERIC_COLUMNS + FIXED_COLUMNS + ['row_hash']:
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode='r'))
+        for name in TEXT_COLUMNS:
+            setattr(self, name, TextColumn(
+                np.load(self.path / f"{name}.data.npy", mmap_mode='r'),
+                np.load(self.path / f"{name}.offsets.npy", mmap_mode='r')))
+        self._id_order = None
+        self._sorted_ids = None
+
+    def __len__(self):
+        return self.rows
+
+    def find(self, property_id):
+        """Row of a listing by id, or None. Sorts the ids on first use."""
+        if self._id_order is None:
+            order = np.argsort(self.property_id, kind='stable')
+            self._sorted_ids, self._id_order = self.property_id[order], order
+        key = str(property_id).encode('utf-8')
+        position = np.searchsorted(self._sorted_ids, key)
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == key:
+            return int(self._id_order[position])
+        return None
+
+
+def diff_rows(old_hashes, new_hashes):
+    """Positions of rows only in ``old_hashes`` (removed or changed) and only
+    in ``new_hashes`` (added or changed), by ``row_hash``."""
+    return (np.flatnonzero(~_isin(old_hashes, new_hashes)),
+            np.flatnonzero(~_isin(new_hashes, old_hashes)))
+
+
+def _isin(values, pool):
+    # Searching sorted values in a sorted pool is several times faster than
+    # np.isin on a million uint64s
+    values = np.asarray(values)
+    pool = np.sort(pool)
+    order = np.argsort(values)
+    ordered = values[order]
+    found = np.searchsorted(pool, ordered)
+    hit = np.zeros(len(values), dtype=bool)
+    hit[order] = (found < len(pool)) & (pool[np.minimum(found, len(pool) - 1)] == ordered)
+    return hit
+
+
+def source_fingerprint(source):
+    stat = os.stat(source)
+    return {'source': os.path.abspath(source), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'format': FORMAT}
+
+
+def _is_fresh(manifest, fingerprint):
+    return all(manifest.get(key) == value for key, value in fingerprint.items())
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_cache(source=DATASET, cache_dir=CACHE_DIR):
+    """Clean ``source`` and write its columns under ``cache_dir``.
+
+    Each build goes to its own subdirectory and the manifest is swapped in
+    atomically, so workers that already mapped the previous build keep
+    reading it undisturbed.
+    """
+    import pandas as pd
+    from listings import iter_listing_chunks
+    source_columns = _source_columns()
+
+    fingerprint = source_fingerprint(source)
+    version = f"{fingerprint['size']:x}-{fingerprint['mtime_ns']:x}"
+    target = Path(cache_dir) / version
+    tmp = Path(cache_dir) / f"{version}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    numeric = {name: [] for name in NUMERIC_COLUMNS}
+    fixed = {name: [] for name in FIXED_COLUMNS}
+    offsets = {name: [np.zeros(1, dtype=np.int64)] for name in TEXT_COLUMNS}
+    blobs = {name: open(tmp / f"{name}.blob", 'wb') for name in TEXT_COLUMNS}
+    row_hashes = []
+    rows = 0
+    try:
+        for chunk in iter_listing_chunks(source):
+            rows += len(chunk)
+            for column in source_columns.values():
+                if column not in chunk:
+                    chunk[column] = np.nan
+            columns = [source_columns[name] for name in NUMERIC_COLUMNS + FIXED_COLUMNS + TEXT_COLUMNS]
+            row_hashes.append(pd.util.hash_pandas_object(chunk[columns], index=False).to_numpy())
+            for name in NUMERIC_COLUMNS:
+                numeric[name].append(chunk[source_columns[name]].to_numpy(dtype=np.float64))
+            for name in FIXED_COLUMNS:
+                values = chunk[source_columns[name]].astype(object).fillna('').astype(str)
+                fixed[name].append(values.str.encode('utf-8').to_numpy())
+            for name in TEXT_COLUMNS:
+                encoded = chunk[source_columns[name]].fillna('').astype(str).str.encode('utf-8')
+                blobs[name].write(b''.join(encoded))
+                lengths = encoded.str.len().to_numpy(dtype=np.int64)
+                offsets[name].append(offsets[name][-1][-1:] + np.cumsum(lengths))
+    finally:
+        for blob in blobs.values():
+            blob.close()
+
+    for name, parts in numeric.items():
+        np.save(tmp / f"{name}.npy", np.concatenate(parts) if parts else np.empty(0))
+    for name, parts in fixed.items():
+        values = np.concatenate(parts) if parts else np.empty(0, dtype=object)
+        width = max((len(v) for v in values), default=1) or 1
+        np.save(tmp / f"{name}.npy", values.astype(f"S{width}"))
+    np.save(tmp / "row_hash.npy", np.concatenate(row_hashes) if row_hashes else np.empty(0, dtype=np.uint64))
+    for name in TEXT_COLUMNS:
+        np.save(tmp / f"{name}.offsets.npy", np.concatenate(offsets[name]))
+        blob = tmp / f"{name}.blob"
+        np.save(tmp / f"{name}.data.npy", np.fromfile(blob, dtype=np.uint8))
+        blob.unlink()
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+    manifest = dict(fingerprint, version=version, rows=rows, built_at=time.time())
+    manifest_tmp = Path(cache_dir) / f"{MANIFEST}.tmp"
+    manifest_tmp.write_text(json.dumps(manifest))
+    os.replace(manifest_tmp, Path(cache_dir) / MANIFEST)
+
+    # Older builds may still be mapped by running workers; unlinking them is
+    # safe on POSIX since the mappings stay valid until they're closed.
+    for stale in Path(cache_dir).iterdir():
+        if stale.is_dir() and stale.name != version:
+            shutil.rmtree(stale, ignore_errors=True)
+    return manifest
+
+
+def open_listings(source=DATASET, cache_dir=CACHE_DIR):
+    """Memory-map the cached columns for ``source``, rebuilding if stale."""
+    fingerprint = source_fingerprint(source)
+    manifest = _read_manifest(cache_dir)
+    if manifest is None or not _is_fresh(manifest, fingerprint):
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, ".lock"), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another worker may have finished the build while we waited
+            manifest = _read_manifest(cache_dir)
+            if manifest is None or not _is_fresh(manifest, fingerprint):
+                manifest = build_cache(source, cache_dir)
+    return ListingColumns(os.path.join(cache_dir, manifest['version']), manifest)
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else DATASET
+    start = time.perf_counter()
+    manifest = build_cache(source)
+    print(f"✅ Cached {manifest['rows']:,} listings from {source} "
+          f"in {time.perf_counter() - start:.2f}s at {CACHE_DIR}/{manifest['version']}")
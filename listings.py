@@ -0,0 +1,206 @@
+"""
+Loading and cleaning of the scraped listing CSVs.
+
+These are the cleaning steps ``map.py`` has always applied, shared so the
+web app and the map builder agree on what a usable listing is. Files are
+streamed in fixed-size chunks reading only the columns listed in
+``USECOLS``, so memory stays bounded however large the scraper export is.
+
+Run ``python listings.py input.csv -o cleaned.csv`` to clean a file and
+report throughput and peak memory.
+"""
+
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DATASET = "updated_dataset.csv"
+
+PROPERTY_ID = 'property_id'
+PRICE = 'list_price'
+BEDS = 'description/beds'
+BATHS = 'description/baths_consolidated'
+LAT = 'location/address/coordinate/lat'
+LON = 'location/address/coordinate/lon'
+PHOTO = 'primary_photo/href'
+ADDRESS = 'location/address/line'
+ZIPCODE = 'zipcode'
+POSTAL_CODE = 'location/address/postal_code'
+FIPS = 'location/county/fips_code'
+SQFT = 'description/sqft'
+TYPE = 'description/type'
+PRICE_REDUCED = 'price_reduced_amount'
+
+# Ensure the necessary columns exist
+REQUIRED_COLUMNS = [PRICE, BEDS, LAT, LON, PHOTO, ADDRESS, BATHS]
+NUMERIC_COLUMNS = [PRICE, BEDS, LAT, LON, BATHS]
+# Used when present; older exports lack them
+OPTIONAL_NUMERIC_COLUMNS = [SQFT, PRICE_REDUCED]
+
+# Only these of the ~150 scraper columns are read. Numbers are read as text
+# and coerced to float64 in clean_listings, so a stray "Contact agent" or
+# "2.5+" becomes NaN instead of failing the whole read. Types and county
+# codes repeat across thousands of rows, so they are categories.
+USECOLS = [PROPERTY_ID, ZIPCODE, FIPS, SQFT, TYPE, PRICE_REDUCED] + REQUIRED_COLUMNS
+CATEGORY_COLUMNS = [TYPE, FIPS]
+DTYPES = {
+    PROPERTY_ID: str,
+    ZIPCODE: str,
+    POSTAL_CODE: str,
+    FIPS: 'category',
+    SQFT: str,
+    TYPE: 'category',
+    PRICE_REDUCED: str,
+    PRICE: str,
+    BEDS: str,
+    LAT: str,
+    LON: str,
+    BATHS: str,
+    PHOTO: str,
+    ADDRESS: str,
+}
+# Five-digit ZIPs, ZIP+4 ("07424-1234" or "074241234"), and ZIPs a
+# spreadsheet turned into numbers ("7424" or "7424.0")
+ZIP5 = r'^(\d{5})(?:-?\d{4})?$'
+ZIP_NUMBER = r'^(\d{1,5})(?:\.0*)?$'
+CHUNK_ROWS = 50_000
+
+
+def clean_zipcodes(data, stats=None):
+    """Reduce ZIPs to five digits and drop rows without a usable one.
+
+    Rows with a ZIP that can't be read (``stats.bad_zipcodes``) are dropped
+    along with those that have none.
+    """
+    text = data[ZIPCODE].astype(str).str.strip()
+    missing = data[ZIPCODE].isna() | text.isin(['', 'nan', 'NaN', 'None'])
+    zipcodes = text.str.extract(ZIP5)[0].fillna(text.str.extract(ZIP_NUMBER)[0])
+    if stats is not None:
+        stats.bad_zipcodes += int((zipcodes.isna() & ~missing).sum())
+    data = data[zipcodes.notna()].copy()
+    data[ZIPCODE] = zipcodes[zipcodes.notna()].str.zfill(5)
+    return data
+
+
+def clean_listings(data, stats=None):
+    """Apply the map cleaning steps to a raw listing frame."""
+    data = clean_zipcodes(data, stats)
+    data = data.dropna(subset=REQUIRED_COLUMNS)
+
+    # Convert necessary columns to numeric types; float64 whatever a chunk
+    # held, so whole-number chunks don't come out as int64
+    for column in NUMERIC_COLUMNS + [c for c in OPTIONAL_NUMERIC_COLUMNS if c in data]:
+        data[column] = pd.to_numeric(data[column], errors='coerce').astype('float64')
+
+    return data.dropna(subset=[PRICE, BEDS, LAT, LON])
+
+
+class IngestStats:
+    """Row counts, throughput and peak memory for one ingest run."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_kept = 0
+        self.bad_zipcodes = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def update(self, rows_read, rows_kept):
+        self.rows_read += rows_read
+        self.rows_kept += rows_kept
+        self.chunks += 1
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def peak_rss_mb(self):
+        """Peak resident set size of this process, or None if unknown."""
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes elsewhere
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+    def summary(self):
+        peak = self.peak_rss_mb
+        peak_label = f"{peak:,.1f} MB" if peak is not None else "n/a"
+        return (f"{self.rows_read:,} rows read, {self.rows_kept:,} kept in {self.chunks} chunks "
+                f"({self.bad_zipcodes:,} with an unreadable ZIP), "
+                f"{self.elapsed:.2f}s ({self.rows_per_sec:,.0f} rows/sec), peak RSS {peak_label}")
+
+
+def iter_listing_chunks(path=DATASET, chunk_rows=CHUNK_ROWS, stats=None):
+    """Yield cleaned listing frames of at most ``chunk_rows`` rows.
+
+    Older exports have no ``zipcode`` column; their postal code is used
+    instead.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [column for column in USECOLS if column in header]
+    rename = {}
+    if ZIPCODE not in header and POSTAL_CODE in header:
+        usecols.append(POSTAL_CODE)
+        rename = {POSTAL_CODE: ZIPCODE}
+
+    dtypes = {column: DTYPES[column] for column in usecols}
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunk_rows):
+        rows_read = len(chunk)
+        chunk = clean_listings(chunk.rename(columns=rename), stats)
+        if stats is not None:
+            stats.update(rows_read, len(chunk))
+        yield chunk
+
+
+def load_listings(path=DATASET, chunk_rows=CHUNK_ROWS, stats=None):
+    """Read and clean a listing CSV into one frame.
+
+    Only the parsing is chunked: the cleaned rows (``USECOLS`` only) are
+    all held in memory, as the map needs every listing at once. Use
+    ``iter_listing_chunks`` to stream instead.
+    """
+    chunks = list(iter_listing_chunks(path, chunk_rows, stats))
+    if not chunks:
+        return clean_listings(pd.read_csv(path, nrows=0, usecols=lambda c: c in USECOLS))
+    data = pd.concat(chunks)
+    # Chunks with different categories concatenate as plain objects
+    for column in CATEGORY_COLUMNS:
+        if column in data and data[column].dtype != 'category':
+            data[column] = data[column].astype('category')
+    return data
+
+
+def ingest(path, output=None, chunk_rows=CHUNK_ROWS):
+    """Clean ``path`` chunk by chunk, optionally writing the result to ``output``."""
+    stats = IngestStats()
+    first = True
+    for chunk in iter_listing_chunks(path, chunk_rows, stats):
+        if output:
+            chunk.to_csv(output, mode='w' if first else 'a', header=first, index=False)
+            first = False
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean a listing CSV in bounded memory.")
+    parser.add_argument('input', nargs='?', default=DATASET)
+    parser.add_argument('-o', '--output', help="write cleaned listings to this CSV")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    stats = ingest(args.input, args.output, args.chunk_rows)
+    print(f"✅ {args.input}: {stats.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,26 @@
 import os
+import glob
+import json
 import logging
-from flask import Flask, render_template, redirect, request, url_for, session
+import math
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import (Flask, render_template, redirect, request, url_for, session, jsonify, Response,
+                   stream_with_context, g, has_request_context)
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event, delete, insert, select
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 
+from artifacts import StaticArtifact
+from batching import WriteBatcher, WriteFailed
+from hashing import HashPool, PoolBusy
+from metrics import Registry
+from result_cache import ResultCache, form_key
+
 # Load environment variables
 load_dotenv()
 
@@ -14,6 +30,36 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'fallback-secret-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///users.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['LISTINGS_CSV'] = os.getenv('LISTINGS_CSV', 'updated_dataset.csv')
+app.config['MAX_BATCH_SCENARIOS'] = int(os.getenv('MAX_BATCH_SCENARIOS', 1_000_000))
+app.config['MAX_COMPS_BATCH'] = int(os.getenv('MAX_COMPS_BATCH', 1000))
+app.config['MAX_AFFORDABILITY_BATCH'] = int(os.getenv('MAX_AFFORDABILITY_BATCH', 10_000))
+app.config['LISTING_CACHE_DIR'] = os.getenv('LISTING_CACHE_DIR', os.path.join(app.instance_path, 'listing_cache'))
+app.config['MARKET_AGGREGATES'] = os.getenv('MARKET_AGGREGATES', os.path.join(app.instance_path, 'market_aggregates.json'))
+app.config['PROJECTION_WORKERS'] = int(os.getenv('PROJECTION_WORKERS', 0)) or None  # None: one per CPU
+app.config['MAX_PROJECTION_CELLS'] = int(os.getenv('MAX_PROJECTION_CELLS', 50_000_000))  # paths x properties
+app.config['HASH_WORKERS'] = int(os.getenv('HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+app.config['HASH_QUEUE_DEPTH'] = int(os.getenv('HASH_QUEUE_DEPTH', 64))
+app.config['PASSWORD_HASH_ITERATIONS'] = int(os.getenv('PASSWORD_HASH_ITERATIONS', 1_000_000))
+app.config['MAX_SAVE_BATCH'] = int(os.getenv('MAX_SAVE_BATCH', 10_000))
+app.config['SAVE_WAIT_SECONDS'] = float(os.getenv('SAVE_WAIT_SECONDS', 2))  # how long a form save waits for its batch
+# /map isn't versioned and sits behind login, so browsers revalidate (a ~300 byte 304) on each visit
+app.config['MAP_CACHE_CONTROL'] = os.getenv('MAP_CACHE_CONTROL', 'private, no-cache')
+app.config['MAP_SHARD_CACHE_CONTROL'] = os.getenv('MAP_SHARD_CACHE_CONTROL', 'private, max-age=31536000, immutable')
+app.config['POPUP_CACHE_CONTROL'] = os.getenv('POPUP_CACHE_CONTROL', 'private, max-age=300')
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.getenv('RESULT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+app.config['RESULT_CACHE_TTL'] = int(os.getenv('RESULT_CACHE_TTL', 3600))
+app.config['RESULT_CACHE_SHARED'] = os.getenv('RESULT_CACHE_SHARED', '')  # SQLite file shared by workers
+app.config['SLOW_REQUEST_MS'] = float(os.getenv('SLOW_REQUEST_MS', 1000))
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN', '')  # when set, /metrics requires it as a bearer token
+app.config['MAP_BUILD_STATS'] = os.getenv('MAP_BUILD_STATS',
+                                          os.path.join(app.instance_path, 'map_cache', 'build_stats.json'))
+app.config['JOBS_DB'] = os.getenv('JOBS_DB', os.path.join(app.instance_path, 'jobs.db'))
+# 'auto' starts a job worker process on demand; 'off' if one runs separately (python jobs.py worker)
+app.config['JOB_WORKER'] = os.getenv('JOB_WORKER', 'auto')
+app.config['JOB_WORKER_IDLE_TIMEOUT'] = int(os.getenv('JOB_WORKER_IDLE_TIMEOUT', 60))
+app.config['INGEST_DIR'] = os.getenv('INGEST_DIR', os.path.join(app.instance_path, 'exports'))
+app.config['MERGE_STORE'] = os.getenv('MERGE_STORE', os.path.join(app.instance_path, 'merge_store'))
 
 # Logging configuration
 logging.basicConfig(
@@ -22,12 +68,162 @@ logging.basicConfig(
 )
 db = SQLAlchemy(app)
 
+# WAL lets readers run while a write is in progress; NORMAL sync is safe in WAL mode
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+]
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+# Instrumentation, served in Prometheus text format from /metrics
+metrics = Registry()
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', "Request latency by route",
+                                    ('route', 'method', 'status'))
+REQUESTS_IN_FLIGHT = metrics.gauge('http_requests_in_flight', "Requests currently being handled", ('route',))
+SLOW_REQUESTS = metrics.counter('http_slow_requests_total', "Requests slower than SLOW_REQUEST_MS", ('route',))
+DB_QUERY_SECONDS = metrics.histogram('db_query_duration_seconds', "SQL statement latency", ('statement',))
+DB_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started')
+    verb = statement.lstrip()[:6].upper()
+    DB_QUERY_SECONDS.observe(elapsed, statement=verb if verb in DB_STATEMENTS else 'OTHER')
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_seconds = g.get('db_seconds', 0.0) + elapsed
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # The URL rule, not the path, so IDs in URLs don't explode the label set
+    g.route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS_IN_FLIGHT.inc(route=g.route)
+
+@app.after_request
+def record_request(response):
+    if 'request_started' in g:
+        elapsed = time.perf_counter() - g.request_started
+        REQUEST_SECONDS.observe(elapsed, route=g.route, method=request.method, status=response.status_code)
+        if elapsed * 1000 >= app.config['SLOW_REQUEST_MS']:
+            SLOW_REQUESTS.inc(route=g.route)
+            logging.warning(f"Slow request: {request.method} {request.path} -> {response.status_code} "
+                            f"in {elapsed * 1000:.0f}ms ({g.get('db_queries', 0)} queries, "
+                            f"{g.get('db_seconds', 0.0) * 1000:.0f}ms in the database)")
+    return response
+
+@app.teardown_request
+def finish_request(exc):
+    if 'route' in g:
+        REQUESTS_IN_FLIGHT.dec(route=g.route)
+
 # Database Model
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(25), unique=True, nullable=False)
     password = db.Column(db.String(150), nullable=False)
 
+class SavedScenario(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    category = db.Column(db.String(40), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    inputs = db.Column(db.JSON, nullable=False)
+    result = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+
+    # Cover the keyset-paginated listings (all, or one category), so pages
+    # never touch the table itself
+    __table_args__ = (
+        db.Index('ix_saved_scenario_listing', 'user_id', 'id', 'category', 'name', 'created_at'),
+        db.Index('ix_saved_scenario_category', 'user_id', 'category', 'id', 'name', 'created_at'),
+    )
+
+class WatchlistItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    property_id = db.Column(db.String(40), nullable=False)
+    note = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'property_id'),
+        db.Index('ix_watchlist_item_listing', 'user_id', 'id', 'property_id', 'note', 'created_at'),
+    )
+
+def current_user_id():
+    return db.session.execute(select(User.id).filter_by(username=session['username'])).scalar()
+
+# Saves from form posts are queued and inserted in batches
+_write_batcher = None
+_write_batcher_lock = threading.Lock()
+
+def write_rows(table, rows):
+    with app.app_context():
+        db.session.execute(insert(db.metadata.tables[table]), rows)
+        db.session.commit()
+
+def get_write_batcher():
+    global _write_batcher
+    with _write_batcher_lock:
+        if _write_batcher is None:
+            _write_batcher = WriteBatcher(write_rows)
+    return _write_batcher
+
+def save_scenario(category, inputs, result):
+    """Queue a saved scenario; returns a message to show the user if it was
+    dropped or is still waiting on a retry."""
+    user_id = current_user_id()
+    if user_id is None:
+        return None
+    saved = get_write_batcher().add(SavedScenario.__tablename__, {
+        'user_id': user_id, 'category': category, 'name': '', 'inputs': inputs, 'result': result,
+    })
+    try:
+        saved.result(timeout=app.config['SAVE_WAIT_SECONDS'])
+    except FutureTimeout:
+        # Still queued behind a retry; it may yet be written or dropped
+        return "Your scenario is still being saved. Check your saved scenarios in a minute"
+    except WriteFailed:
+        return "Your scenario could not be saved, please try again"
+    return None
+
+# Password hashing runs on a bounded pool so login bursts can't starve other routes
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+def get_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = HashPool(app.config['HASH_WORKERS'], app.config['HASH_QUEUE_DEPTH'],
+                                  app.config['PASSWORD_HASH_ITERATIONS'])
+    return _hash_pool
+
+def hash_busy(template):
+    logging.warning("Password hash pool is full; rejecting request")
+    return render_template(template, error='Too many requests right now, please try again shortly',
+                           logged_in=False), 503, {'Retry-After': '1'}
+
+def with_hash_timing(response, started):
+    response.headers['Server-Timing'] = f"hash;dur={(time.perf_counter() - started) * 1000:.1f}"
+    return response
+
 # Routes
 @app.route('/')
 def home():
@@ -42,9 +238,20 @@ def login():
         password = request.form['password']
         user = User.query.filter_by(username=username).first()
 
-        if user and check_password_hash(user.password, password):
-            session['username'] = username
-            return redirect(url_for('dashboard'))
+        if user:
+            started = time.perf_counter()
+            try:
+                valid, upgraded_hash = get_hash_pool().verify(user.password, password)
+            except PoolBusy:
+                return hash_busy('login.html')
+
+            if valid:
+                if upgraded_hash:
+                    user.password = upgraded_hash
+                    db.session.commit()
+                    logging.info(f"Upgraded password hash for user: {username}")
+                session['username'] = username
+                return with_hash_timing(redirect(url_for('dashboard')), started)
         
         return render_template('login.html', error='Invalid credentials', logged_in=False)
     return render_template('login.html', logged_in=False)
@@ -62,15 +269,25 @@ def register():
         if User.query.filter_by(username=username).first():
             return render_template('register.html', error='Username already exists')
 
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256', salt_length=8)
+        started = time.perf_counter()
+        try:
+            hashed_password = get_hash_pool().generate(password)
+        except PoolBusy:
+            return hash_busy('register.html')
         new_user = User(username=username, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
 
-        return redirect(url_for('login'))
+        return with_hash_timing(redirect(url_for('login')), started)
 
     return render_template('register.html')
 
+@app.route('/api/auth/hash_stats')
+def api_hash_stats():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+    return jsonify(get_hash_pool().stats())
+
 @app.route('/dashboard')
 def dashboard():
     if 'username' not in session:
@@ -84,6 +301,10 @@ def delete_user():
 
     user = User.query.filter_by(username=session['username']).first()
     if user:
+        # Bulk deletes; saved rows are never loaded into the session
+        get_write_batcher().flush()
+        db.session.execute(delete(SavedScenario).where(SavedScenario.user_id == user.id))
+        db.session.execute(delete(WatchlistItem).where(WatchlistItem.user_id == user.id))
         db.session.delete(user)
         db.session.commit()
         session.pop('username', None)
@@ -91,14 +312,451 @@ def delete_user():
 
     return redirect(url_for('dashboard'))
 
+# The map page has no template variables; it's served as a static artifact
+# (precompressed by map.py) instead of being rendered through Jinja
+_map_artifact = StaticArtifact(os.path.join(app.root_path, app.template_folder, 'map.html'),
+                               cache_control=app.config['MAP_CACHE_CONTROL'])
+
 @app.route('/map')
 def show_map():
     if 'username' not in session:
         return redirect(url_for('login'))
-    return render_template('map.html')
+    return _map_artifact.response(request)
+
+# Marker scripts of a sharded map build (python map.py --shard-by county).
+# Their URLs carry a content version, so browsers may keep them.
+_shard_artifacts = {}
+_shard_dir = os.path.join(app.root_path, app.template_folder, 'map_shards')
+
+@app.route('/map/shards/<name>.js')
+def map_shard(name):
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+    path = os.path.join(_shard_dir, f"{name}.js")
+    if not re.fullmatch(r'[0-9A-Za-z_-]+', name) or not os.path.exists(path):
+        return jsonify(error="Unknown shard"), 404
+    artifact = _shard_artifacts.get(name)
+    if artifact is None:
+        artifact = _shard_artifacts.setdefault(name, StaticArtifact(
+            path, mimetype='text/javascript', cache_control=app.config['MAP_SHARD_CACHE_CONTROL']))
+    return artifact.response(request)
+
+# Map and listing cache rebuilds run as background jobs (jobs.py): requests
+# for the same rebuild are coalesced, and the worker publishes by rename
+_job_queue = None
+_job_worker = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            from jobs import JobQueue
+            _job_queue = JobQueue(app.config['JOBS_DB'])
+    return _job_queue
+
+def start_job_worker():
+    """Start a worker process unless this process's last one is still running
+    (jobs.py makes sure only one of them across all web workers runs jobs)."""
+    global _job_worker
+    from jobs import spawn_worker
+    with _job_queue_lock:
+        if _job_worker is None or _job_worker.poll() is not None:
+            _job_worker = spawn_worker(app.config['JOBS_DB'], app.config['JOB_WORKER_IDLE_TIMEOUT'])
+
+def job_args(kind, options):
+    """Arguments for a job the web app may queue; paths come from the config, not the request."""
+    from jobs import KINDS, ingest_args, map_args
+    if kind == 'map':
+        return map_args(app.config['LISTINGS_CSV'], _map_artifact.path, _shard_dir,
+                        os.path.dirname(app.config['MAP_BUILD_STATS']),
+                        options.get('shard_by'), options.get('force') is True)
+    if kind == 'listing_cache':
+        return {'csv': os.path.abspath(app.config['LISTINGS_CSV']),
+                'cache_dir': os.path.abspath(app.config['LISTING_CACHE_DIR'])}
+    if kind == 'ingest':
+        # Merges every export waiting in INGEST_DIR and publishes over LISTINGS_CSV;
+        # merged exports are moved to INGEST_DIR/processed so they aren't merged again
+        exports = sorted(glob.glob(os.path.join(app.config['INGEST_DIR'], '*.csv')))
+        if not exports:
+            raise ValueError(f"No exports to ingest in {app.config['INGEST_DIR']}")
+        return ingest_args(app.config['MERGE_STORE'], exports, app.config['LISTINGS_CSV'],
+                           os.path.join(app.config['INGEST_DIR'], 'processed'))
+    raise ValueError(f"kind must be one of: {', '.join(sorted(KINDS))}")
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def api_jobs():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    queue = get_job_queue()
+    if request.method == 'GET':
+        try:
+            limit = min(int(request.args.get('limit', 20)), 100)
+        except ValueError:
+            return jsonify(error="limit must be an integer"), 400
+        return jsonify(jobs=queue.recent(limit, request.args.get('kind')))
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error='Expected a JSON object with a "kind"'), 400
+    try:
+        kind = payload.get('kind')
+        job, created = queue.enqueue(kind, job_args(kind, payload))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if app.config['JOB_WORKER'] == 'auto':
+        start_job_worker()
+    logging.info(f"Job {job['id']} ({kind}) {'queued' if created else 'coalesced'} by {session['username']}")
+    return jsonify(job=job, coalesced=not created), 202, {'Location': url_for('api_job', job_id=job['id'])}
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify(error="Unknown job"), 404
+    return jsonify(job)
+
+# Cleaned listings are memory-mapped from the columnar cache (shared by all
+# workers through the page cache) and indexed on first use, so workers that
+# never serve map data don't pay for them.
+_listings = None
+_property_index = None
+_listings_lock = threading.Lock()
+
+def get_listings():
+    global _listings, _property_index
+    from listing_cache import open_listings, source_fingerprint
+    with _listings_lock:
+        current = source_fingerprint(app.config['LISTINGS_CSV'])
+        if _listings is None or any(_listings.manifest.get(k) != v for k, v in current.items()):
+            _listings = open_listings(app.config['LISTINGS_CSV'], app.config['LISTING_CACHE_DIR'])
+            _property_index = None
+            logging.info(f"Listing cache {_listings.manifest['version']} mapped with {len(_listings)} listings")
+    return _listings
+
+def get_property_index():
+    global _property_index
+    listings = get_listings()
+    with _listings_lock:
+        if _property_index is None:
+            from spatial import PropertyIndex
+            _property_index = PropertyIndex.from_columns(listings)
+    return _property_index
+
+@app.route('/api/properties')
+def api_properties():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    try:
+        west, south, east, north = (float(v) for v in request.args['bbox'].split(','))
+        zoom = int(request.args.get('zoom', 8))
+    except (KeyError, ValueError):
+        return jsonify(error="bbox=west,south,east,north and an integer zoom are required"), 400
+
+    if west > east or south > north:
+        return jsonify(error="bbox must be west,south,east,north"), 400
+
+    return jsonify(get_property_index().query(west, south, east, north, zoom))
+
+# Map markers carry only coordinates, color, price and beds; their popups
+# are fetched from here on first click
+@app.route('/api/listings/<property_id>/popup')
+def listing_popup(property_id):
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    from markers import listing_popup_html
+    listings = get_listings()
+    row = listings.find(property_id)
+    if row is None:
+        return jsonify(error="Unknown property_id"), 404
+    response = Response(listing_popup_html(listings, row), mimetype='text/html')
+    response.headers['Cache-Control'] = app.config['POPUP_CACHE_CONTROL']
+    return response
+
+def json_number(value, digits=None):
+    """``value`` as a JSON-safe float: None for NaN and infinities, which jsonify would emit bare."""
+    value = float(value)
+    if not math.isfinite(value):
+        return None
+    return value if digits is None else round(value, digits)
+
+@app.route('/api/underwriting')
+def api_underwriting():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    from underwriting import parse_assumptions, underwrite, top, METRICS
+    try:
+        assumptions = parse_assumptions(request.args)
+        limit = min(int(request.args.get('limit', 50)), 1000)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    sort = request.args.get('sort', 'cash_on_cash')
+    if sort not in METRICS:
+        return jsonify(error=f"sort must be one of: {', '.join(METRICS)}"), 400
+
+    started = time.perf_counter()
+    listings = get_listings()
+    results = underwrite(listings.price, listings.beds, assumptions)
+    rows = top(results[sort], limit, descending=request.args.get('order', 'desc') != 'asc')
+    elapsed = time.perf_counter() - started
+
+    return jsonify(
+        assumptions=assumptions,
+        sort=sort,
+        total=len(listings),
+        elapsed_ms=round(elapsed * 1000, 2),
+        listings=[
+            dict({
+                'id': listings.property_id[i].decode(),
+                'address': listings.address[i],
+                'zipcode': listings.zipcode[i].decode(),
+                'price': json_number(listings.price[i]),
+                'beds': json_number(listings.beds[i]),
+            }, **{metric: json_number(results[metric][i], 2) for metric in METRICS})
+            for i in rows.tolist()
+        ],
+    )
+
+# Comparable listings. The index follows listing cache rebuilds incrementally
+_comps_index = None
+
+def get_comps_index():
+    global _comps_index
+    listings = get_listings()
+    with _listings_lock:
+        if _comps_index is None:
+            from comps import CompsIndex
+            _comps_index = CompsIndex(listings)
+        elif _comps_index.version != listings.manifest['version']:
+            added, removed = _comps_index.refresh(listings)
+            logging.info(f"Comps index refreshed: {added} listings added, {removed} removed "
+                         f"({_comps_index.delta_rows} awaiting a rebuild)")
+    return _comps_index
+
+def comps_params(values):
+    """k, filters and radius shared by /api/comps and /api/comps/batch."""
+    from comps import DEFAULT_K, MAX_K, DEFAULT_BEDS_RANGE, DEFAULT_BATHS_RANGE
+
+    def number(name, default=None):
+        value = values.get(name)
+        if value is None or value == '':
+            return default
+        value = float(value)
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"{name} must be a non-negative number")
+        return value
+
+    k = int(values.get('k', DEFAULT_K))
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"k must be between 1 and {MAX_K}")
+    return dict(k=k, beds=number('beds'), baths=number('baths'), kind=values.get('type') or None,
+                beds_range=number('beds_range', DEFAULT_BEDS_RANGE),
+                baths_range=number('baths_range', DEFAULT_BATHS_RANGE), max_km=number('max_km'))
+
+@app.route('/api/comps')
+def api_comps():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    try:
+        params = comps_params(request.args)
+        property_id = request.args.get('property_id')
+        if property_id is None:
+            params['lat'], params['lon'] = float(request.args['lat']), float(request.args['lon'])
+    except KeyError:
+        return jsonify(error="property_id, or lat and lon, are required"), 400
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    started = time.perf_counter()
+    result = get_comps_index().comps(property_id, **params)
+    if result is None:
+        return jsonify(error="Unknown property_id"), 404
+    return jsonify(dict(result, elapsed_ms=round((time.perf_counter() - started) * 1000, 3)))
+
+@app.route('/api/comps/batch', methods=['POST'])
+def api_comps_batch():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('property_ids'), list):
+        return jsonify(error='Expected a JSON object with a "property_ids" list'), 400
+    if len(payload['property_ids']) > app.config['MAX_COMPS_BATCH']:
+        return jsonify(error=f"At most {app.config['MAX_COMPS_BATCH']} listings per batch"), 413
+    try:
+        params = comps_params(payload)
+    except (TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+
+    started = time.perf_counter()
+    index = get_comps_index()
+    results, missing = {}, []
+    for property_id in payload['property_ids']:
+        result = index.comps(str(property_id), **params)
+        if result is None:
+            missing.append(property_id)
+            continue
+        if not payload.get('include_comps'):
+            del result['comps']
+        results[str(property_id)] = result
+    return jsonify(results=results, missing=missing,
+                   elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+
+# ZIP and county market statistics, updated from the listing cache's row
+# diff and saved so restarted workers pick them up without a full pass
+_market_aggregates = None
+
+def get_market_aggregates():
+    global _market_aggregates
+    from aggregates import MarketAggregates
+    listings = get_listings()
+    with _listings_lock:
+        if _market_aggregates is None:
+            _market_aggregates = MarketAggregates.load(app.config['MARKET_AGGREGATES'], listings)
+            if _market_aggregates is None:
+                _market_aggregates = MarketAggregates.from_columns(listings)
+                _market_aggregates.save(app.config['MARKET_AGGREGATES'])
+        elif _market_aggregates.version != listings.manifest['version']:
+            added, removed = _market_aggregates.refresh(listings)
+            _market_aggregates.save(app.config['MARKET_AGGREGATES'])
+            logging.info(f"Market aggregates updated: {added} listings added, {removed} removed")
+    return _market_aggregates
+
+@app.route('/api/market/<level>')
+def api_market(level):
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    from aggregates import LEVELS
+    if level not in LEVELS:
+        return jsonify(error=f"level must be one of: {', '.join(sorted(LEVELS))}"), 404
+    try:
+        min_listings = int(request.args.get('min_listings', 1))
+    except ValueError:
+        return jsonify(error="min_listings must be an integer"), 400
+
+    aggregates = get_market_aggregates()
+    key = request.args.get('key')
+    areas = aggregates.areas(level, key, min_listings)
+    if key is not None and not areas:
+        return jsonify(error=f"No listings for {level} {key}"), 404
+    return jsonify(level=level, version=aggregates.version, updated_at=aggregates.updated_at, areas=areas)
+
+# Affordability search. The price index is rebuilt when the listing cache changes
+_price_index = None
+
+def get_price_index():
+    global _price_index
+    listings = get_listings()
+    with _listings_lock:
+        if _price_index is None or _price_index.version != listings.manifest['version']:
+            from affordability import PriceIndex
+            started = time.perf_counter()
+            _price_index = PriceIndex(listings)
+            logging.info(f"Price index built over {len(_price_index)} listings "
+                         f"in {time.perf_counter() - started:.2f}s")
+    return _price_index
+
+def affordability_filters(values):
+    """ZIP, type and beds filters shared by /api/affordable and its batch form."""
+    def number(name):
+        value = values.get(name)
+        if value is None or value == '':
+            return None
+        value = float(value)
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"{name} must be a non-negative number")
+        return value
+
+    zips = values.get('zip') or []
+    if isinstance(zips, str):
+        zips = zips.split(',')
+    zips = [str(z).strip().zfill(5) for z in zips if str(z).strip()] or None
+    return dict(zips=zips, kind=values.get('type') or None, min_beds=number('min_beds'),
+                max_beds=number('max_beds'), min_price=number('min_price') or 0.0)
+
+@app.route('/api/affordable')
+def api_affordable():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    from affordability import parse_profile, DEFAULT_LIMIT, MAX_LIMIT
+    try:
+        profile = parse_profile(request.args)
+        filters = affordability_filters(request.args)
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+        offset = int(request.args.get('offset', 0))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if not 0 <= limit <= MAX_LIMIT or offset < 0:
+        return jsonify(error=f"limit must be between 0 and {MAX_LIMIT}, offset non-negative"), 400
+
+    started = time.perf_counter()
+    result = get_price_index().search(profile, limit, offset,
+                                      descending=request.args.get('order', 'desc') != 'asc', **filters)
+    return jsonify(dict(result, limit=limit, offset=offset,
+                        elapsed_ms=round((time.perf_counter() - started) * 1000, 3)))
+
+@app.route('/api/affordable/batch', methods=['POST'])
+def api_affordable_batch():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    from affordability import parse_profile, MAX_LIMIT
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('profiles'), list):
+        return jsonify(error='Expected a JSON object with a "profiles" list'), 400
+    if len(payload['profiles']) > app.config['MAX_AFFORDABILITY_BATCH']:
+        return jsonify(error=f"At most {app.config['MAX_AFFORDABILITY_BATCH']} profiles per batch"), 413
+    try:
+        filters = affordability_filters(payload)
+        limit = int(payload.get('limit', 0))
+    except (TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+    if not 0 <= limit <= MAX_LIMIT:
+        return jsonify(error=f"limit must be between 0 and {MAX_LIMIT}"), 400
+
+    started = time.perf_counter()
+    profiles, errors = [], {}
+    for i, values in enumerate(payload['profiles']):
+        try:
+            if not isinstance(values, dict):
+                raise ValueError("Each profile must be a JSON object")
+            profiles.append(parse_profile({name: None if value is None else str(value)
+                                           for name, value in values.items()}))
+        except ValueError as e:
+            errors[i] = str(e)
+    results = iter(get_price_index().search_many(profiles, limit, **filters))
+    return jsonify(results=[{'error': errors[i]} if i in errors else next(results)
+                            for i in range(len(payload['profiles']))],
+                   elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+
+# Rendered /calculate and /check_credit pages, keyed on canonicalized inputs
+result_cache = ResultCache(app.config['RESULT_CACHE_MAX_BYTES'], app.config['RESULT_CACHE_TTL'],
+                           app.config['RESULT_CACHE_SHARED'] or None)
+
+@app.route('/api/result_cache/stats')
+def api_result_cache_stats():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+    return jsonify(result_cache.stats())
 
 @app.route('/calculate', methods=['POST'])
 def calculate():
+    # Saving needs the computed result, so those posts skip the cache
+    cache_key = None if request.form.get("save") else form_key('calculate', request.form)
+    page = result_cache.get(cache_key) if cache_key else None
+    if page is not None:
+        return page
+
     try:
         category = request.form.get("category")
         result = {}
@@ -144,99 +802,301 @@ def calculate():
             other_cost = float(request.form.get("other_cost") or 0)
 
             result["Annual Growth Total"] = rent_growth + appreciation + other_cost
+
+            if request.form.get("mode") == "simulate":
+                from projection import parse_assumptions, parse_properties, project
+                try:
+                    assumptions = parse_assumptions(dict(request.form.to_dict(), rent_growth=rent_growth,
+                                                         appreciation=appreciation))
+                    properties = parse_properties([dict(request.form.to_dict(), annual_expenses=other_cost)])
+                except ValueError as e:
+                    # Name the field that is out of range, as /check_credit does
+                    return render_template('dashboard.html', error=str(e))
+                projected = project(properties, assumptions, app.config['PROJECTION_WORKERS'])
+                years = assumptions['years']
+                for metric, label in [("value", "Property Value"), ("cash_flow", "Cash Flow"),
+                                      ("cumulative_cash_flow", "Cumulative Cash Flow")]:
+                    for band, name in [("p5", "5th pct"), ("p50", "Median"), ("p95", "95th pct")]:
+                        result[f"Year {years} {label} ({name})"] = projected[metric][band][-1]
+                logging.info(f"Projected {assumptions['paths']} paths over {years} years "
+                             f"in {projected['elapsed_ms']:.0f}ms")
         else:
             return render_template('dashboard.html', error="Invalid calculation category")
 
+        if request.form.get("save") and 'username' in session:
+            inputs = {k: v for k, v in request.form.items() if k not in ("category", "save")}
+            save_error = save_scenario(category, inputs, result)
+        else:
+            save_error = None
+
         logging.info(f"Calculation performed for category: {category}")
-        return render_template('result.html', result=result)
+        page = render_template('result.html', result=result, save_error=save_error)
+        if cache_key:
+            result_cache.set(cache_key, page)
+        return page
         
     except (ValueError, TypeError) as e:
         logging.error(f"Calculation error: {str(e)}")
         return render_template('dashboard.html', error="Please enter valid numerical values")
 
+@app.route('/api/calculate/batch', methods=['POST'])
+def calculate_batch():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    from scenarios import read_scenarios, iter_results
+    try:
+        if 'file' in request.files:
+            raw = read_scenarios(request.files['file'])
+        else:
+            payload = request.get_json(silent=True)
+            scenarios = payload.get('scenarios') if isinstance(payload, dict) else payload
+            if not isinstance(scenarios, list):
+                return jsonify(error="Send a JSON list of scenarios or a CSV file upload"), 400
+            raw = read_scenarios(scenarios)
+    except (ValueError, TypeError) as e:
+        return jsonify(error=f"Could not read scenarios: {e}"), 400
+
+    if len(raw) > app.config['MAX_BATCH_SCENARIOS']:
+        return jsonify(error=f"At most {app.config['MAX_BATCH_SCENARIOS']} scenarios per batch"), 413
+
+    def generate():
+        started = time.perf_counter()
+        yield from iter_results(raw)
+        elapsed = time.perf_counter() - started
+        rate = len(raw) / elapsed if elapsed else 0
+        logging.info(f"Batch calculation of {len(raw)} scenarios in {elapsed:.3f}s ({rate:,.0f} scenarios/sec)")
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/projection', methods=['POST'])
+def api_projection():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+
+    from projection import parse_assumptions, parse_properties, project
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error="Send a JSON object with properties and assumptions"), 400
+    try:
+        assumptions = parse_assumptions(payload)
+        properties = parse_properties(payload.get('properties') or [payload])
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify(error=str(e)), 400
+
+    cells = assumptions['paths'] * len(properties['property_value'])
+    if cells > app.config['MAX_PROJECTION_CELLS']:
+        return jsonify(error=f"paths x properties must be at most {app.config['MAX_PROJECTION_CELLS']}"), 413
+
+    projected = project(properties, assumptions, app.config['PROJECTION_WORKERS'])
+    logging.info(f"Projected {assumptions['paths']} paths x {len(properties['property_value'])} properties "
+                 f"in {projected['elapsed_ms']:.0f}ms on {projected['workers']} workers")
+    return jsonify(dict(projected, assumptions=assumptions))
+
 @app.route('/check_credit', methods=['POST'])
 def check_credit():
     if 'username' not in session:
         return redirect(url_for('login'))
     
+    from credit import FIELDS, parse_applicant, score_applicant
     try:
         # Get and validate form data
-        credit_score = int(request.form.get('credit_score'))
-        salary = float(request.form.get('salary'))
-        monthly_debt = float(request.form.get('monthly_debt'))
-        loan_amount = float(request.form.get('loan_amount'))
-
-        # Input validation
-        if not (300 <= credit_score <= 850):
-            return render_template('dashboard.html', error="Credit score must be between 300 and 850")
-        if salary < 0 or monthly_debt < 0 or loan_amount < 0:
-            return render_template('dashboard.html', error="Values cannot be negative")
-
-        # Calculate Debt-to-Income Ratio (DTI)
-        monthly_income = salary / 12
-        dti = (monthly_debt / monthly_income) * 100 if monthly_income > 0 else 100
-
-        # Determine loan eligibility and interest rate
-        loan_approved = False
-        interest_rate = 0.0
-        credit_tips = []
-
-        if credit_score >= 740:
-            loan_approved = True
-            interest_rate = 3.5 if dti < 36 else 4.0
-            credit_tips = [
-                "Maintain your excellent credit by paying bills on time.",
-                "Keep credit utilization below 30%."
-            ]
-        elif credit_score >= 670:
-            loan_approved = True
-            interest_rate = 4.5 if dti < 36 else 5.0
-            credit_tips = [
-                "Continue making timely payments.",
-                "Reduce outstanding debt to improve your score."
-            ]
-        elif credit_score >= 580:
-            loan_approved = dti < 43
-            interest_rate = 6.5 if dti < 36 else 7.5
-            credit_tips = [
-                "Pay down existing debt to lower your DTI.",
-                "Make all payments on time to build credit history.",
-                "Consider a secured credit card to improve your score."
-            ]
-        else:
-            loan_approved = False
-            interest_rate = 10.0
-            credit_tips = [
-                "Work on paying bills on time consistently.",
-                "Reduce debt through a payment plan.",
-                "Consider credit counseling services."
-            ]
-
-        # Calculate maximum affordable loan
-        max_loan = (monthly_income * 0.36 - monthly_debt) * 360
-
-        # Calculate monthly payment (assuming 30-year term)
-        term_months = 360  # 30 years
-        monthly_rate = interest_rate / 100 / 12
-        if monthly_rate > 0:
-            monthly_payment = loan_amount * (monthly_rate * (1 + monthly_rate)**term_months) / ((1 + monthly_rate)**term_months - 1)
-        else:
-            monthly_payment = loan_amount / term_months if loan_amount > 0 else 0
-
-        result = {
-            'credit_score': credit_score,
-            'loan_approved': loan_approved,
-            'interest_rate': interest_rate,
-            'dti': round(dti, 2),
-            'requested_loan': loan_amount,
-            'max_affordable_loan': round(max_loan, 2),
-            'monthly_payment': round(monthly_payment, 2) if loan_approved else 0,
-            'tips': credit_tips
-        }
-
-        return render_template('credit_result.html', result=result)
-    except (ValueError, TypeError):
-        return render_template('dashboard.html', error="Please enter valid numerical values")
+        applicant = parse_applicant(request.form)
+    except ValueError as e:
+        return render_template('dashboard.html', error=str(e))
+
+    # Keyed on the parsed values: int() and float() decide what's equal here
+    cache_key = json.dumps(['check_credit', applicant])
+    saving = bool(request.form.get('save'))
+    page = None if saving else result_cache.get(cache_key)
+    if page is not None:
+        return page
+
+    # DTI bands, rate tiers, max affordable loan and the 30-year payment
+    result = score_applicant(*applicant)
+    save_error = None
+    if saving:
+        save_error = save_scenario('credit_check', {field: request.form.get(field) for field in FIELDS}, result)
+    page = render_template('credit_result.html', result=result, save_error=save_error)
+    if save_error is None:
+        result_cache.set(cache_key, page)
+    return page
+
+def page_params():
+    """``(limit, before)`` for keyset pagination; raises ValueError."""
+    limit = int(request.args.get('limit', 50))
+    if not 1 <= limit <= 500:
+        raise ValueError("limit must be between 1 and 500")
+    before = request.args.get('before')
+    return limit, int(before) if before else None
+
+def keyset_page(columns, model, user_id, limit, before, *filters):
+    """Newest-first page of ``columns`` for a user; ``before`` is the last id seen."""
+    query = select(*columns).where(model.user_id == user_id, *filters)
+    if before is not None:
+        query = query.where(model.id < before)
+    rows = db.session.execute(query.order_by(model.id.desc()).limit(limit)).mappings().all()
+    items = [dict(row, created_at=row['created_at'].isoformat()) for row in rows]
+    return {'items': items, 'next_before': items[-1]['id'] if len(items) == limit else None}
+
+def json_list(key):
+    payload = request.get_json(silent=True)
+    values = payload.get(key) if isinstance(payload, dict) else payload
+    if not isinstance(values, list):
+        raise ValueError(f"Send a JSON list or {{\"{key}\": [...]}}")
+    if len(values) > app.config['MAX_SAVE_BATCH']:
+        raise ValueError(f"At most {app.config['MAX_SAVE_BATCH']} {key} per request")
+    return values
+
+@app.route('/api/scenarios', methods=['GET', 'POST', 'DELETE'])
+def api_scenarios():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+    user_id = current_user_id()
+
+    if request.method == 'GET':
+        try:
+            limit, before = page_params()
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        get_write_batcher().flush()
+        columns = [SavedScenario.id, SavedScenario.category, SavedScenario.name, SavedScenario.created_at]
+        if request.args.get('full'):
+            columns += [SavedScenario.inputs, SavedScenario.result]
+        filters = [SavedScenario.category == request.args['category']] if request.args.get('category') else []
+        return jsonify(keyset_page(columns, SavedScenario, user_id, limit, before, *filters))
+
+    if request.method == 'DELETE':
+        try:
+            ids = [int(i) for i in json_list('ids')]
+        except (ValueError, TypeError) as e:
+            return jsonify(error=str(e)), 400
+        get_write_batcher().flush()
+        deleted = db.session.execute(delete(SavedScenario).where(
+            SavedScenario.user_id == user_id, SavedScenario.id.in_(ids))).rowcount
+        db.session.commit()
+        return jsonify(deleted=deleted)
+
+    try:
+        rows = [{
+            'user_id': user_id,
+            'category': str(item['category'])[:40],
+            'name': str(item.get('name') or '')[:100],
+            'inputs': dict(item.get('inputs') or {}),
+            'result': dict(item['result']),
+        } for item in json_list('scenarios')]
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        return jsonify(error=f"Each scenario needs a category and a result object: {e}"), 400
+    if rows:
+        db.session.execute(insert(SavedScenario), rows)
+        db.session.commit()
+    return jsonify(saved=len(rows)), 201
+
+@app.route('/api/watchlist', methods=['GET', 'POST', 'DELETE'])
+def api_watchlist():
+    if 'username' not in session:
+        return jsonify(error="Login required"), 401
+    user_id = current_user_id()
+
+    if request.method == 'GET':
+        try:
+            limit, before = page_params()
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        columns = [WatchlistItem.id, WatchlistItem.property_id, WatchlistItem.note, WatchlistItem.created_at]
+        return jsonify(keyset_page(columns, WatchlistItem, user_id, limit, before))
+
+    try:
+        property_ids = list(dict.fromkeys(str(p)[:40] for p in json_list('property_ids')))
+    except (ValueError, TypeError) as e:
+        return jsonify(error=str(e)), 400
+
+    if request.method == 'DELETE':
+        deleted = db.session.execute(delete(WatchlistItem).where(
+            WatchlistItem.user_id == user_id, WatchlistItem.property_id.in_(property_ids))).rowcount
+        db.session.commit()
+        return jsonify(deleted=deleted)
+
+    existing = set(db.session.execute(select(WatchlistItem.property_id).where(
+        WatchlistItem.user_id == user_id, WatchlistItem.property_id.in_(property_ids))).scalars())
+    payload = request.get_json(silent=True)
+    note = str(payload.get('note') or '')[:200] if isinstance(payload, dict) else ''
+    rows = [{'user_id': user_id, 'property_id': p, 'note': note} for p in property_ids if p not in existing]
+    if rows:
+        db.session.execute(insert(WatchlistItem), rows)
+        db.session.commit()
+    return jsonify(added=len(rows), already_watched=len(existing)), 201
+
+@metrics.collector
+def cache_metrics():
+    stats = result_cache.stats()
+    for outcome, key in (('hit', 'hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses')):
+        yield ('result_cache_lookups_total', 'counter', "Result cache lookups by outcome",
+               {'outcome': outcome}, stats[key])
+    yield ('result_cache_evictions_total', 'counter', "Entries evicted for space", {}, stats['evictions'])
+    yield ('result_cache_expirations_total', 'counter', "Entries dropped after their TTL", {}, stats['expirations'])
+    yield ('result_cache_entries', 'gauge', "Entries in this worker's cache", {}, stats['entries'])
+    yield ('result_cache_bytes', 'gauge', "Bytes held by this worker's cache", {}, stats['bytes'])
+
+@metrics.collector
+def write_batcher_metrics():
+    if _write_batcher is None:
+        return
+    stats = _write_batcher.stats()
+    yield ('write_batcher_pending_rows', 'gauge', "Saved rows queued for the next batch", {}, stats['pending'])
+    yield ('write_batcher_written_rows_total', 'counter', "Saved rows written in batches", {}, stats['written'])
+    yield ('write_batcher_retried_rows_total', 'counter', "Saved rows requeued after a failed write", {},
+           stats['retried'])
+    yield ('write_batcher_dropped_rows_total', 'counter', "Saved rows dropped after repeated failed writes", {},
+           stats['dropped'])
+
+@metrics.collector
+def job_metrics():
+    if _job_queue is None:
+        return
+    for state, count in _job_queue.counts().items():
+        yield ('jobs', 'gauge', "Background jobs by state", {'state': state}, count)
+
+@metrics.collector
+def hash_pool_metrics():
+    if _hash_pool is None:  # don't start the pool just to report on it
+        return
+    stats = _hash_pool.stats()
+    yield ('hash_pool_workers', 'gauge', "Password hashing threads", {}, stats['workers'])
+    yield ('hash_pool_in_flight', 'gauge', "Hashes queued or running", {}, stats['in_flight'])
+    yield ('hash_pool_rejected_total', 'counter', "Hashes rejected because the queue was full", {}, stats['rejected'])
+    yield ('hash_pool_upgraded_total', 'counter', "Password hashes upgraded on login", {}, stats['upgraded'])
+    for kind in ('verify', 'generate'):
+        for phase in ('total', 'hashing', 'queue_wait'):
+            for quantile, ms in stats.get(kind, {}).get(phase, {}).items():
+                yield ('hash_pool_seconds', 'summary', "Recent hash latency by phase",
+                       {'kind': kind, 'phase': phase, 'quantile': int(quantile[1:]) / 100},
+                       round(ms / 1000, 6) if ms is not None else None)
+
+@metrics.collector
+def map_build_metrics():
+    # Written by map.py at the end of each build
+    try:
+        with open(app.config['MAP_BUILD_STATS']) as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return
+    yield ('map_build_finished_timestamp_seconds', 'gauge', "When the last map build finished", {}, stats['finished'])
+    yield ('map_build_seconds', 'gauge', "Duration of the last map build", {}, stats['seconds'])
+    yield ('map_build_skipped', 'gauge', "1 if the last build found nothing to do", {}, int(stats['skipped']))
+    for stage, values in stats['stages'].items():
+        yield ('map_build_stage_seconds', 'gauge', "Duration of each stage of the last map build",
+               {'stage': stage}, values['seconds'])
+    for stage, values in stats['stages'].items():
+        yield ('map_build_stage_rows', 'gauge', "Rows handled by each stage of the last map build",
+               {'stage': stage}, values.get('rows'))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/logout')
 def logout():
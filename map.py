@@ -1,57 +1,61 @@
-import pandas as pd
-import folium
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-from folium import plugins
-import json
-
-# Load the CSV file
-file_path = "updated_dataset.csv"
-data = pd.read_csv(file_path)
-
-# Ensure ZIP codes are read as strings and cleaned up
-data['zipcode'] = data['zipcode'].astype(str)
-data['zipcode'] = data['zipcode'].replace(['nan', 'NaN', 'None', 'inf', '-inf'], '')
-data = data[data['zipcode'].str.strip() != '']
-data['zipcode'] = data['zipcode'].astype(float).astype(int).astype(str).str.zfill(5)
+"""
+Builds the interactive property map at templates/map.html.
 
-print(data[['zipcode']].head(10))
-print(data['zipcode'].dtype)
+Listings ship to the browser as one compact columnar payload: quantized
+coordinates, a color index into a small palette, and integer price, beds and
+listing id arrays, drawn as canvas circle markers. Popup HTML is fetched from
+``/api/listings/<id>/popup`` when a marker is clicked, so each listing adds a
+few dozen bytes to the page instead of ~2 KB. The build is skipped when the
+page inputs and every marker's fingerprint match the previous build;
+otherwise the payload is encoded again in one vectorized pass.
 
-# Ensure the necessary columns exist
-required_columns = ['list_price', 'description/beds', 'location/address/coordinate/lat', 
-                    'location/address/coordinate/lon', 'primary_photo/href', 'location/address/line','description/baths_consolidated']
-data = data.dropna(subset=required_columns)
+With ``--shard-by county`` (or ``zip``) the markers are split into one
+script per shard under templates/map_shards, rendered in a process pool,
+and map.html only loads the shards in view. Incremental rebuilds require
+this mode: only shards with a changed listing are rendered again.
 
-# Convert necessary columns to numeric types
-data['list_price'] = pd.to_numeric(data['list_price'], errors='coerce')
-data['description/beds'] = pd.to_numeric(data['description/beds'], errors='coerce')
-data['location/address/coordinate/lat'] = pd.to_numeric(data['location/address/coordinate/lat'], errors='coerce')
-data['location/address/coordinate/lon'] = pd.to_numeric(data['location/address/coordinate/lon'], errors='coerce')
-data['description/baths_consolidated'] = pd.to_numeric(data['description/baths_consolidated'], errors='coerce')
+    python map.py [--force] [--csv updated_dataset.csv] [--shard-by county|zip] [--workers N]
+"""
 
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-data = data.dropna(subset=['list_price', 'description/beds', 'location/address/coordinate/lat', 
-                           'location/address/coordinate/lon'])
+import folium
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from folium import plugins
+from jinja2 import Template
 
-# Compute map center
-mean_lat = data['location/address/coordinate/lat'].mean()
-mean_lon = data['location/address/coordinate/lon'].mean()
+from artifacts import write_variants
+from metrics import StageTimer, stage_summary
+from listings import load_listings, PROPERTY_ID, LAT, LON, PRICE, BEDS, ZIPCODE, FIPS
+from markers import marker_colors
 
-# Compute price per bed (avoid division by zero)
-data['price_per_bed'] = data.apply(
-    lambda row: row['list_price'] / row['description/beds'] if row['description/beds'] > 0 else None,
-    axis=1
-)
-min_ppb = data['price_per_bed'].min()
-max_ppb = data['price_per_bed'].max()
+DATASET = "updated_dataset.csv"
+MAP_FILE = "templates/map.html"
+CACHE_DIR = os.path.join("instance", "map_cache")
+BUILD_STATS = "build_stats.json"
+SHARD_DIR = "templates/map_shards"
+# Served by main.py; the version busts browser caches when a shard changes
+SHARD_URL = "/map/shards/{name}.js?v={version}"
+SHARD_COLUMNS = {'county': FIPS, 'zip': ZIPCODE}
+ROWS_PER_WORKER = 20_000
 
-# Create the base map (set width and height to "100%" so that our container CSS can work)
-m = folium.Map(location=[mean_lat, mean_lon], zoom_start=8, width="100%", height="100%")
-plugins.MiniMap().add_to(m)
+# Listing columns a marker depends on; popups are served by main.py
+MARKER_COLUMNS = [PROPERTY_ID, LAT, LON, PRICE, BEDS]
+# Coordinates ship as integers in units of 1e-5 degrees (about a meter)
+COORDINATE_SCALE = 100_000
+POPUP_URL = "/api/listings/{id}/popup"
 
 # JavaScript for sidebar functions (loan calculator and property details update)
-sidebar_script = """
+SIDEBAR_SCRIPT = """
 <script>
     function setPropertyDetails(price, beds) {
         document.getElementById("purchase_price").value = price;
@@ -89,50 +93,9 @@ sidebar_script = """
 </script>
 """
 
-# Prepare marker data for JavaScript
-marker_data = []
-for _, row in data.iterrows():
-    if pd.isna(row['price_per_bed']):
-        continue
-    normalized_ppb = (row['price_per_bed'] - min_ppb) / (max_ppb - min_ppb)
-    color_hex = mcolors.to_hex(plt.cm.RdYlGn(1 - normalized_ppb)[:3])
-    zip_code = str(row['zipcode']).zfill(5)
-    
-    street_view_link = f"https://www.google.com/maps/@?api=1&map_action=pano&viewpoint={row['location/address/coordinate/lat']},{row['location/address/coordinate/lon']}"
-    address_html = f'<a href="{street_view_link}" target="_blank">{row["location/address/line"]} (Street View)</a>'
-    
-    popup_html = f"""
-    <div onclick="setPropertyDetails({row['list_price']}, {int(row['description/beds'])})">
-        <img src="{row['primary_photo/href']}" width="200"><br>
-        <b>Price:</b> ${row['list_price']:,.2f}<br>
-        <b>Beds:</b> {int(row['description/beds'])}<br>
-        <b>Bathrooms:</b> {(row['description/baths_consolidated'])}<br> 
-        <b>Address:</b> {address_html}<br>
-        <b>Zip code:</b> {zip_code}<br>
-    </div>
-    """
-    marker_data.append({
-        "lat": row['location/address/coordinate/lat'],
-        "lon": row['location/address/coordinate/lon'],
-        "popup": popup_html,
-        "color": color_hex,
-        "zipcode": zip_code
-    })
-    
-    folium.CircleMarker(
-        location=[row['location/address/coordinate/lat'], row['location/address/coordinate/lon']],
-        radius=10,
-        color=color_hex,
-        fill=True,
-        fill_color=color_hex,
-        fill_opacity=0.7,
-        popup=folium.Popup(popup_html, max_width=300)
-    ).add_to(m)
-
-marker_json = json.dumps(marker_data)
 
 # Build the complete HTML page with dark, modern styling
-map_html = f"""
+PAGE_TEMPLATE = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -266,7 +229,7 @@ map_html = f"""
             <button type="button" onclick="calculateLoan()">Calculate</button>
         </div>
         <div id="map-container">
-            {m._repr_html_()}
+            {map_html}
         </div>
     </div>
     {sidebar_script}
@@ -274,9 +237,433 @@ map_html = f"""
 </html>
 """
 
-# Save the final HTML to Flask's templates folder
-map_file = "templates/map.html"
-with open(map_file, "w") as file:
-    file.write(map_html)
 
-print(f"✅ Map with modern dark theme saved successfully at: {map_file}")
\ No newline at end of file
+# Draws a marker payload on a map and loads each marker's popup on first
+# click. Runs inside folium's map document, alongside the shard loader.
+LISTING_SCRIPT = """
+    {% macro script(this, kwargs) %}
+    function addListings(map, data) {
+        var renderer = map.listingRenderer || (map.listingRenderer = L.canvas());
+        for (var i = 0; i < data.id.length; i++) {
+            var color = data.palette[data.color[i]];
+            var marker = L.circleMarker(
+                [(data.lat0 + data.lat[i]) / data.scale, (data.lon0 + data.lon[i]) / data.scale],
+                {"renderer": renderer, "color": color, "fill": true, "fillColor": color,
+                 "fillOpacity": 0.7, "radius": 10});
+            marker.listing = {"id": data.id[i], "price": data.price[i], "beds": data.beds[i]};
+            marker.on("click", openListing);
+            marker.addTo(map);
+        }
+    }
+
+    function openListing(event) {
+        var marker = event.target;
+        var listing = marker.listing;
+        if (marker.getPopup()) {
+            return;
+        }
+        marker.bindPopup("<b>Price:</b> $" + listing.price.toLocaleString() + "<br><b>Beds:</b> " + listing.beds,
+                         {"maxWidth": 300}).openPopup();
+        fetch("__POPUP_URL__".replace("{id}", encodeURIComponent(listing.id)), {"credentials": "same-origin"})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                marker.setPopupContent(html);
+            })
+            .catch(function () {
+                // Try again on the next click
+                marker.unbindPopup();
+            });
+    }
+    {% endmacro %}
+""".replace("__POPUP_URL__", POPUP_URL)
+
+
+class ListingScript(MacroElement):
+    """Defines ``addListings`` for the marker payloads."""
+
+    _template = Template(LISTING_SCRIPT)
+
+    def __init__(self):
+        super().__init__()
+        self._name = 'ListingScript'
+
+
+MARKER_SCRIPT = """
+    {% macro script(this, kwargs) %}
+    addListings({{ this._parent.get_name() }}, {{ this.payload }});
+    {% endmacro %}
+"""
+
+
+class MarkerScript(MacroElement):
+    """Adds the marker payload to the folium map."""
+
+    _template = Template(MARKER_SCRIPT)
+
+    def __init__(self, payload):
+        super().__init__()
+        self._name = 'MarkerScript'
+        self.payload = payload
+
+
+# Sharded builds: the page holds no markers, only the shard list. Shards whose
+# bounds intersect the viewport are loaded as <script>s when the map moves.
+SHARD_LOADER_SCRIPT = """
+    {% macro script(this, kwargs) %}
+    (function (map) {
+        window.propertyMap = map;
+        var shards = {{ this.shards }};
+        var loaded = {};
+        function loadVisibleShards() {
+            var view = map.getBounds();
+            shards.forEach(function (shard) {
+                if (loaded[shard.name] || !view.intersects(L.latLngBounds(shard.bounds))) {
+                    return;
+                }
+                loaded[shard.name] = true;
+                var script = document.createElement("script");
+                script.src = shard.url;
+                document.head.appendChild(script);
+            });
+        }
+        map.on("moveend", loadVisibleShards);
+        loadVisibleShards();
+    })({{ this._parent.get_name() }});
+    {% endmacro %}
+"""
+
+SHARD_SCRIPT = """addListings(window.propertyMap, {payload});
+"""
+
+
+class ShardLoader(MacroElement):
+    """Loads marker shards for the visible part of the map on demand."""
+
+    _template = Template(SHARD_LOADER_SCRIPT)
+
+    def __init__(self, shards):
+        super().__init__()
+        self._name = 'ShardLoader'
+        self.shards = json.dumps(shards)
+
+
+def marker_payload(data, colors):
+    """The markers for ``data`` as compact JSON columns.
+
+    Coordinates are integer offsets from ``lat0``/``lon0`` in units of
+    ``1 / scale`` degrees, colors index into ``palette``, and ids are numbers
+    when every id is a plain integer (as scraper ids are), else strings.
+    """
+    lat = np.round(data[LAT].to_numpy(dtype=float) * COORDINATE_SCALE).astype(np.int64)
+    lon = np.round(data[LON].to_numpy(dtype=float) * COORDINATE_SCALE).astype(np.int64)
+    lat0 = int(lat.min()) if len(lat) else 0
+    lon0 = int(lon.min()) if len(lon) else 0
+    palette, color = np.unique(np.asarray(colors, dtype=str), return_inverse=True)
+
+    ids = data[PROPERTY_ID].fillna('').astype(str)
+    if ids.str.fullmatch(r'[1-9]\d{0,14}').all():
+        ids = ids.astype(np.int64)
+
+    payload = {
+        'scale': COORDINATE_SCALE, 'lat0': lat0, 'lon0': lon0,
+        'lat': (lat - lat0).tolist(), 'lon': (lon - lon0).tolist(),
+        'palette': palette.tolist(), 'color': color.tolist(),
+        'price': np.round(data[PRICE].to_numpy(dtype=float)).astype(np.int64).tolist(),
+        'beds': data[BEDS].to_numpy(dtype=float).astype(np.int64).tolist(),
+        'id': ids.tolist(),
+    }
+    return json.dumps(payload, separators=(',', ':')).replace('</', '<\\/')
+
+
+def marker_keys(data, colors):
+    """Fingerprint of each listing's marker columns combined with its color."""
+    rows = pd.util.hash_pandas_object(data[MARKER_COLUMNS], index=False)
+    return [f"{row:016x}{color[1:]}" for row, color in zip(rows.tolist(), colors.tolist())]
+
+
+def page_fingerprint(keys, center):
+    """Hash of everything the page depends on: templates, center and marker keys."""
+    digest = hashlib.sha256()
+    for part in (folium.__version__, SIDEBAR_SCRIPT, PAGE_TEMPLATE, LISTING_SCRIPT,
+                 MARKER_SCRIPT, repr(center)):
+        digest.update(part.encode('utf-8'))
+    for key in keys:
+        digest.update(key.encode('ascii'))
+    return digest.hexdigest()
+
+
+def read_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def written_page_sha256(map_file):
+    """SHA-256 of the page on disk, from its manifest, so a build can tell if
+    the page is still the one it wrote (and not, say, the other build mode's)."""
+    try:
+        with open(map_file + ".json") as f:
+            return json.load(f)['sha256']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as file:
+        file.write(text)
+    os.replace(tmp, path)
+
+
+def render_page(center, payload=None, shards=None):
+    """The full map page, with the marker ``payload`` inline or a loader for ``shards``."""
+    # Create the base map (set width and height to "100%" so that our container CSS can work)
+    m = folium.Map(location=list(center), zoom_start=8, width="100%", height="100%")
+    plugins.MiniMap().add_to(m)
+    ListingScript().add_to(m)
+    if shards is not None:
+        ShardLoader(shards).add_to(m)
+    else:
+        MarkerScript(payload).add_to(m)
+    return PAGE_TEMPLATE.format(map_html=m._repr_html_(), sidebar_script=SIDEBAR_SCRIPT)
+
+
+def build_map(file_path=DATASET, map_file=MAP_FILE, cache_dir=CACHE_DIR, force=False, on_stage=None):
+    """Build the map page, skipping the build when no marker changed.
+
+    The payload has no per-marker pieces to reuse, so any change re-encodes
+    every marker; ``build_sharded_map`` re-renders only the shards that
+    changed. Returns a dict with the ``markers`` count, whether the build
+    was ``skipped``, and per-stage ``stages`` timings and row counts (also
+    written to ``build_stats.json`` in ``cache_dir``). ``on_stage(name)`` is
+    called as each stage starts.
+    """
+    timer = StageTimer(on_stage)
+    started = time.time()
+
+    # Load the CSV file (ZIP cleanup, required columns and numeric coercion
+    # live in listings.py)
+    with timer.stage('load') as stage:
+        data = load_listings(file_path)
+        stage['rows'] = len(data)
+
+    # Compute map center
+    mean_lat = data[LAT].mean()
+    mean_lon = data[LON].mean()
+
+    # Price-per-bed colors are normalized over the whole dataset, so they are
+    # part of each marker's fingerprint
+    with timer.stage('colors') as stage:
+        _, colors = marker_colors(data)
+        data = data.loc[colors.index]
+        keys = marker_keys(data, colors)
+        stage['rows'] = len(keys)
+
+    state_path = os.path.join(cache_dir, "page.json")
+    previous = read_state(state_path)
+    fingerprint = page_fingerprint(keys, (mean_lat, mean_lon))
+    if not force and previous.get('fingerprint') == fingerprint and os.path.exists(map_file) \
+            and previous.get('page_sha256') == written_page_sha256(map_file):
+        stats = {'skipped': True, 'markers': len(keys)}
+        return record_build(cache_dir, stats, timer, started)
+
+    with timer.stage('markers') as stage:
+        payload = marker_payload(data, colors)
+        stage['rows'] = len(keys)
+        stage['bytes'] = len(payload)
+
+    with timer.stage('emit') as stage:
+        map_html = render_page((mean_lat, mean_lon), payload)
+        stage['rows'] = len(keys)
+
+    # Save the final HTML to Flask's templates folder. The rename is atomic so
+    # the web app never reads a half-written page.
+    with timer.stage('write'):
+        write_atomic(map_file, map_html)
+    # gzip/brotli copies and a content hash, so /map can serve them as-is
+    with timer.stage('compress'):
+        manifest = write_variants(map_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    write_atomic(state_path, json.dumps({'fingerprint': fingerprint, 'page_sha256': manifest['sha256']}))
+
+    stats = {'skipped': False, 'markers': len(keys)}
+    return record_build(cache_dir, stats, timer, started)
+
+
+def record_build(cache_dir, stats, timer, started):
+    """Add stage timings to ``stats`` and save them for the app's /metrics."""
+    stats['stages'] = timer.stages
+    stats['finished'] = time.time()
+    stats['seconds'] = round(stats['finished'] - started, 4)
+    os.makedirs(cache_dir, exist_ok=True)
+    write_atomic(os.path.join(cache_dir, BUILD_STATS), json.dumps(stats))
+    return stats
+
+
+def shard_names(data, shard_by):
+    """File-safe shard name for each listing: its county FIPS code or ZIP."""
+    column = SHARD_COLUMNS[shard_by]
+    if column not in data:
+        raise ValueError(f"Can't shard by {shard_by}: the CSV has no {column} column")
+    names = data[column].astype(object).fillna('').astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+    return names.str.replace(r'[^0-9A-Za-z_-]', '_', regex=True).replace('', 'unknown')
+
+
+def render_shard(path, rows, colors):
+    """Write one shard's marker script and its compressed variants.
+
+    Runs in the build's worker processes. Returns the script's SHA-256.
+    """
+    write_atomic(path, SHARD_SCRIPT.format(payload=marker_payload(rows, colors)))
+    return write_variants(path)['sha256']
+
+
+def _shard_executor(workers):
+    # spawn, like projection.py, so builds started from the web app don't fork its threads
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def build_sharded_map(file_path=DATASET, map_file=MAP_FILE, shard_dir=SHARD_DIR, cache_dir=CACHE_DIR,
+                      shard_by='county', workers=None, force=False, on_stage=None):
+    """Build the map as an index page plus one marker script per county or ZIP.
+
+    Shards are rendered and compressed in a process pool. A shard is only
+    rewritten when one of its listings (or its marker colors) changed.
+    Returns the same stats as ``build_map`` plus ``shards`` and
+    ``shards_rendered`` counts and the ``reused`` and ``regenerated`` marker
+    counts.
+    """
+    timer = StageTimer(on_stage)
+    started = time.time()
+
+    with timer.stage('load') as stage:
+        data = load_listings(file_path)
+        stage['rows'] = len(data)
+    center = (data[LAT].mean(), data[LON].mean())
+
+    # Colors are normalized over the whole dataset before it is split, so a
+    # shard's colors match the single-page build
+    with timer.stage('colors') as stage:
+        _, colors = marker_colors(data)
+        data = data.loc[colors.index]
+        keys = marker_keys(data, colors)
+        stage['rows'] = len(keys)
+
+    with timer.stage('shard') as stage:
+        names = shard_names(data, shard_by).to_numpy()
+        groups = pd.Series(range(len(names))).groupby(names).indices
+        stage['rows'] = len(groups)
+
+    state_path = os.path.join(cache_dir, "shards.json")
+    previous = read_state(state_path)
+    same_layout = previous.get('shard_by') == shard_by
+    previous_shards = previous.get('shards', {}) if same_layout else {}
+
+    shards, pending = {}, {}
+    for name, positions in groups.items():
+        digest = hashlib.sha256(SHARD_SCRIPT.encode('utf-8'))
+        for position in positions:
+            digest.update(keys[position].encode('ascii'))
+        fingerprint = digest.hexdigest()
+        path = os.path.join(shard_dir, f"{name}.js")
+
+        rows = data.iloc[positions]
+        shards[name] = {
+            'fingerprint': fingerprint,
+            'rows': len(positions),
+            'bounds': [[rows[LAT].min(), rows[LON].min()], [rows[LAT].max(), rows[LON].max()]],
+            'sha256': previous_shards.get(name, {}).get('sha256'),
+        }
+        if force or previous_shards.get(name, {}).get('fingerprint') != fingerprint \
+                or not os.path.exists(path) or not os.path.exists(path + ".json"):
+            pending[name] = (path, rows[MARKER_COLUMNS], colors.iloc[positions])
+
+    with timer.stage('markers') as stage:
+        os.makedirs(shard_dir, exist_ok=True)
+        # Worker processes take a second or two to import pandas and folium,
+        # so small builds render in this process
+        pending_rows = sum(shards[name]['rows'] for name in pending)
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending), pending_rows // ROWS_PER_WORKER))
+        if workers > 1:
+            with _shard_executor(workers) as executor:
+                futures = {name: executor.submit(render_shard, *args) for name, args in pending.items()}
+                for name, future in futures.items():
+                    shards[name]['sha256'] = future.result()
+        else:
+            for name, args in pending.items():
+                shards[name]['sha256'] = render_shard(*args)
+        regenerated = pending_rows
+        stage['rows'] = regenerated
+        stage['workers'] = workers
+
+    # Shards that no longer have listings, or are left from the other layout
+    for name in set(previous.get('shards', {})) - set(shards):
+        for suffix in ('', '.gz', '.br', '.json'):
+            try:
+                os.remove(os.path.join(shard_dir, f"{name}.js{suffix}"))
+            except OSError:
+                pass
+
+    index = [{'name': name, 'bounds': shard['bounds'],
+              'url': SHARD_URL.format(name=name, version=shard['sha256'][:12])}
+             for name, shard in sorted(shards.items())]
+    page_key = hashlib.sha256(json.dumps([index, repr(center)]).encode('utf-8')).hexdigest()
+    stats = {'skipped': not pending, 'markers': len(keys), 'reused': len(keys) - regenerated,
+             'regenerated': regenerated,
+             'shards': len(shards), 'shards_rendered': len(pending)}
+
+    page_sha256 = previous.get('page_sha256')
+    if force or not same_layout or previous.get('page') != page_key or not os.path.exists(map_file) \
+            or page_sha256 != written_page_sha256(map_file):
+        with timer.stage('emit') as stage:
+            map_html = render_page(center, shards=index)
+            stage['rows'] = len(index)
+        with timer.stage('write'):
+            write_atomic(map_file, map_html)
+        with timer.stage('compress'):
+            page_sha256 = write_variants(map_file)['sha256']
+        stats['skipped'] = False
+
+    os.makedirs(cache_dir, exist_ok=True)
+    write_atomic(state_path, json.dumps({'shard_by': shard_by, 'page': page_key, 'page_sha256': page_sha256,
+                                         'shards': shards}))
+    return record_build(cache_dir, stats, timer, started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the interactive property map.")
+    parser.add_argument('--csv', default=DATASET, help="listing CSV to map")
+    parser.add_argument('--output', default=MAP_FILE)
+    parser.add_argument('--force', action='store_true', help="rebuild even if nothing changed")
+    parser.add_argument('--shard-by', choices=sorted(SHARD_COLUMNS),
+                        help="write one marker script per county or ZIP, loaded on demand")
+    parser.add_argument('--workers', type=int, help="processes for sharded builds (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    if args.shard_by:
+        stats = build_sharded_map(args.csv, args.output, shard_by=args.shard_by, workers=args.workers,
+                                  force=args.force)
+    else:
+        stats = build_map(args.csv, args.output, force=args.force)
+    if stats['skipped']:
+        print(f"✅ Map is up to date ({stats['markers']} markers unchanged): {args.output}")
+    elif args.shard_by:
+        print(f"✅ Map with modern dark theme saved successfully at: {args.output} "
+              f"({stats['reused']} markers reused, {stats['regenerated']} regenerated)")
+    else:
+        print(f"✅ Map with modern dark theme saved successfully at: {args.output} "
+              f"({stats['markers']} markers, {stats['stages']['markers']['bytes'] / 1024:,.1f} KB payload)")
+    if args.shard_by:
+        print(f"   Shards: {stats['shards_rendered']} of {stats['shards']} rendered")
+    print(f"   Stages: {stage_summary(stats['stages'])} ({stats['seconds']:.2f}s total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Columnar marker generation for the property map.
+
+Every step (price per bed, normalization, colors, ZIP padding, Street View
+links and popup HTML) runs as a whole-column operation instead of the old
+per-row ``iterrows`` loop.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+
+from listings import PRICE, BEDS, BATHS, LAT, LON, PHOTO, ADDRESS, ZIPCODE
+
+STREET_VIEW_URL = "https://www.google.com/maps/@?api=1&map_action=pano&viewpoint="
+
+
+def colormap_lut(cmap=plt.cm.RdYlGn):
+    """Return the colormap as an array of hex strings, with the 'bad' color last."""
+    rgba = cmap(np.arange(cmap.N))
+    colors = [mcolors.to_hex(c[:3]) for c in rgba]
+    colors.append(mcolors.to_hex(cmap(np.nan)[:3]))
+    return np.array(colors, dtype=object)
+
+
+_LUT = colormap_lut()
+
+
+def color_indices(values, n=plt.cm.RdYlGn.N):
+    """Map values in [0, 1] to LUT indices exactly like ``Colormap.__call__``."""
+    scaled = np.asarray(values, dtype=float) * n
+    scaled[scaled == n] = n - 1
+    bad = np.isnan(scaled)
+    scaled[bad] = n
+    return np.clip(scaled, 0, n).astype(int)
+
+
+def _number_str(values):
+    """Format numbers like ``str()`` would, but whole floats without ``.0``."""
+    whole = values % 1 == 0
+    text = values.astype(str)
+    text[whole] = values[whole].astype('int64').astype(str)
+    return text
+
+
+def price_per_bed(data):
+    """Price divided by bedrooms, NaN where there are no bedrooms."""
+    beds = data[BEDS]
+    return data[PRICE] / beds.where(beds > 0)
+
+
+def marker_colors(data):
+    """Price-per-bed colors for the listings that have bedrooms.
+
+    Returns ``(price_per_bed, colors)``, both indexed like those rows.
+    Colors are normalized across ``data``, so they depend on every listing.
+    """
+    ppb = price_per_bed(data)
+    ppb = ppb[ppb.notna()]
+
+    min_ppb = ppb.min()
+    max_ppb = ppb.max()
+    normalized = (ppb.to_numpy() - min_ppb) / (max_ppb - min_ppb)
+    return ppb, pd.Series(_LUT[color_indices(1 - normalized)], index=ppb.index)
+
+
+def zip_codes(data):
+    return data[ZIPCODE].astype(str).str.zfill(5)
+
+
+def popup_html(data):
+    """Popup HTML for every row of ``data``."""
+    lat = data[LAT].astype(str)
+    lon = data[LON].astype(str)
+    price = _number_str(data[PRICE])
+    price_label = data[PRICE].map('{:,.2f}'.format)
+    beds = data[BEDS].astype(int).astype(str)
+    baths = data[BATHS].astype(str)
+
+    street_view_link = STREET_VIEW_URL + lat + ',' + lon
+    address_html = ('<a href="' + street_view_link + '" target="_blank">'
+                    + data[ADDRESS].astype(str) + ' (Street View)</a>')
+
+    return (
+        '\n    <div onclick="setPropertyDetails(' + price + ', ' + beds + ')">\n'
+        + '        <img src="' + data[PHOTO].astype(str) + '" width="200"><br>\n'
+        + '        <b>Price:</b> $' + price_label + '<br>\n'
+        + '        <b>Beds:</b> ' + beds + '<br>\n'
+        + '        <b>Bathrooms:</b> ' + baths + '<br> \n'
+        + '        <b>Address:</b> ' + address_html + '<br>\n'
+        + '        <b>Zip code:</b> ' + zip_codes(data) + '<br>\n'
+        + '    </div>\n    '
+    )
+
+
+def listing_popup_html(columns, row):
+    """Popup HTML for one row of a listing cache build (``listing_cache.py``)."""
+    data = pd.DataFrame({
+        LAT: [columns.lat[row]], LON: [columns.lon[row]],
+        PRICE: [columns.price[row]], BEDS: [columns.beds[row]], BATHS: [columns.baths[row]],
+        PHOTO: [columns.photo[row]], ADDRESS: [columns.address[row]],
+        ZIPCODE: [columns.zipcode[row].decode()],
+    })
+    return popup_html(data).iloc[0]
+
+
+def build_markers(data):
+    """Build the marker table for ``data`` (cleaned listings) in one pass.
+
+    Returns a DataFrame with ``lat``, ``lon``, ``popup``, ``color`` and
+    ``zipcode`` columns (the same records ``map.py`` used to build row by
+    row), plus ``price``, ``beds`` and ``price_per_bed`` for callers that
+    need the raw numbers.
+    """
+    ppb, colors = marker_colors(data)
+    data = data.loc[ppb.index]
+
+    return pd.DataFrame({
+        'lat': data[LAT].to_numpy(),
+        'lon': data[LON].to_numpy(),
+        'popup': popup_html(data).to_numpy(),
+        'color': colors.to_numpy(),
+        'zipcode': zip_codes(data).to_numpy(),
+        'price': data[PRICE].to_numpy(),
+        'beds': data[BEDS].to_numpy(),
+        'price_per_bed': ppb.to_numpy(),
+    }, index=data.index)
+
+
+def build_markers_iterrows(data):
+    """The original row-by-row marker loop, kept as the benchmark baseline."""
+    data = data.copy()
+    data['price_per_bed'] = data.apply(
+        lambda row: row[PRICE] / row[BEDS] if row[BEDS] > 0 else None,
+        axis=1
+    )
+    min_ppb = data['price_per_bed'].min()
+    max_ppb = data['price_per_bed'].max()
+
+    marker_data = []
+    for _, row in data.iterrows():
+        if pd.isna(row['price_per_bed']):
+            continue
+        normalized_ppb = (row['price_per_bed'] - min_ppb) / (max_ppb - min_ppb)
+        color_hex = mcolors.to_hex(plt.cm.RdYlGn(1 - normalized_ppb)[:3])
+        zip_code = str(row[ZIPCODE]).zfill(5)
+
+        street_view_link = f"{STREET_VIEW_URL}{row[LAT]},{row[LON]}"
+        address_html = f'<a href="{street_view_link}" target="_blank">{row[ADDRESS]} (Street View)</a>'
+
+        popup_html = f"""
+    <div onclick="setPropertyDetails({row[PRICE]}, {int(row[BEDS])})">
+        <img src="{row[PHOTO]}" width="200"><br>
+        <b>Price:</b> ${row[PRICE]:,.2f}<br>
+        <b>Beds:</b> {int(row[BEDS])}<br>
+        <b>Bathrooms:</b> {(row[BATHS])}<br> 
+        <b>Address:</b> {address_html}<br>
+        <b>Zip code:</b> {zip_code}<br>
+    </div>
+    """
+        marker_data.append({
+            "lat": row[LAT],
+            "lon": row[LON],
+            "popup": popup_html,
+            "color": color_hex,
+            "zipcode": zip_code
+        })
+    return marker_data
+
+
+def synthetic_listings(rows, seed=0):
+    """Random listings with the columns the marker builder reads."""
+    rng = np.random.default_rng(seed)
+    beds = rng.integers(0, 7, rows)
+    return pd.DataFrame({
+        PRICE: rng.integers(50_000, 2_500_000, rows),
+        BEDS: beds.astype(float),
+        BATHS: rng.choice([1.0, 1.5, 2.0, 2.5, 3.0, np.nan], rows),
+        LAT: np.round(rng.uniform(38.9, 41.4, rows), 6),
+        LON: np.round(rng.uniform(-75.6, -73.9, rows), 6),
+        PHOTO: 'https://ap.rdcpix.com/' + pd.Series(rng.integers(0, 10**9, rows)).astype(str) + '.jpg',
+        ADDRESS: pd.Series(rng.integers(1, 999, rows)).astype(str) + ' Main St',
+        ZIPCODE: pd.Series(rng.integers(7001, 8999, rows)).astype(str).str.zfill(5),
+    })
+
+
+def benchmark(sizes=(10_000, 100_000, 1_000_000), loop_limit=100_000):
+    """Time the columnar builder against the iterrows loop.
+
+    Above ``loop_limit`` rows, where the loop takes minutes, it is timed on
+    the first ``loop_limit`` rows and scaled up linearly; those results have
+    ``iterrows_extrapolated`` set and print with a ``~``.
+    """
+    results = []
+    for rows in sizes:
+        data = synthetic_listings(rows)
+
+        start = time.perf_counter()
+        build_markers(data)
+        columnar = time.perf_counter() - start
+
+        sample = min(rows, loop_limit)
+        start = time.perf_counter()
+        build_markers_iterrows(data.iloc[:sample])
+        loop = (time.perf_counter() - start) * rows / sample
+        extrapolated = sample < rows
+
+        results.append({'rows': rows, 'columnar_s': columnar, 'iterrows_s': loop,
+                        'iterrows_extrapolated': extrapolated})
+        loop_label = f"~{loop:.1f}s (extrapolated from {sample:,} rows)" if extrapolated else f"{loop:.2f}s"
+        print(f"{rows:>10,} rows  columnar {columnar:.2f}s  iterrows {loop_label}  "
+              f"speedup {'~' if extrapolated else ''}{loop / columnar:,.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    benchmark(loop_limit=limit)
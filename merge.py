@@ -0,0 +1,305 @@
+"""
+Incremental merge of scraper exports keyed on ``property_id``.
+
+Exports come in several column layouts (``products/0/products/0`` vs
+``products/products/0``, ``virtual_tours/0`` vs ``virtual_tours``) and lose
+fidelity when passed through spreadsheets (postal code 07424 becomes 7424,
+``false`` becomes ``FALSE``). ``normalize_export`` maps every variant onto
+one canonical layout with text values, and ``MergeStore`` applies exports as
+upserts and deletes.
+
+The store is a directory of CSV buckets partitioned by a stable hash of
+``property_id``. Applying a delta rewrites only the buckets its ids fall
+into, so the cost grows with the delta (times the bucket size), not with the
+whole history. The bucket count doubles whenever buckets average more than
+``BUCKET_ROWS`` rows, which keeps buckets small as the store grows; a split
+moves each bucket's rows between itself and one new bucket.
+
+    python merge.py apply store/ allnj.csv union.csv
+    python merge.py apply store/ new_export.csv --delete removed_ids.txt
+    python merge.py export store/ merged.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import time
+import zlib
+from pathlib import Path
+
+import pandas as pd
+
+from listings import (BATHS, BEDS, FIPS, PRICE, PRICE_REDUCED, PROPERTY_ID, POSTAL_CODE, SQFT,
+                      ZIPCODE)
+
+DEFAULT_BUCKETS = 16
+BUCKET_ROWS = 1_000
+
+# Older exports flatten single-element arrays; map them onto the indexed form.
+COLUMN_ALIASES = [
+    (re.compile(r'^products/(?!\d)'), 'products/0/'),
+    (re.compile(r'^virtual_tours$'), 'virtual_tours/0'),
+    (re.compile(r'^open_houses$'), 'open_houses/0'),
+]
+# Parent keys the scraper emits when the whole nested object is null.
+CONTAINER_COLUMNS = ['photos', 'primary_photo', 'location/county', 'location/address/coordinate']
+
+BOOLEANS = {'true', 'false'}
+WHOLE_NUMBER = re.compile(r'^-?\d+\.0+$')
+# Counts, prices and codes that spreadsheets turn into "3.0"; other text is kept as is
+WHOLE_NUMBER_COLUMNS = [PRICE, PRICE_REDUCED, BEDS, BATHS, SQFT, FIPS, 'description/lot_sqft',
+                        'description/beds_min', 'description/beds_max', 'description/baths_min',
+                        'description/baths_max', 'description/sqft_min', 'description/sqft_max',
+                        'description/sold_price']
+
+
+def read_export(path):
+    """Read an export with every value kept as text."""
+    return pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[''])
+
+
+def canonical_column(column):
+    for pattern, replacement in COLUMN_ALIASES:
+        if pattern.search(column):
+            return pattern.sub(replacement, column)
+    return column
+
+
+def normalize_export(data):
+    """Map an export onto the canonical layout, one row per property_id."""
+    data = data.astype(object).where(data.notna(), None)
+
+    # Coalesce aliased columns into their canonical name
+    columns = {}
+    for column in data.columns:
+        target = canonical_column(column)
+        if target in columns:
+            columns[target] = columns[target].combine_first(data[column])
+        else:
+            columns[target] = data[column]
+    data = pd.DataFrame(columns)
+
+    data = data.drop(columns=[c for c in CONTAINER_COLUMNS if c in data and data[c].isna().all()])
+
+    # The derived zipcode column is folded back into the postal code
+    if ZIPCODE in data:
+        postal = data[POSTAL_CODE] if POSTAL_CODE in data else pd.Series(None, index=data.index)
+        data[POSTAL_CODE] = postal.combine_first(data[ZIPCODE])
+        data = data.drop(columns=[ZIPCODE])
+
+    for column in data.columns:
+        values = data[column]
+        text = values.dropna().astype(str)
+        if text.empty:
+            continue
+        lowered = text.str.lower()
+        if lowered.isin(BOOLEANS).all():
+            data[column] = values.where(values.isna(), values.astype(str).str.lower())
+        elif column in WHOLE_NUMBER_COLUMNS:
+            whole = values.notna() & values.astype(str).str.fullmatch(WHOLE_NUMBER)
+            if whole.any():
+                data[column] = values.where(~whole, values.astype(str).str.replace(r'\.0+$', '', regex=True))
+
+    if POSTAL_CODE in data:
+        postal = data[POSTAL_CODE]
+        digits = postal.astype(str).str.fullmatch(r'\d{1,5}')
+        data[POSTAL_CODE] = postal.where(~digits, postal.astype(str).str.zfill(5))
+
+    data = data.dropna(subset=[PROPERTY_ID])
+    return data.drop_duplicates(subset=[PROPERTY_ID], keep='last').set_index(PROPERTY_ID)
+
+
+def _bucket(property_id, buckets):
+    return zlib.crc32(str(property_id).encode()) % buckets
+
+
+def bucket_of(property_ids, buckets):
+    """Stable bucket number for each id (unlike ``hash()``, the same in every process)."""
+    return pd.Series([_bucket(pid, buckets) for pid in property_ids], index=property_ids)
+
+
+class MergeResult:
+    """What one ``MergeStore.apply`` call changed."""
+
+    def __init__(self):
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+        self.buckets_touched = 0
+        self.elapsed = 0.0
+        self.previous = []   # rows as they were before the change
+        self.current = []    # rows as they are after the change
+
+    def summary(self):
+        return (f"{len(self.inserted):,} inserted, {len(self.updated):,} updated, "
+                f"{len(self.deleted):,} deleted across {self.buckets_touched} buckets "
+                f"in {self.elapsed:.2f}s")
+
+
+class MergeStore:
+    """Merged listing dataset stored as hash-partitioned CSV buckets."""
+
+    def __init__(self, root, buckets=DEFAULT_BUCKETS):
+        self.root = Path(root)
+        self.manifest_path = self.root / 'manifest.json'
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+            self.buckets = manifest['buckets']
+            self.columns = manifest['columns']
+            self.rows = manifest.get('rows')
+            if self.rows is None:  # stores written before the count was kept
+                self.rows = sum(len(self._read_bucket(bucket)) for bucket in range(self.buckets))
+        else:
+            self.buckets = buckets
+            self.columns = [PROPERTY_ID]
+            self.rows = 0
+
+    def _bucket_path(self, bucket):
+        return self.root / f"bucket-{bucket:04d}.csv"
+
+    def _read_bucket(self, bucket):
+        """Rows of one bucket as ``{property_id: {column: text}}``."""
+        path = self._bucket_path(bucket)
+        if not path.exists():
+            return {}
+        with open(path, newline='') as f:
+            rows = {row[PROPERTY_ID]: row for row in csv.DictReader(f)}
+        # A split interrupted before trimming leaves copies of moved rows behind
+        return {pid: row for pid, row in rows.items() if _bucket(pid, self.buckets) == bucket}
+
+    def _replace(self, path, write):
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'w', newline='') as f:
+            write(f)
+        os.replace(tmp, path)
+
+    def _write_bucket(self, bucket, rows):
+        def write(f):
+            writer = csv.DictWriter(f, fieldnames=self.columns, restval='')
+            writer.writeheader()
+            writer.writerows(rows.values())
+        self._replace(self._bucket_path(bucket), write)
+
+    def _write_manifest(self):
+        self._replace(self.manifest_path, lambda f: json.dump(
+            {'buckets': self.buckets, 'columns': self.columns, 'rows': self.rows}, f))
+
+    def _split(self):
+        """Double the bucket count. Bucket ``b`` keeps the ids whose hash
+        modulo the new count is still ``b``; the rest move to ``b + buckets``."""
+        old, new = self.buckets, self.buckets * 2
+        for bucket in range(old):
+            rows = self._read_bucket(bucket)
+            self._write_bucket(bucket + old, {pid: row for pid, row in rows.items()
+                                              if _bucket(pid, new) != bucket})
+        # New buckets are complete before the manifest points at them; leftover
+        # copies in the old ones are dropped on read until trimmed below
+        self.buckets = new
+        self._write_manifest()
+        for bucket in range(old):
+            self._write_bucket(bucket, self._read_bucket(bucket))
+
+    def apply(self, export, deletes=()):
+        """Upsert the rows of ``export`` and delete the ids in ``deletes``.
+
+        Columns present in the export overwrite stored values (including with
+        nulls); columns it doesn't carry keep what the store already has.
+        """
+        started = time.perf_counter()
+        result = MergeResult()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        delta = normalize_export(export) if len(export) else pd.DataFrame()
+        deletes = pd.Index([str(pid) for pid in deletes]).difference(delta.index)
+        for column in delta.columns:
+            if column not in self.columns:
+                self.columns.append(column)
+
+        upserts = {}
+        for pid, row in zip(delta.index, delta.itertuples(index=False, name=None)):
+            record = {column: '' if value is None else value for column, value in zip(delta.columns, row)}
+            record[PROPERTY_ID] = pid
+            upserts[pid] = record
+
+        targets = bucket_of(delta.index.append(deletes), self.buckets)
+        for bucket, ids in targets.groupby(targets).groups.items():
+            rows = self._read_bucket(bucket)
+            for pid in ids:
+                old = rows.get(pid)
+                if pid in upserts:
+                    if old is None:
+                        rows[pid] = upserts[pid]
+                        result.inserted.append(pid)
+                    else:
+                        result.previous.append(dict(old))
+                        old.update(upserts[pid])
+                        result.updated.append(pid)
+                    result.current.append(rows[pid])
+                elif old is not None:
+                    result.previous.append(rows.pop(pid))
+                    result.deleted.append(pid)
+            self._write_bucket(bucket, rows)
+            result.buckets_touched += 1
+
+        self.rows += len(result.inserted) - len(result.deleted)
+        self._write_manifest()
+        while self.rows > BUCKET_ROWS * self.buckets:
+            self._split()
+        result.previous = pd.DataFrame(result.previous, columns=self.columns)
+        result.current = pd.DataFrame(result.current, columns=self.columns)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def __iter__(self):
+        """Yield each bucket as a text frame with the full column set."""
+        for bucket in range(self.buckets):
+            if self._bucket_path(bucket).exists():
+                frame = read_export(self._bucket_path(bucket))
+                frame = frame[bucket_of(frame[PROPERTY_ID], self.buckets).to_numpy() == bucket]
+                yield frame.reindex(columns=self.columns)
+
+    def export(self, path):
+        """Write the merged dataset to a single CSV, one bucket at a time."""
+        rows = 0
+        first = True
+        for frame in self:
+            frame.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+            first = False
+            rows += len(frame)
+        if first:
+            pd.DataFrame(columns=self.columns).to_csv(path, index=False)
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge scraper exports into a listing store.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    apply_cmd = commands.add_parser('apply', help="upsert exports into the store")
+    apply_cmd.add_argument('store')
+    apply_cmd.add_argument('exports', nargs='*')
+    apply_cmd.add_argument('--delete', help="file with one property_id per line to remove")
+    apply_cmd.add_argument('--buckets', type=int, default=DEFAULT_BUCKETS,
+                           help="initial bucket count for a new store (it grows with the store)")
+
+    export_cmd = commands.add_parser('export', help="write the merged dataset to one CSV")
+    export_cmd.add_argument('store')
+    export_cmd.add_argument('output')
+
+    args = parser.parse_args(argv)
+    if args.command == 'apply':
+        store = MergeStore(args.store, args.buckets)
+        for path in args.exports:
+            print(f"✅ {path}: {store.apply(read_export(path)).summary()}")
+        if args.delete:
+            ids = [line.strip() for line in Path(args.delete).read_text().splitlines() if line.strip()]
+            print(f"✅ {args.delete}: {store.apply(pd.DataFrame(), deletes=ids).summary()}")
+    else:
+        rows = MergeStore(args.store).export(args.output)
+        print(f"✅ Exported {rows:,} listings to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
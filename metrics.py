@@ -0,0 +1,167 @@
+"""
+Minimal Prometheus metrics (text exposition format 0.0.4) and stage timers.
+
+Counters, gauges and histograms keep their values in process memory, keyed
+by label values. ``render()`` writes them all, plus whatever the registered
+collectors report (cache and hash-pool statistics are read on each scrape
+rather than tracked twice). ``StageTimer`` records per-stage durations and
+row counts for batch jobs such as the map build.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; request and query latencies mostly fall between 1 ms and a few seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+                    for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, observations = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+        return value
+
+    def lines(self):
+        with self._lock:
+            items = [(key, list(counts), total, observations)
+                     for key, (counts, total, observations) in self._values.items()]
+        lines = []
+        for key, counts, total, observations in items:
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {observations}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {observations}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labels=()):
+        return Counter(self, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return Gauge(self, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, help, labels, buckets)
+
+    def collector(self, fn):
+        """Register ``fn() -> [(name, kind, help, {labels}, value), ...]``, read on every scrape."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.header() + metric.lines()
+        seen = set()
+        for collect in self.collectors:
+            for name, kind, help, labels, value in collect():
+                if value is None:
+                    continue
+                if name not in seen:
+                    seen.add(name)
+                    lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Durations and row counts for the named stages of one pipeline run.
+
+    ``on_stage(name)``, if given, is called as each stage starts (the job
+    runner uses it to report progress).
+    """
+
+    def __init__(self, on_stage=None):
+        self.stages = {}
+        self.on_stage = on_stage
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block; set ``stats['rows']`` inside it to record a row count."""
+        if self.on_stage is not None:
+            self.on_stage(name)
+        stats = {}
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats['seconds'] = round(time.perf_counter() - started, 4)
+            self.stages[name] = stats
+
+
+def stage_summary(stages):
+    """One line of ``name 0.12s (1,234 rows)`` entries for ``StageTimer.stages``."""
+    return ", ".join(f"{name} {stats['seconds']:.2f}s"
+                     + (f" ({stats['rows']:,} rows)" if 'rows' in stats else "")
+                     for name, stats in stages.items())
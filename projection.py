@@ -0,0 +1,213 @@
+"""
+Monte Carlo projection of property value, rent and cash flow.
+
+Every path draws yearly appreciation and rent-growth rates (shared by all
+properties in the portfolio, since they move with the market) and a vacancy
+rate per property per year. Paths are generated as arrays, ``CHUNK_CELLS``
+path x property cells at a time, and the chunks are spread over a process
+pool. Each chunk folds its yearly portfolio totals into mergeable quantile
+sketches (sketch.py) and throws the paths away, so memory stays bounded no
+matter how many paths are requested.
+
+Chunk boundaries and seeds depend only on the inputs (seeds are spawned from
+one ``SeedSequence``), so a given seed gives the same bands with any number
+of workers.
+
+    python projection.py [paths] [workers]    # time a portfolio projection
+"""
+
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sketch import QuantileSketch
+
+# name: (default, minimum, maximum); rates and volatilities are annual %
+ASSUMPTIONS = {
+    'years': (10.0, 1.0, 50.0),
+    'paths': (10_000.0, 1.0, 1_000_000.0),
+    'seed': (0.0, 0.0, 2.0 ** 32 - 1),
+    'appreciation': (3.0, -50.0, 50.0),
+    'appreciation_volatility': (8.0, 0.0, 100.0),
+    'rent_growth': (3.0, -50.0, 50.0),
+    'rent_growth_volatility': (4.0, 0.0, 100.0),
+    'vacancy_pct': (5.0, 0.0, 100.0),
+    'vacancy_volatility': (3.0, 0.0, 100.0),
+    'expense_growth': (2.5, -50.0, 50.0),
+}
+
+# Per-property inputs; annual_expenses grow at expense_growth, debt service is fixed
+PROPERTY_FIELDS = ['property_value', 'monthly_rent', 'annual_expenses', 'monthly_debt_service']
+
+METRICS = ['value', 'rent', 'cash_flow', 'cumulative_cash_flow']
+PERCENTILES = [5, 25, 50, 75, 95]
+CHUNK_CELLS = 1_000_000
+
+_executor = None
+
+
+def parse_assumptions(args):
+    """Read assumptions from a mapping, falling back to defaults.
+
+    Raises ``ValueError`` naming the first invalid or out-of-range value.
+    """
+    assumptions = {}
+    for name, (default, low, high) in ASSUMPTIONS.items():
+        raw = args.get(name)
+        try:
+            value = default if raw in (None, '') else float(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number") from None
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low:g} and {high:g}")
+        assumptions[name] = value
+    for name in ('years', 'paths', 'seed'):
+        assumptions[name] = int(assumptions[name])
+    return assumptions
+
+
+def parse_properties(records):
+    """Per-property input arrays from a list of mappings (blank fields are 0)."""
+    if not records:
+        raise ValueError("At least one property is required")
+    properties = {}
+    for field in PROPERTY_FIELDS:
+        try:
+            properties[field] = np.array([float(record.get(field) or 0) for record in records])
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number") from None
+    for field, values in properties.items():
+        if not np.isfinite(values).all():
+            raise ValueError(f"{field} must be a finite number")
+        if field != 'annual_expenses' and (values < 0).any():
+            raise ValueError(f"{field} cannot be negative")
+    return properties
+
+
+def _simulate_chunk(properties, assumptions, paths, seed_sequence):
+    """Simulate ``paths`` paths and return one sketch per metric."""
+    a = assumptions
+    years = a['years']
+    rng = np.random.default_rng(seed_sequence)
+    sketches = {metric: QuantileSketch(years) for metric in METRICS}
+    sums = {metric: np.zeros(years) for metric in METRICS}
+
+    value = np.broadcast_to(properties['property_value'], (paths, len(properties['property_value']))).copy()
+    rent = np.broadcast_to(properties['monthly_rent'] * 12, value.shape).copy()
+    debt_service = properties['monthly_debt_service'].sum() * 12
+    cumulative = np.zeros(paths)
+
+    for year in range(years):
+        appreciation = rng.normal(a['appreciation'], a['appreciation_volatility'], paths) / 100
+        rent_growth = rng.normal(a['rent_growth'], a['rent_growth_volatility'], paths) / 100
+        vacancy = rng.normal(a['vacancy_pct'], a['vacancy_volatility'], value.shape) / 100
+        np.clip(vacancy, 0, 1, out=vacancy)
+        np.maximum(appreciation, -1, out=appreciation)
+        np.maximum(rent_growth, -1, out=rent_growth)
+
+        value *= (1 + appreciation)[:, None]
+        rent *= (1 + rent_growth)[:, None]
+        expenses = properties['annual_expenses'].sum() * (1 + a['expense_growth'] / 100) ** (year + 1)
+
+        vacancy = 1 - vacancy
+        vacancy *= rent
+        cash_flow = vacancy.sum(axis=1) - expenses - debt_service
+        cumulative += cash_flow
+        totals = {
+            'value': value.sum(axis=1),
+            'rent': rent.sum(axis=1),
+            'cash_flow': cash_flow,
+            'cumulative_cash_flow': cumulative,
+        }
+        for metric, total in totals.items():
+            sketches[metric].add(total, np.full(paths, year))
+            sums[metric][year] += total.sum()
+    return sketches, sums
+
+
+def _chunks(total_paths, n_properties):
+    per_chunk = max(1, CHUNK_CELLS // max(n_properties, 1))
+    return [min(per_chunk, total_paths - start) for start in range(0, total_paths, per_chunk)]
+
+
+def _get_executor(workers):
+    global _executor
+    if _executor is None or _executor._max_workers != workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        # spawn keeps workers clear of the web server's threads and sockets
+        _executor = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def project(properties, assumptions, workers=None):
+    """Percentile bands per year for the portfolio.
+
+    Returns ``{'years': [...], 'percentiles': [...], metric: {'p5': [...],
+    ..., 'mean': [...]}, ...}`` plus run details.
+    """
+    started = time.perf_counter()
+    paths = assumptions['paths']
+    sizes = _chunks(paths, len(properties['property_value']))
+    seeds = np.random.SeedSequence(assumptions['seed']).spawn(len(sizes))
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+
+    sketches = {metric: QuantileSketch(assumptions['years']) for metric in METRICS}
+    sums = {metric: np.zeros(assumptions['years']) for metric in METRICS}
+
+    def merge(result):
+        chunk_sketches, chunk_sums = result
+        for metric in METRICS:
+            sketches[metric].merge(chunk_sketches[metric])
+            sums[metric] += chunk_sums[metric]
+
+    if workers <= 1:
+        for size, seed in zip(sizes, seeds):
+            merge(_simulate_chunk(properties, assumptions, size, seed))
+    else:
+        executor = _get_executor(workers)
+        n = len(sizes)
+        for result in executor.map(_simulate_chunk, [properties] * n, [assumptions] * n, sizes, seeds):
+            merge(result)
+
+    bands = {}
+    for metric in METRICS:
+        quantiles = sketches[metric].quantiles(np.array(PERCENTILES) / 100)
+        bands[metric] = {f"p{p}": np.round(quantiles[:, i], 2).tolist() for i, p in enumerate(PERCENTILES)}
+        bands[metric]['mean'] = np.round(sums[metric] / paths, 2).tolist()
+
+    return dict(
+        bands,
+        years=list(range(1, assumptions['years'] + 1)),
+        percentiles=PERCENTILES,
+        paths=paths,
+        properties=len(properties['property_value']),
+        seed=assumptions['seed'],
+        chunks=len(sizes),
+        workers=workers,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
+
+
+if __name__ == "__main__":
+    paths = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    rng = np.random.default_rng(0)
+    portfolio = 5
+    properties = {
+        'property_value': rng.uniform(200_000, 800_000, portfolio),
+        'monthly_rent': rng.uniform(1_500, 4_000, portfolio),
+        'annual_expenses': rng.uniform(4_000, 12_000, portfolio),
+        'monthly_debt_service': rng.uniform(800, 3_000, portfolio),
+    }
+    assumptions = parse_assumptions({'paths': paths, 'years': 30})
+    result = project(properties, assumptions, workers)
+    print(f"{paths:,} paths x {portfolio} properties x 30 years in {result['elapsed_ms'] / 1000:.2f}s "
+          f"({result['workers']} workers, {result['chunks']} chunks)")
+    print(f"Year 30 value p5/p50/p95: {result['value']['p5'][-1]:,.0f} / "
+          f"{result['value']['p50'][-1]:,.0f} / {result['value']['p95'][-1]:,.0f}")
@@ -0,0 +1,180 @@
+"""
+Memoized rendered pages for ``/calculate`` and ``/check_credit``.
+
+Both routes are pure functions of their form inputs, so the rendered page is
+cached under a canonical form of those inputs (numbers are compared by value,
+so "250000", "250000.0" and "2.5e5" share an entry). ``ResultCache`` is an
+in-process LRU bounded by total bytes, with a TTL per entry. An optional
+SQLite file shared by every worker on the host sits behind it: local misses
+are looked up there, and new pages are written to both.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _canonical_value(value):
+    # Not stripped: the routes treat "" as "use the default" but reject "  ",
+    # and compare text such as the category exactly. float() already ignores
+    # surrounding whitespace, just as the routes' float() calls do.
+    if value == '':
+        return ''
+    try:
+        return repr(float(value))
+    except ValueError:
+        return f"text:{value}"
+
+
+def form_key(route, form, ignore=('save',)):
+    """Cache key for a form post: the route plus its canonicalized fields.
+
+    Blank fields stay distinct from ``0`` because some routes treat a blank
+    as "use the default".
+    """
+    fields = sorted((name, _canonical_value(value)) for name, value in form.items() if name not in ignore)
+    return json.dumps([route, fields], separators=(',', ':'))
+
+
+class SharedStore:
+    """Cache entries in a SQLite file that several worker processes share."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS result_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")  # losing a cache entry is harmless
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _digest(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, expires FROM result_cache WHERE key = ?", (self._digest(key),)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value, size, expires):
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?)",
+                           (self._digest(key), value, size, expires))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the soonest-expiring ones while over ``max_bytes``."""
+        connection = self._connection()
+        connection.execute("DELETE FROM result_cache WHERE expires < ?", (time.time(),))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+        if total > self.max_bytes:
+            connection.execute(
+                "DELETE FROM result_cache WHERE key IN (SELECT key FROM result_cache ORDER BY expires "
+                "LIMIT (SELECT COUNT(*) / 4 + 1 FROM result_cache))")
+
+
+class ResultCache:
+    """Byte-bounded LRU of rendered pages with a TTL and hit/miss counters."""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=3600, shared_path=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = SharedStore(shared_path, max_bytes * 4) if shared_path else None
+        self._entries = OrderedDict()  # key: (page, size, expires)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.shared_hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[2] >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._remove(key)
+                self.expirations += 1
+
+        if self.shared is not None:
+            try:
+                page = self.shared.get(key)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared result cache read failed: {e}")
+                page = None
+            if page is not None:
+                self._store(key, page, now + self.ttl)
+                with self._lock:
+                    self.shared_hits += 1
+                return page
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, page):
+        expires = time.time() + self.ttl
+        self._store(key, page, expires)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, page, len(page.encode('utf-8')), expires)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared result cache write failed: {e}")
+
+    def _store(self, key, page, expires):
+        size = len(page.encode('utf-8')) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (page, size, expires)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'shared': self.shared.path if self.shared is not None else None,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            }
@@ -6,21 +6,94 @@ This script handles initialization and provides better error handling.
 
 import os
 import sys
+import time
+import shutil
+import socket
+import argparse
+import subprocess
+import tempfile
+import urllib.request
+from collections import defaultdict
+from importlib.util import find_spec
 from pathlib import Path
 
+# Checked with find_spec, which locates a package without importing it
+REQUIRED_PACKAGES = ['flask', 'flask_sqlalchemy', 'dotenv']
+# Only the data/map tools and data API routes import these, and only when used
+DATA_PACKAGES = ['numpy', 'pandas', 'folium', 'matplotlib']
+
 def check_environment():
     """Check if virtual environment and dependencies are set up correctly."""
-    try:
-        import flask
-        import flask_sqlalchemy
-        import pandas
-        import folium
-        print("✅ All dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
+    missing = [name for name in REQUIRED_PACKAGES if find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing dependency: {', '.join(missing)}")
         print("Please run: pip install -r requirements.txt")
         return False
+    print("✅ All dependencies are installed")
+
+    missing_data = [name for name in DATA_PACKAGES if find_spec(name) is None]
+    if missing_data:
+        print(f"⚠️  Missing {', '.join(missing_data)}: map generation and data APIs won't work")
+    return True
+
+def import_breakdown(module='main', top=15):
+    """Per-package and per-module import times for ``module``, from ``-X importtime``."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, cwd=Path(__file__).parent).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    total = sum(packages.values())
+
+    print(f"\n⏱️  Importing {module}: {total / 1000:.0f} ms across {len(modules)} modules")
+    print(f"{'package':<28}{'self ms':>10}")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<28}{self_us / 1000:>10.1f}")
+    print(f"\n{'slowest modules':<40}{'self ms':>10}{'cumulative ms':>15}")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: -m[1])[:top]:
+        print(f"{name:<40}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+
+def time_to_first_request(timeout=30.0):
+    """Seconds from launching the server process until ``/`` first answers."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    # A throwaway database, so profiling never touches the real one
+    database = Path(tempfile.mkdtemp()) / 'profile.db'
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='False', DATABASE_URL=f"sqlite:///{database}")
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, __file__], env=env, cwd=Path(__file__).parent,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+                return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None:
+                    return None
+                time.sleep(0.005)
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(database.parent, ignore_errors=True)
+
+def profile_startup():
+    """Print the import-time breakdown and cold-start time to first response."""
+    import_breakdown()
+    elapsed = time_to_first_request()
+    if elapsed is None:
+        print("\n❌ Server did not answer; run without --profile-startup to see the error")
+    else:
+        print(f"\n🚀 Time to first request: {elapsed * 1000:.0f} ms (process launch to first response)")
 
 def ensure_directories():
     """Ensure required directories exist."""
@@ -30,6 +103,14 @@ def ensure_directories():
 
 def main():
     """Main startup function."""
+    parser = argparse.ArgumentParser(description="Start the Property Calculator.")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print per-module import times and time to first request, then exit")
+    args = parser.parse_args()
+    if args.profile_startup:
+        profile_startup()
+        return
+
     print("🚀 Starting Property Calculator...")
     
     # Check environment
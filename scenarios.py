@@ -0,0 +1,146 @@
+"""
+Bulk evaluation of ``/calculate`` scenarios.
+
+Each category's formula is applied to whole columns of scenarios at once.
+Validation also runs per column, and its failures are reported per row
+(and per category) instead of rejecting the batch. The rules match
+``calculate()`` in main.py: blank fields count as 0, and every category
+except ``annual_growth`` rejects negative values.
+"""
+
+import json
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+INVALID_NUMBER = "Please enter valid numerical values"
+NEGATIVE_VALUE = "Values cannot be negative"
+INVALID_CATEGORY = "Invalid calculation category"
+
+# category: (input fields, result label, rejects negatives, formula)
+CATEGORIES = {
+    'acquisition_cost': (
+        ['purchase_price', 'closing_costs', 'renovation_budget', 'downpayment'],
+        "Total Fixed Costs", True,
+        lambda price, closing, renovation, down: price + closing + renovation + down,
+    ),
+    'operating_expenses': (
+        ['homeowners_insurance', 'property_tax', 'other_cost'],
+        "Total Operating Expenses", True,
+        lambda insurance, tax, other: insurance + tax + other,
+    ),
+    'cash_flow': (
+        ['rent_revenue', 'coc_return_goal'],
+        "Annual Cash Flow", True,
+        lambda rent, coc_goal: rent * (coc_goal / 100),
+    ),
+    'annual_growth': (
+        ['rent_growth', 'appreciation', 'other_cost'],
+        "Annual Growth Total", False,
+        lambda rent_growth, appreciation, other: rent_growth + appreciation + other,
+    ),
+}
+
+FIELDS = sorted({field for fields, _, _, _ in CATEGORIES.values() for field in fields})
+
+# Error codes per category, kept as small integer arrays until serialization
+OK, BAD_NUMBER, NEGATIVE = 0, 1, 2
+ERROR_MESSAGES = {BAD_NUMBER: INVALID_NUMBER, NEGATIVE: NEGATIVE_VALUE}
+
+
+def read_scenarios(source):
+    """Scenarios from a list of dicts or a CSV file object, as a text frame."""
+    if isinstance(source, list):
+        return pd.DataFrame.from_records(source)
+    return pd.read_csv(source, dtype=str, keep_default_na=False)
+
+
+def parse_fields(raw):
+    """Numeric arrays for every input field, plus a mask of unparsable values."""
+    values, invalid = {}, {}
+    for field in FIELDS:
+        if field not in raw:
+            values[field] = np.zeros(len(raw))
+            invalid[field] = np.zeros(len(raw), dtype=bool)
+            continue
+        column = raw[field]
+        blank = column.isna() | (column.astype(str).str.strip() == '')
+        numbers = pd.to_numeric(column.where(~blank), errors='coerce')
+        invalid[field] = (~blank & numbers.isna()).to_numpy()
+        values[field] = numbers.fillna(0).to_numpy(dtype=float)
+    return values, invalid
+
+
+def evaluate(raw):
+    """Compute every category for every scenario.
+
+    Returns ``{category: (totals, error_codes)}`` with one entry per row in
+    each array.
+    """
+    values, invalid = parse_fields(raw)
+    evaluated = {}
+    for category, (fields, _, non_negative, formula) in CATEGORIES.items():
+        inputs = [values[field] for field in fields]
+        with np.errstate(invalid='ignore', over='ignore'):
+            totals = formula(*inputs)
+        codes = np.zeros(len(raw), dtype=np.int8)
+        if non_negative:
+            codes[np.logical_or.reduce([x < 0 for x in inputs])] = NEGATIVE
+        codes[np.logical_or.reduce([invalid[field] for field in fields])] = BAD_NUMBER
+        evaluated[category] = (totals, codes)
+    return evaluated
+
+
+def _json_number(value):
+    return value if math.isfinite(value) else None
+
+
+def iter_results(raw, chunk_rows=10_000):
+    """Yield one JSON line per scenario, then a summary line.
+
+    A scenario with a ``category`` is answered for that category only;
+    otherwise all four categories are returned. Rows are evaluated
+    ``chunk_rows`` at a time so a response starts streaming before the
+    whole batch is done.
+    """
+    started = time.perf_counter()
+    failed = 0
+    for start in range(0, len(raw), chunk_rows):
+        chunk = raw.iloc[start:start + chunk_rows]
+        evaluated = {category: (totals.tolist(), codes.tolist())
+                     for category, (totals, codes) in evaluate(chunk).items()}
+        requested = (chunk['category'].fillna('').astype(str).tolist()
+                     if 'category' in chunk else [''] * len(chunk))
+
+        lines = []
+        for i, category in enumerate(requested):
+            results, errors = {}, {}
+            if not category:
+                names = CATEGORIES
+            elif category in CATEGORIES:
+                names = [category]
+            else:
+                names = []
+                errors[category] = INVALID_CATEGORY
+            for name in names:
+                totals, codes = evaluated[name]
+                if codes[i]:
+                    errors[name] = ERROR_MESSAGES[codes[i]]
+                else:
+                    results[name] = {CATEGORIES[name][1]: _json_number(totals[i])}
+            line = {'row': start + i, 'results': results}
+            if errors:
+                line['errors'] = errors
+                failed += 1
+            lines.append(json.dumps(line))
+        yield "\n".join(lines) + "\n"
+
+    elapsed = time.perf_counter() - started
+    yield json.dumps({'summary': {
+        'scenarios': len(raw),
+        'rows_with_errors': failed,
+        'elapsed_ms': round(elapsed * 1000, 2),
+        'scenarios_per_sec': round(len(raw) / elapsed) if elapsed else None,
+    }}) + "\n"
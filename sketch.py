@@ -0,0 +1,140 @@
+"""
+Mergeable quantile sketches with bounded relative error.
+
+A ``QuantileSketch`` holds many independent sketches at once (one per row,
+e.g. one per projection year or per ZIP code) as dense bucket-count arrays.
+Values are bucketed on a logarithmic scale (the DDSketch scheme), so any
+quantile is within ``relative_accuracy`` of the true value. Sketches merge by
+adding counts, and ``add(..., weight=-1)`` removes values again, which lets
+aggregates be updated incrementally. Updates touch only the buckets of the
+values given, and the negative store is only allocated once a negative value
+arrives.
+"""
+
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """``rows`` quantile sketches sharing one bucket layout."""
+
+    def __init__(self, rows=1, relative_accuracy=0.005, min_value=1e-2, max_value=1e12):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self.buckets = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.positive = np.zeros((rows, self.buckets), dtype=np.int64)
+        self.negative = None
+        self.zero = np.zeros(rows, dtype=np.int64)
+
+    @property
+    def rows(self):
+        return len(self.zero)
+
+    def resize(self, rows):
+        """Grow to ``rows`` sketches, keeping existing counts."""
+        extra = rows - self.rows
+        if extra > 0:
+            self.positive = np.vstack([self.positive, np.zeros((extra, self.buckets), dtype=np.int64)])
+            if self.negative is not None:
+                self.negative = np.vstack([self.negative, np.zeros((extra, self.buckets), dtype=np.int64)])
+            self.zero = np.concatenate([self.zero, np.zeros(extra, dtype=np.int64)])
+
+    def _negative(self):
+        if self.negative is None:
+            self.negative = np.zeros_like(self.positive)
+        return self.negative
+
+    def _bucket(self, magnitude):
+        index = np.ceil(np.log(magnitude) / self._log_gamma).astype(np.int64) - self._offset
+        return np.clip(index, 0, self.buckets - 1)
+
+    def add(self, values, rows=None, weight=1):
+        """Add ``values`` to sketch ``rows`` (all to row 0 when omitted).
+
+        Pass ``weight=-1`` to remove values that were added before.
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        rows = np.zeros(len(values), dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64).ravel()
+        keep = ~np.isnan(values)
+        values, rows = values[keep], rows[keep]
+
+        small = np.abs(values) < self.min_value
+        np.add.at(self.zero, rows[small], weight)
+        positive, negative = ~small & (values > 0), ~small & (values < 0)
+        np.add.at(self.positive, (rows[positive], self._bucket(values[positive])), weight)
+        if negative.any():
+            np.add.at(self._negative(), (rows[negative], self._bucket(-values[negative])), weight)
+
+    def add_rows(self, values):
+        """Add a ``(rows, n)`` array, row ``i`` going to sketch ``i``."""
+        values = np.asarray(values, dtype=float)
+        self.add(values, np.repeat(np.arange(values.shape[0]), values.shape[1]))
+
+    def merge(self, other):
+        """Add another sketch's counts (same rows and layout) into this one."""
+        self.positive += other.positive
+        if other.negative is not None:
+            self._negative()[:] += other.negative
+        self.zero += other.zero
+        return self
+
+    def count(self):
+        negative = 0 if self.negative is None else self.negative.sum(axis=1)
+        return self.positive.sum(axis=1) + negative + self.zero
+
+    def quantiles(self, qs, rows=None):
+        """Estimated quantiles, shaped ``(rows, len(qs))``; NaN for empty rows.
+
+        ``rows`` limits the result to those sketches, in that order.
+        """
+        qs = np.atleast_1d(np.asarray(qs, dtype=float))
+        rows = slice(None) if rows is None else np.asarray(rows, dtype=np.int64)
+        magnitudes = 2 * self.gamma ** (np.arange(self.buckets) + self._offset) / (self.gamma + 1)
+        # Ordered buckets: most negative first, then zero, then positive
+        counts = np.hstack([self.zero[rows, None], self.positive[rows]])
+        centers = np.concatenate([[0.0], magnitudes])
+        if self.negative is not None:
+            counts = np.hstack([self.negative[rows, ::-1], counts])
+            centers = np.concatenate([-magnitudes[::-1], centers])
+        cumulative = np.cumsum(counts, axis=1)
+        total = cumulative[:, -1]
+
+        result = np.full((len(total), len(qs)), np.nan)
+        for j, q in enumerate(qs):
+            rank = q * (total - 1)
+            position = (cumulative > rank[:, None]).argmax(axis=1)
+            result[:, j] = np.where(total > 0, centers[position], np.nan)
+        return result
+
+    def to_dict(self):
+        """Sparse, JSON-friendly form of the counts."""
+        def sparse(store):
+            if store is None:
+                return [[], [], []]
+            rows, buckets = np.nonzero(store)
+            return [rows.tolist(), buckets.tolist(), store[rows, buckets].tolist()]
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'rows': self.rows,
+            'positive': sparse(self.positive),
+            'negative': sparse(self.negative),
+            'zero': self.zero.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['rows'], data['relative_accuracy'], data['min_value'], data['max_value'])
+        rows, buckets, counts = data['positive']
+        sketch.positive[rows, buckets] = counts
+        rows, buckets, counts = data['negative']
+        if counts:
+            sketch._negative()[rows, buckets] = counts
+        sketch.zero[:] = data['zero']
+        return sketch
@@ -0,0 +1,196 @@
+"""
+In-memory spatial index over listing coordinates for viewport queries.
+
+Listings are bucketed into Web Mercator grid cells. Every zoom level up to
+``CLUSTER_MAX_ZOOM`` is pre-aggregated into clusters (each level is built
+from the one below it, not from the raw points); above it the index
+returns individual listings. Cells are kept sorted column by column, so a
+viewport query costs two ``searchsorted`` calls per visible grid column and
+never looks at listings outside the view. A box too large for the zoom asked
+for (more than ``MAX_CLUSTERS`` grid cells) is answered at the highest zoom
+where it fits, so a response never exceeds that many clusters.
+"""
+
+import math
+
+import numpy as np
+
+CELL_BITS = 2            # 4x4 cells per 256px tile, i.e. ~64px clusters
+CLUSTER_MAX_ZOOM = 13    # highest zoom served as clusters
+POINT_GRID_ZOOM = 16     # grid resolution used to look up individual points
+MAX_ZOOM = 22
+MAX_POINTS = 2000        # beyond this a point query falls back to clusters
+MAX_CLUSTERS = 2000      # grid cells a cluster response may span (a screen is ~500)
+MAX_LAT = 85.05112878
+
+
+def project(lat, lon):
+    """Lat/lon in degrees to Web Mercator x/y in [0, 1)."""
+    lat = np.clip(np.asarray(lat, dtype=float), -MAX_LAT, MAX_LAT)
+    lon = np.asarray(lon, dtype=float)
+    x = (lon + 180.0) / 360.0
+    sin = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return x, y
+
+
+def _cells(x, y, size):
+    ix = np.clip(np.floor(x * size), 0, size - 1).astype(np.int64)
+    iy = np.clip(np.floor(y * size), 0, size - 1).astype(np.int64)
+    return ix, iy
+
+
+def _expand_ranges(starts, ends):
+    """Concatenate ``arange(s, e)`` for every pair without a Python loop."""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+class _Level:
+    """Clusters for one zoom level, sorted by cell key."""
+
+    def __init__(self, size, ix, iy, count, lat_sum, lon_sum, price_sum):
+        keys = ix * size + iy
+        uniq, inverse = np.unique(keys, return_inverse=True)
+
+        def total(weights):
+            return np.bincount(inverse, weights=weights, minlength=len(uniq))
+
+        self.size = size
+        self.keys = uniq
+        self.ix = uniq // size
+        self.iy = uniq % size
+        self.count = total(count)
+        self.lat_sum = total(lat_sum)
+        self.lon_sum = total(lon_sum)
+        self.price_sum = total(price_sum)
+
+    def coarser(self):
+        """Aggregate this level's clusters into the next zoom out."""
+        return _Level(self.size // 2, self.ix // 2, self.iy // 2,
+                      self.count, self.lat_sum, self.lon_sum, self.price_sum)
+
+
+def _lookup(keys, size, x0, y0, x1, y1):
+    """Positions in ``keys`` whose cells fall inside the projected box."""
+    (ix0, ix1), (iy0, iy1) = _cells(np.array([x0, x1]), np.array([y0, y1]), size)
+    columns = np.arange(ix0, ix1 + 1, dtype=np.int64) * size
+    starts = np.searchsorted(keys, columns + iy0, side='left')
+    ends = np.searchsorted(keys, columns + iy1, side='right')
+    return _expand_ranges(starts, ends)
+
+
+def fit_zoom(x0, y0, x1, y1, zoom):
+    """Highest zoom up to ``zoom`` at which the box spans at most ``MAX_CLUSTERS`` cells."""
+    while zoom > 0:
+        size = 2 ** (zoom + CELL_BITS)
+        cells = (math.floor(x1 * size) - math.floor(x0 * size) + 1) * \
+            (math.floor(y1 * size) - math.floor(y0 * size) + 1)
+        if cells <= MAX_CLUSTERS:
+            break
+        zoom -= 1
+    return zoom
+
+
+class PropertyIndex:
+    """Viewport index over listing points with per-zoom clusters."""
+
+    def __init__(self, lat, lon, price, beds, ids=None):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.price = np.asarray(price, dtype=float)
+        self.beds = np.asarray(beds, dtype=float)
+        self.ids = np.arange(len(self.lat)) if ids is None else np.asarray(ids)
+
+        x, y = project(self.lat, self.lon)
+        size = 2 ** (POINT_GRID_ZOOM + CELL_BITS)
+        ix, iy = _cells(x, y, size)
+        keys = ix * size + iy
+        self._order = np.argsort(keys, kind='stable')
+        self._point_keys = keys[self._order]
+        self._point_size = size
+
+        shift = POINT_GRID_ZOOM - CLUSTER_MAX_ZOOM
+        level = _Level(size >> shift, ix >> shift, iy >> shift,
+                       np.ones(len(self.lat)), self.lat, self.lon, self.price)
+        levels = [level]
+        for _ in range(CLUSTER_MAX_ZOOM):
+            level = level.coarser()
+            levels.append(level)
+        self._levels = levels[::-1]
+
+    @classmethod
+    def from_frame(cls, data):
+        """Build an index from a cleaned listing frame (see listings.py)."""
+        from listings import PROPERTY_ID, PRICE, BEDS, LAT, LON
+        ids = data[PROPERTY_ID].to_numpy() if PROPERTY_ID in data else None
+        return cls(data[LAT], data[LON], data[PRICE], data[BEDS], ids)
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build an index from a memory-mapped cache (see listing_cache.py)."""
+        return cls(columns.lat, columns.lon, columns.price, columns.beds, columns.property_id)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def query(self, west, south, east, north, zoom):
+        """Clusters or points inside the bounding box at ``zoom``.
+
+        The response's ``zoom`` is the one used, lower than asked for when the
+        box is too large for it.
+        """
+        zoom = int(min(max(zoom, 0), MAX_ZOOM))
+        x0, y1 = (float(v) for v in project(south, west))
+        x1, y0 = (float(v) for v in project(north, east))
+        cluster_zoom = fit_zoom(x0, y0, x1, y1, min(zoom, CLUSTER_MAX_ZOOM))
+
+        # Points are only looked up for a box that zoom-13 clusters could cover
+        if zoom > CLUSTER_MAX_ZOOM and cluster_zoom == CLUSTER_MAX_ZOOM:
+            positions = _lookup(self._point_keys, self._point_size, x0, y0, x1, y1)
+            rows = self._order[positions]
+            inside = ((self.lat[rows] >= south) & (self.lat[rows] <= north)
+                      & (self.lon[rows] >= west) & (self.lon[rows] <= east))
+            rows = rows[inside]
+            if len(rows) <= MAX_POINTS:
+                return self._points(rows, zoom)
+
+        return self._clusters(self._levels[cluster_zoom], x0, y0, x1, y1, cluster_zoom)
+
+    def _points(self, rows, zoom):
+        ids = self.ids[rows]
+        if ids.dtype.kind == 'S':
+            ids = np.char.decode(ids, 'utf-8')
+        return {
+            'type': 'points',
+            'zoom': zoom,
+            'total': len(rows),
+            'points': [
+                {'id': i, 'lat': lat, 'lon': lon, 'price': price, 'beds': beds}
+                for i, lat, lon, price, beds in zip(
+                    ids.tolist(), self.lat[rows].tolist(),
+                    self.lon[rows].tolist(), self.price[rows].tolist(),
+                    self.beds[rows].tolist())
+            ],
+        }
+
+    def _clusters(self, level, x0, y0, x1, y1, zoom):
+        positions = _lookup(level.keys, level.size, x0, y0, x1, y1)
+        count = level.count[positions]
+        lat = np.round(level.lat_sum[positions] / count, 6)
+        lon = np.round(level.lon_sum[positions] / count, 6)
+        avg_price = np.round(level.price_sum[positions] / count, 2)
+        return {
+            'type': 'clusters',
+            'zoom': zoom,
+            'total': int(count.sum()),
+            'clusters': [
+                {'lat': la, 'lon': lo, 'count': int(c), 'avg_price': p}
+                for la, lo, c, p in zip(lat.tolist(), lon.tolist(),
+                                        count.tolist(), avg_price.tolist())
+            ],
+        }
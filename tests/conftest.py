@@ -0,0 +1,97 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import listings  # noqa: E402
+from listing_cache import open_listings  # noqa: E402
+
+ZIPCODES = ['07001', '07083', '07424', '07924', '08540']
+FIPS_CODES = ['34013', '34027', '34039']
+TYPES = ['single_family', 'condos', 'multi_family']
+
+
+def listing_frame(rows, seed=0, first_id=1_000_000):
+    """Raw listings in the scraper's column layout."""
+    rng = np.random.default_rng(seed)
+    reduced = np.where(rng.random(rows) < 0.3, np.round(rng.uniform(1_000, 50_000, rows), -2), np.nan)
+    return pd.DataFrame({
+        listings.PROPERTY_ID: [str(first_id + i) for i in range(rows)],
+        listings.ZIPCODE: rng.choice(ZIPCODES, rows),
+        listings.FIPS: rng.choice(FIPS_CODES, rows),
+        listings.TYPE: rng.choice(TYPES, rows),
+        listings.PRICE: np.round(rng.uniform(100_000, 1_500_000, rows), -3),
+        listings.BEDS: rng.integers(1, 6, rows).astype(float),
+        listings.BATHS: rng.choice(['1', '1.5', '2', '2.5', '3'], rows),
+        listings.SQFT: np.round(rng.uniform(600, 4_000, rows)),
+        listings.PRICE_REDUCED: reduced,
+        listings.LAT: rng.uniform(40.0, 41.0, rows),
+        listings.LON: rng.uniform(-75.0, -74.0, rows),
+        listings.PHOTO: [f"https://example.com/{i}.jpg" for i in range(rows)],
+        listings.ADDRESS: [f"{i} Main St" for i in range(rows)],
+    })
+
+
+def changed(frame, seed=1, remove=20, reprice=30, add=40):
+    """``frame`` with some listings removed, some repriced and some added."""
+    rng = np.random.default_rng(seed)
+    frame = frame.drop(index=rng.choice(frame.index, remove, replace=False))
+    repriced = rng.choice(frame.index, reprice, replace=False)
+    frame.loc[repriced, listings.PRICE] += 25_000
+    added = listing_frame(add, seed=seed + 100, first_id=2_000_000 + 1_000 * seed)
+    return pd.concat([frame, added], ignore_index=True)
+
+
+@pytest.fixture
+def build(tmp_path):
+    """Write a frame as a CSV and open its listing cache, one cache per build."""
+    builds = []
+
+    def build(frame):
+        directory = tmp_path / f"build{len(builds)}"
+        directory.mkdir()
+        frame.to_csv(directory / "listings.csv", index=False)
+        columns = open_listings(str(directory / "listings.csv"), str(directory / "cache"))
+        builds.append(columns)
+        return columns
+    return build
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The Flask app on a scratch SQLite database."""
+    directory = tmp_path_factory.mktemp("app")
+    os.environ['DATABASE_URL'] = f"sqlite:///{directory / 'users.db'}"
+    os.environ.setdefault('JOB_WORKER', 'off')
+    import main
+    main.app.config['TESTING'] = True
+    with main.app.app_context():
+        main.db.create_all()
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as ``tester``."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'tester'
+    return client
+
+
+@pytest.fixture
+def listings_csv(app, tmp_path, monkeypatch):
+    """Point the app at a listing CSV; returns a function that writes it."""
+    path = tmp_path / "listings.csv"
+    monkeypatch.setitem(app.config, 'LISTINGS_CSV', str(path))
+    monkeypatch.setitem(app.config, 'LISTING_CACHE_DIR', str(tmp_path / "listing_cache"))
+
+    def write(frame):
+        frame.to_csv(path, index=False)
+        return path
+    return write
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from affordability import PriceIndex, affordability, parse_profile
+from amortization import monthly_payment
+from conftest import listing_frame
+from credit import AFFORDABLE_DTI, score_applicant
+
+PROFILES = [
+    # (credit_score, salary, monthly_debt, down_payment, loan_term)
+    (780, 150_000, 1_000, 60_000, 30),
+    (700, 90_000, 2_000, 20_000, 15),
+    (700, 90_000, 3_000, 20_000, 15),  # approved, but debts already over the DTI budget
+    (640, 60_000, 800, 0, 30),
+    (640, 60_000, 2_500, 10_000, 30),
+    (500, 40_000, 200, 25_000, 30),
+]
+
+
+@pytest.mark.parametrize('score, salary, debt, down, term', PROFILES)
+def test_limits_follow_the_credit_rules(score, salary, debt, down, term):
+    expected = score_applicant(score, salary, debt, 0)
+    afford = affordability([score], [salary], [debt], [down], [term])
+    assert bool(afford['loan_approved'][0]) == expected['loan_approved']
+    assert afford['interest_rate'][0] == expected['interest_rate']
+
+    budget = salary / 12 * AFFORDABLE_DTI - debt
+    if expected['loan_approved'] and budget > 0:
+        # The largest loan's payment uses up the DTI budget, which the
+        # interest-free max_affordable_loan overstates
+        assert monthly_payment(afford['max_loan'][0], expected['interest_rate'], term * 12) == \
+            pytest.approx(budget)
+        assert afford['max_loan'][0] < expected['max_affordable_loan']
+        assert afford['max_price'][0] == pytest.approx(afford['max_loan'][0] + down)
+    else:
+        assert afford['max_loan'][0] == 0 and afford['max_price'][0] == down
+
+
+def profile(score, salary, debt, down, term):
+    return parse_profile({'credit_score': str(score), 'salary': str(salary), 'monthly_debt': str(debt),
+                          'down_payment': str(down), 'loan_term': str(term)})
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'zips': ['07424', '08540']},
+    {'kind': 'condos', 'min_beds': 2},
+    {'zips': ['07001'], 'kind': 'single_family', 'max_beds': 3, 'min_price': 200_000},
+])
+def test_search_matches_a_brute_force_filter(build, filters):
+    columns = build(listing_frame(2_000))
+    index = PriceIndex(columns)
+    price = np.asarray(columns.price, dtype=float)
+    beds = np.asarray(columns.beds, dtype=float)
+    zipcodes = np.array([z.decode() for z in columns.zipcode])
+    types = np.array([t.decode() for t in columns.type])
+    ids = np.array([pid.decode() for pid in columns.property_id])
+
+    profiles = [profile(*values) for values in PROFILES]
+    batch = index.search_many(profiles, limit=5, **filters)
+    for values, batched in zip(profiles, batch):
+        result = index.search(values, limit=len(ids), **filters)
+        keep = (price > 0) & (price >= filters.get('min_price', 0)) & \
+            (price <= result['profile']['max_price'] + 0.01)
+        if filters.get('zips'):
+            keep &= np.isin(zipcodes, filters['zips'])
+        if filters.get('kind'):
+            keep &= types == filters['kind']
+        if filters.get('min_beds') is not None:
+            keep &= beds >= filters['min_beds']
+        if filters.get('max_beds') is not None:
+            keep &= beds <= filters['max_beds']
+
+        found = [listing['id'] for listing in result['listings']]
+        assert sorted(found) == sorted(ids[keep])
+        assert result['total'] == batched['total'] == keep.sum()
+        prices = [listing['price'] for listing in result['listings']]
+        assert prices == sorted(prices, reverse=True)
+        assert [listing['id'] for listing in batched['listings']] == found[:5]
+
+
+def test_payments_are_for_the_loan_after_the_down_payment(build):
+    index = PriceIndex(build(listing_frame(300)))
+    result = index.search(profile(780, 250_000, 500, 100_000, 30), limit=20)
+    rate = result['profile']['interest_rate']
+    for listing in result['listings']:
+        loan = max(listing['price'] - 100_000, 0)
+        assert listing['loan_amount'] == pytest.approx(loan)
+        assert listing['monthly_payment'] == pytest.approx(monthly_payment(loan, rate, 360), abs=0.01)
+
+
+def test_api_validates_and_pages(client, listings_csv):
+    listings_csv(listing_frame(200))
+    query = 'credit_score=780&salary=150000&monthly_debt=1000&down_payment=60000'
+    first = client.get(f"/api/affordable?{query}&limit=10").get_json()
+    second = client.get(f"/api/affordable?{query}&limit=10&offset=10").get_json()
+    assert len(first['listings']) == 10 and first['total'] == second['total']
+    assert first['listings'][-1]['price'] >= second['listings'][0]['price']
+
+    assert client.get("/api/affordable?credit_score=abc&salary=1").status_code == 400
+    assert client.get(f"/api/affordable?{query}&limit=5000").status_code == 400
+    batch = client.post('/api/affordable/batch', json={'profiles': [
+        {'credit_score': 780, 'salary': 150000, 'monthly_debt': 1000, 'down_payment': 60000},
+        {'salary': 'lots'}]}).get_json()
+    assert batch['results'][0]['total'] == first['total']
+    assert 'error' in batch['results'][1]
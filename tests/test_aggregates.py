@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from aggregates import LEVELS, MarketAggregates
+from conftest import changed, listing_frame
+
+
+def flatten(value, prefix=''):
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            items.update(flatten(item, f"{prefix}{key}."))
+        return items
+    return {prefix: value}
+
+
+def assert_same_areas(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        a, e = flatten(a), flatten(e)
+        assert a.keys() == e.keys()
+        for key in e:
+            if isinstance(e[key], float) and not math.isnan(e[key]):
+                assert a[key] == pytest.approx(e[key], rel=1e-9, abs=1e-6), key
+            else:
+                assert a[key] == e[key], key
+
+
+def test_refresh_matches_full_build(build):
+    first = listing_frame(300)
+    old, new = build(first), build(changed(first))
+
+    aggregates = MarketAggregates.from_columns(old)
+    added, removed = aggregates.refresh(new)
+    assert (added, removed) == (70, 50)  # 30 repriced count as removed and added
+
+    rebuilt = MarketAggregates.from_columns(new)
+    for level in LEVELS:
+        assert_same_areas(aggregates.areas(level), rebuilt.areas(level))
+
+
+def test_refresh_twice_matches_full_build(build):
+    first = listing_frame(300)
+    second = changed(first, seed=1)
+    third = changed(second, seed=2)
+    aggregates = MarketAggregates.from_columns(build(first))
+    aggregates.refresh(build(second))
+    latest = build(third)
+    aggregates.refresh(latest)
+
+    rebuilt = MarketAggregates.from_columns(latest)
+    for level in LEVELS:
+        assert_same_areas(aggregates.areas(level), rebuilt.areas(level))
+
+
+def test_refresh_drops_areas_that_lost_every_listing(build):
+    first = listing_frame(200)
+    zipcode = first['zipcode'].iloc[0]
+    aggregates = MarketAggregates.from_columns(build(first))
+    aggregates.refresh(build(first[first['zipcode'] != zipcode]))
+    assert aggregates.areas('zip', zipcode) == []
+
+
+def test_save_and_load_round_trip(build, tmp_path):
+    columns = build(listing_frame(200))
+    aggregates = MarketAggregates.from_columns(columns)
+    path = tmp_path / "market.json"
+    aggregates.save(path)
+
+    loaded = MarketAggregates.load(path, columns)
+    for level in LEVELS:
+        assert_same_areas(loaded.areas(level), aggregates.areas(level))
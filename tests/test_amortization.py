@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from amortization import annuity_factor, monthly_payment, schedule, sensitivity_grid
+
+
+def loop_schedule(principal, annual_rate, term_months):
+    """Month-by-month reference schedule."""
+    rate = annual_rate / 100 / 12
+    payment = principal * annuity_factor(annual_rate, term_months)
+    balance, rows = principal, []
+    for _ in range(term_months):
+        interest = balance * rate
+        balance = balance + interest - payment
+        rows.append((interest, payment - interest, max(balance, 0.0)))
+    return payment, np.array(rows)
+
+
+def test_schedules_match_a_monthly_loop():
+    principal = np.array([250_000.0, 90_000.0, 600_000.0])
+    rates = np.array([6.5, 0.0, 3.25])
+    terms = np.array([360, 120, 180])
+    result = schedule(principal, rates, terms, down_payment=[50_000, 0, 100_000])
+
+    for i in range(3):
+        payment, rows = loop_schedule(principal[i], rates[i], terms[i])
+        n = terms[i]
+        assert np.allclose(result['payment'][i, :n], payment)
+        assert np.allclose(result['interest'][i, :n], rows[:, 0], atol=1e-6)
+        assert np.allclose(result['principal'][i, :n], rows[:, 1], atol=1e-6)
+        assert np.allclose(result['balance'][i, :n], rows[:, 2], atol=1e-4)
+        # Past the term nothing is paid and equity holds
+        assert not result['payment'][i, n:].any()
+        assert np.allclose(result['equity'][i, n:], result['equity'][i, n - 1])
+    assert result['equity'][0, -1] == pytest.approx(300_000)
+
+
+def test_sensitivity_grid_matches_monthly_payment():
+    amounts, rates, terms = [100_000, 350_000], [0.0, 4.5, 7.25], [180, 360]
+    grid = sensitivity_grid(amounts, rates, terms)
+    assert grid.shape == (2, 3, 2)
+    for i, amount in enumerate(amounts):
+        for j, rate in enumerate(rates):
+            for k, term in enumerate(terms):
+                assert grid[i, j, k] == pytest.approx(monthly_payment(amount, rate, term))
+
+
+def test_monthly_payment_broadcasts():
+    payments = monthly_payment(np.array([100_000, 200_000]), np.array([5.0, 5.0]), 360)
+    assert payments[1] == pytest.approx(2 * payments[0])
+    assert monthly_payment(120_000, 0, 120) == pytest.approx(1_000)
@@ -0,0 +1,11 @@
+def test_simulate_reports_which_assumption_is_invalid(client):
+    form = {'category': 'annual_growth', 'mode': 'simulate', 'rent_growth': '3', 'appreciation': '3',
+            'other_cost': '0', 'property_value': '300000', 'monthly_rent': '2000'}
+    page = client.post('/calculate', data=dict(form, years='80')).get_data(as_text=True)
+    assert 'years must be between 1 and 50' in page
+
+    page = client.post('/calculate', data=dict(form, paths='lots')).get_data(as_text=True)
+    assert 'paths must be a number' in page
+
+    page = client.post('/calculate', data=dict(form, years='2', paths='500')).get_data(as_text=True)
+    assert 'Year 2' in page
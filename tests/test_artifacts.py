@@ -0,0 +1,51 @@
+import gzip
+import json
+import os
+
+from flask import Flask
+
+from artifacts import StaticArtifact, write_variants
+
+flask_app = Flask(__name__)
+
+
+def get(artifact, **headers):
+    with flask_app.test_request_context(headers=headers) as context:
+        return artifact.response(context.request)
+
+
+def test_precompressed_variant_and_revalidation(tmp_path):
+    page = tmp_path / 'map.html'
+    page.write_bytes(b'<html>' + b'marker ' * 1000 + b'</html>')
+    manifest = write_variants(str(page))
+    assert json.loads((tmp_path / 'map.html.json').read_text()) == manifest
+    assert manifest['variants']['gzip'] == os.path.getsize(str(page) + '.gz')
+
+    artifact = StaticArtifact(str(page))
+    plain = get(artifact)
+    assert plain.status_code == 200 and 'Content-Encoding' not in plain.headers
+    assert plain.get_data() == page.read_bytes()
+
+    zipped = get(artifact, **{'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert zipped.get_data() == (tmp_path / 'map.html.gz').read_bytes()
+    assert zipped.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+    # Either tag revalidates, whatever encoding is asked for now
+    for etag in (plain.headers['ETag'], zipped.headers['ETag']):
+        response = get(artifact, **{'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+        assert response.status_code == 304 and response.get_data() == b''
+    assert get(artifact, **{'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_stale_variants_are_rebuilt_for_the_new_page(tmp_path):
+    page = tmp_path / 'map.html'
+    page.write_bytes(b'<html>old</html>')
+    write_variants(str(page))
+    artifact = StaticArtifact(str(page))
+    old_etag = get(artifact).headers['ETag']
+
+    page.write_bytes(b'<html>new page</html>')
+    response = get(artifact, **{'Accept-Encoding': 'gzip'})
+    assert gzip.decompress(response.get_data()) == b'<html>new page</html>'
+    assert get(artifact, **{'If-None-Match': old_etag}).status_code == 200
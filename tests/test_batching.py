@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from batching import WriteBatcher, WriteFailed
+
+
+class FlakyTable:
+    """Records writes; fails the first ``failures`` calls and any batch with a bad row."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.rows = []
+        self.calls = []
+
+    def __call__(self, table, rows):
+        self.calls.append((time.monotonic(), len(rows)))
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        if any(row.get('bad') for row in rows):
+            raise ValueError("bad row")
+        self.rows.extend(rows)
+
+
+def test_rows_are_written_in_one_batch():
+    table = FlakyTable()
+    batcher = WriteBatcher(table, max_delay=0.05)
+    futures = [batcher.add('t', {'n': i}) for i in range(20)]
+    assert all(future.result(timeout=2) for future in futures)
+    assert [n for _, n in table.calls] == [20]
+    assert batcher.stats()['written'] == 20
+
+
+def test_bad_row_is_dropped_alone():
+    table = FlakyTable()
+    batcher = WriteBatcher(table, max_delay=0.05, retry_delay=0.01)
+    good = [batcher.add('t', {'n': i}) for i in range(5)]
+    bad = batcher.add('t', {'n': 99, 'bad': True})
+
+    with pytest.raises(WriteFailed):
+        bad.result(timeout=2)
+    assert all(future.result(timeout=2) for future in good)
+    assert sorted(row['n'] for row in table.rows) == list(range(5))
+    stats = batcher.stats()
+    assert (stats['written'], stats['dropped'], stats['pending']) == (5, 1, 0)
+
+
+def test_retries_back_off():
+    table = FlakyTable(failures=2)
+    batcher = WriteBatcher(table, max_delay=0.01, max_attempts=3, retry_delay=0.1)
+    assert batcher.add('t', {'n': 1}).result(timeout=5)
+    (first, _), (second, _), (third, _) = table.calls
+    assert second - first >= 0.1
+    assert third - second >= 0.2
+    assert batcher.stats()['retried'] == 2
+
+
+def test_flush_leaves_retries_that_are_not_due():
+    table = FlakyTable(failures=1)
+    batcher = WriteBatcher(table, max_delay=60, retry_delay=0.5)
+    future = batcher.add('t', {'n': 1})
+    batcher.flush()
+    assert batcher.flush() == 0 and len(table.calls) == 1
+    assert batcher.stats()['pending'] == 1 and not future.done()
+
+    # drain (run at exit) waits the backoff out
+    batcher.drain()
+    assert future.result(timeout=0) and batcher.stats()['pending'] == 0
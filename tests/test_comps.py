@@ -0,0 +1,79 @@
+import pytest
+
+from comps import CompsIndex
+from conftest import changed, listing_frame
+
+
+def comp_ids(index, **query):
+    result = index.comps(**query)
+    return [(comp['property_id'], comp['distance_km']) for comp in result['comps']], result['summary']
+
+
+def assert_same_comps(refreshed, rebuilt, columns):
+    for row in range(0, len(columns), 7):
+        property_id = columns.property_id[row].decode()
+        assert comp_ids(refreshed, property_id=property_id) == comp_ids(rebuilt, property_id=property_id)
+    for lat, lon in [(40.2, -74.8), (40.5, -74.5), (40.9, -74.1)]:
+        for kind in (None, 'condos'):
+            assert comp_ids(refreshed, lat=lat, lon=lon, kind=kind, k=15) == \
+                comp_ids(rebuilt, lat=lat, lon=lon, kind=kind, k=15)
+
+
+def test_refresh_with_delta_matches_rebuild(build):
+    first = listing_frame(400)
+    old, new = build(first), build(changed(first))
+
+    index = CompsIndex(old)
+    added, removed = index.refresh(new)
+    assert (added, removed) == (70, 50)
+    assert index.rebuilds == 1 and index.delta_rows == 70
+    assert len(index) == len(new)
+
+    assert_same_comps(index, CompsIndex(new), new)
+
+
+def test_refresh_twice_matches_rebuild(build):
+    first = listing_frame(400)
+    second = changed(first, seed=1)
+    third = changed(second, seed=2)
+    index = CompsIndex(build(first))
+    index.refresh(build(second))
+    latest = build(third)
+    index.refresh(latest)
+    assert index.rebuilds == 1
+
+    assert_same_comps(index, CompsIndex(latest), latest)
+
+
+def test_removed_listings_are_not_found(build):
+    first = listing_frame(100)
+    index = CompsIndex(build(first))
+    gone = first['property_id'].iloc[0]
+    index.refresh(build(first.iloc[1:]))
+    assert index.comps(property_id=gone) is None
+    assert all(comp['property_id'] != gone
+               for comp in index.comps(lat=40.5, lon=-74.5, k=100)['comps'])
+
+
+@pytest.mark.parametrize('beds_range', [0, 1])
+def test_comps_respect_filters(build, beds_range):
+    columns = build(listing_frame(300))
+    index = CompsIndex(columns)
+    subject = columns.property_id[0].decode()
+    result = index.comps(property_id=subject, beds_range=beds_range)
+    assert result['comps'] and all(comp['property_id'] != subject for comp in result['comps'])
+    for comp in result['comps']:
+        assert comp['type'] == result['subject']['type']
+        assert abs(comp['beds'] - result['subject']['beds']) <= beds_range
+
+
+def test_batch_summaries_leave_the_live_snapshot_alone(build):
+    first = listing_frame(300)
+    index = CompsIndex(build(first))
+    new = build(changed(first))
+    index.refresh(new)
+    snapshot = index._snapshot
+
+    summaries = index.batch_summaries()
+    assert index._snapshot is snapshot and index.delta_rows == 70
+    assert sorted(summaries['ids']) == sorted(new.property_id[i].decode() for i in range(len(new)))
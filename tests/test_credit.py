@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from credit import (FIELDS, generate_corpus, parse_applicant, parse_applicants, score_applicant,
+                    score_applicants, score_file)
+
+
+def test_scored_file_matches_score_applicant(tmp_path):
+    # The corpus starts with tier and DTI boundaries and invalid inputs
+    path = tmp_path / "applicants.csv"
+    generate_corpus(path, 5_000, seed=3)
+    rows, errors, mismatches, _ = score_file(str(path), chunk_rows=1_000, verify=True)
+    assert rows == 5_000
+    assert errors > 0
+    assert mismatches == 0
+
+
+@pytest.mark.parametrize('form', [
+    {'credit_score': '740', 'salary': '120000', 'monthly_debt': '3600', 'loan_amount': '300000'},
+    {'credit_score': '739', 'salary': '120000', 'monthly_debt': '4300', 'loan_amount': '300000'},
+    {'credit_score': '580', 'salary': '60000', 'monthly_debt': '2150', 'loan_amount': '150000'},
+    {'credit_score': '300', 'salary': '0', 'monthly_debt': '500', 'loan_amount': '100000'},
+    {'credit_score': '700', 'salary': '1e5', 'monthly_debt': '2_000', 'loan_amount': '+250000'},
+])
+def test_vectorized_scoring_matches_one_applicant(form):
+    expected = score_applicant(*parse_applicant(form))
+    values, codes = parse_applicants({field: [form[field]] for field in FIELDS}, 1)
+    assert codes.tolist() == [0]
+    scored = score_applicants(*(values[field] for field in FIELDS))
+
+    assert bool(scored['loan_approved'][0]) == expected['loan_approved']
+    assert float(scored['interest_rate'][0]) == expected['interest_rate']
+    assert float(scored['max_affordable_loan'][0]) == expected['max_affordable_loan']
+    assert float(scored['monthly_payment'][0]) == expected['monthly_payment']
+    if scored['has_income'][0]:
+        assert float(scored['dti'][0]) == expected['dti']
+
+
+@pytest.mark.parametrize('form', [
+    {'credit_score': '851', 'salary': '50000', 'monthly_debt': '100', 'loan_amount': '1000'},
+    {'credit_score': '700', 'salary': 'abc', 'monthly_debt': '100', 'loan_amount': '1000'},
+    {'credit_score': '700', 'salary': '-1', 'monthly_debt': '100', 'loan_amount': '1000'},
+    {'credit_score': '700.5', 'salary': '50000', 'monthly_debt': '100', 'loan_amount': '1000'},
+])
+def test_vectorized_parsing_rejects_what_the_form_rejects(form):
+    with pytest.raises(ValueError):
+        parse_applicant(form)
+    _, codes = parse_applicants({field: [form[field]] for field in FIELDS}, 1)
+    assert np.count_nonzero(codes) == 1
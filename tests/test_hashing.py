@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from hashing import HashPool, PoolBusy
+
+
+def fill(pool):
+    """Occupy every worker of a pool with no queue until the returned event is set."""
+    release = threading.Event()
+    started = threading.Barrier(pool.workers + 1)
+
+    def hold():
+        started.wait()
+        release.wait(5)
+
+    threads = [threading.Thread(target=pool._run, args=('verify', hold)) for _ in range(pool.workers)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    return release, threads
+
+
+def test_full_pool_rejects_straight_away():
+    pool = HashPool(workers=1, queue_depth=0, iterations=1_000)
+    release, threads = fill(pool)
+    try:
+        with pytest.raises(PoolBusy):
+            pool.generate('secret')
+        assert pool.stats()['rejected'] == 1
+        assert pool.stats()['in_flight'] == 1
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert pool.verify(pool.generate('secret'), 'secret') == (True, None)
+    assert pool.stats()['in_flight'] == 0
+
+
+def test_verify_and_upgrade_work_factor():
+    old = HashPool(workers=1, queue_depth=1, iterations=1_000)
+    pool = HashPool(workers=1, queue_depth=1, iterations=2_000)
+    pwhash = old.generate('secret')
+
+    assert pool.verify(pwhash, 'wrong') == (False, None)
+    valid, upgraded = pool.verify(pwhash, 'secret')
+    assert valid and upgraded.startswith('pbkdf2:sha256:2000$')
+    assert pool.verify(upgraded, 'secret') == (True, None)
+    assert not pool.needs_rehash(upgraded)
+    assert pool.stats()['upgraded'] == 1
+    assert pool.stats()['verify']['count'] == 3
+
+
+def test_register_answers_503_when_pool_is_full(app, monkeypatch):
+    import main
+
+    pool = HashPool(workers=1, queue_depth=0, iterations=1_000)
+    monkeypatch.setattr(main, '_hash_pool', pool)
+    release, threads = fill(pool)
+    try:
+        response = app.test_client().post('/register', data={
+            'username': 'busy', 'password': 'pw', 'confirm-password': 'pw'})
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    with app.app_context():
+        assert main.User.query.filter_by(username='busy').first() is None
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from jobs import JobQueue, ingest_args, run_ingest, run_job
+
+
+def test_identical_queued_jobs_are_coalesced(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    first, created = queue.enqueue('listing_cache', {'csv': 'a.csv'})
+    again, joined = queue.enqueue('listing_cache', {'csv': 'a.csv'})
+    other, _ = queue.enqueue('listing_cache', {'csv': 'b.csv'})
+    assert created and not joined
+    assert again['id'] == first['id'] and again['requests'] == 2
+    assert other['id'] != first['id']
+
+
+def test_one_more_job_queues_behind_a_running_one(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queued, _ = queue.enqueue('listing_cache', {'csv': 'a.csv'})
+    running = queue.claim()
+    assert running['id'] == queued['id'] and running['state'] == 'running'
+
+    behind, created = queue.enqueue('listing_cache', {'csv': 'a.csv'})
+    assert created and behind['id'] != running['id']
+    # The queued copy waits until the running one finishes
+    assert queue.claim() is None
+    queue.finish(running['id'], result={})
+    assert queue.claim()['id'] == behind['id']
+
+
+def write_export(path, ids):
+    pd.DataFrame({'property_id': ids, 'list_price': ['100'] * len(ids)}).to_csv(path, index=False)
+
+
+def test_ingest_moves_merged_exports_aside(tmp_path):
+    exports = tmp_path / "exports"
+    exports.mkdir()
+    write_export(exports / "a.csv", ['1', '2'])
+    write_export(exports / "b.csv", ['3'])
+    args = ingest_args(tmp_path / "store", [exports / "a.csv", exports / "b.csv"], tmp_path / "merged.csv",
+                       exports / "processed")
+
+    result = run_ingest(args, lambda fraction, message=None: None)
+    assert result['rows'] == 3
+    assert sorted(p.name for p in exports.glob('*.csv')) == []
+    assert sorted(p.name for p in (exports / "processed").glob('*.csv')) == ['a.csv', 'b.csv']
+
+    # A job queued with the same exports finds them gone and only republishes
+    assert run_ingest(args, lambda fraction, message=None: None)['skipped'] == args['exports']
+
+    write_export(exports / "a.csv", ['4'])
+    result = run_ingest(ingest_args(tmp_path / "store", [exports / "a.csv"], tmp_path / "merged.csv",
+                                    exports / "processed"), lambda fraction, message=None: None)
+    assert result['rows'] == 4
+    assert result['merged'][0]['moved_to'].endswith('a.1.csv')
+
+
+def test_failed_job_records_the_error(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.enqueue('ingest', ingest_args(tmp_path / "store", [tmp_path / "x.csv"], tmp_path / "out.csv"))
+    job = queue.claim()
+    (tmp_path / "x.csv").write_text("list_price\n100\n")  # no property_id column
+    run_job(queue, job)
+    job = queue.get(job['id'])
+    assert job['state'] == 'failed' and job['error'].startswith('KeyError')
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+
+import listings
+from conftest import listing_frame
+from listing_cache import diff_rows, open_listings
+
+
+def test_columns_match_cleaned_listings(build, tmp_path):
+    frame = listing_frame(200)
+    columns = build(frame)
+    assert len(columns) == 200
+    assert np.array_equal(np.asarray(columns.price), frame[listings.PRICE].to_numpy())
+    assert columns.property_id[5].decode() == frame[listings.PROPERTY_ID].iloc[5]
+    assert columns.address[5] == frame[listings.ADDRESS].iloc[5]
+
+
+def test_find_by_property_id(build):
+    frame = listing_frame(50)
+    columns = build(frame)
+    assert columns.find(frame[listings.PROPERTY_ID].iloc[17]) == 17
+    assert columns.find('missing') is None
+
+
+def test_fresh_cache_is_reused_and_stale_cache_rebuilt(tmp_path):
+    csv, cache_dir = str(tmp_path / "listings.csv"), str(tmp_path / "cache")
+    listing_frame(30).to_csv(csv, index=False)
+    first = open_listings(csv, cache_dir)
+    assert open_listings(csv, cache_dir).manifest['built_at'] == first.manifest['built_at']
+
+    listing_frame(40, seed=5).to_csv(csv, index=False)
+    os.utime(csv, ns=(first.manifest['mtime_ns'] + 10**9,) * 2)
+    rebuilt = open_listings(csv, cache_dir)
+    assert rebuilt.manifest['version'] != first.manifest['version']
+    assert len(rebuilt) == 40
+    # Columns mapped from the previous build stay readable
+    assert len(np.asarray(first.price)) == 30
+
+
+def test_diff_rows():
+    old = np.array([1, 2, 3, 4], dtype=np.uint64)
+    new = np.array([3, 5, 1, 6], dtype=np.uint64)
+    removed, added = diff_rows(old, new)
+    assert removed.tolist() == [1, 3]
+    assert added.tolist() == [1, 3]
+
+
+def test_diff_rows_of_identical_builds_is_empty():
+    hashes = np.arange(100, dtype=np.uint64)
+    removed, added = diff_rows(hashes, hashes[::-1])
+    assert len(removed) == len(added) == 0
+
+
+def test_row_hash_changes_only_for_changed_rows(build):
+    frame = listing_frame(100)
+    old = build(frame)
+    frame.loc[[3, 40], listings.PRICE] += 1_000
+    removed, added = diff_rows(old.row_hash, build(frame).row_hash)
+    assert removed.tolist() == [3, 40] and added.tolist() == [3, 40]
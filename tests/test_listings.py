@@ -0,0 +1,42 @@
+import pandas as pd
+
+import listings
+from conftest import listing_frame
+from listings import IngestStats, clean_zipcodes, iter_listing_chunks, load_listings
+
+
+def test_zipcodes_are_reduced_to_five_digits():
+    data = pd.DataFrame({listings.ZIPCODE: ['07424', '7424', '7424.0', '07424-1234', '074241234', ' 08540 ',
+                                            None, '', 'N/A', '123456', '7424.5']})
+    stats = IngestStats()
+    cleaned = clean_zipcodes(data, stats)
+    assert cleaned[listings.ZIPCODE].tolist() == ['07424'] * 5 + ['08540']
+    assert stats.bad_zipcodes == 3
+
+
+def test_bad_numbers_become_nan_without_failing_the_read(tmp_path):
+    frame = listing_frame(20)
+    frame = frame.astype({listings.PRICE: object, listings.SQFT: object})
+    frame.loc[3, listings.PRICE] = 'Contact agent'
+    frame.loc[5, listings.SQFT] = '1,200+'
+    path = tmp_path / "listings.csv"
+    frame.to_csv(path, index=False)
+
+    data = load_listings(path)
+    assert len(data) == 19 and frame[listings.PROPERTY_ID].iloc[3] not in data[listings.PROPERTY_ID].values
+    assert data[listings.PRICE].dtype == 'float64' and data[listings.SQFT].dtype == 'float64'
+    assert data[listings.TYPE].dtype == 'category'
+
+
+def test_chunked_reads_match_one_read(tmp_path):
+    frame = listing_frame(250)
+    frame.loc[::25, listings.ZIPCODE] = 'unknown'
+    path = tmp_path / "listings.csv"
+    frame.to_csv(path, index=False)
+
+    stats = IngestStats()
+    chunks = list(iter_listing_chunks(path, chunk_rows=40, stats=stats))
+    assert stats.chunks == 7 and stats.rows_read == 250 and stats.bad_zipcodes == 10
+    whole = load_listings(path, chunk_rows=1_000)
+    pd.testing.assert_frame_equal(load_listings(path, chunk_rows=40), whole)
+    assert sum(len(chunk) for chunk in chunks) == len(whole) == stats.rows_kept
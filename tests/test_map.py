@@ -0,0 +1,121 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip('folium')
+
+import listings  # noqa: E402
+import map as map_build  # noqa: E402
+from conftest import listing_frame  # noqa: E402
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {'csv': tmp_path / "listings.csv", 'page': tmp_path / "map.html", 'cache': tmp_path / "cache",
+            'shards': tmp_path / "shards"}
+
+
+def build_page(paths, force=False):
+    return map_build.build_map(str(paths['csv']), str(paths['page']), str(paths['cache']), force=force)
+
+
+def test_single_page_build_is_skipped_until_a_marker_changes(paths):
+    frame = listing_frame(150)
+    frame.to_csv(paths['csv'], index=False)
+    first = build_page(paths)
+    assert not first['skipped'] and first['markers'] == 150
+    page = paths['page'].read_text()
+    assert frame[listings.PROPERTY_ID].iloc[0] in page
+
+    assert build_page(paths)['skipped']
+    assert not build_page(paths, force=True)['skipped']
+
+    frame.loc[7, listings.PRICE] += 10_000
+    frame.to_csv(paths['csv'], index=False)
+    assert not build_page(paths)['skipped']
+
+
+def test_single_page_build_reruns_after_a_sharded_build(paths):
+    listing_frame(50).to_csv(paths['csv'], index=False)
+    build_page(paths)
+    map_build.build_sharded_map(str(paths['csv']), str(paths['page']), str(paths['shards']),
+                                str(paths['cache']), workers=1)
+    assert not build_page(paths)['skipped']
+
+
+def build_shards(paths, **kwargs):
+    return map_build.build_sharded_map(str(paths['csv']), str(paths['page']), str(paths['shards']),
+                                       str(paths['cache']), workers=1, **kwargs)
+
+
+def test_sharded_build_rerenders_only_changed_shards(paths):
+    frame = listing_frame(300)
+    frame.to_csv(paths['csv'], index=False)
+    first = build_shards(paths)
+    assert first['shards'] == first['shards_rendered'] == 3
+    assert first['regenerated'] == 300 and first['reused'] == 0
+    assert build_shards(paths)['shards_rendered'] == 0
+
+    # A small change to a mid-priced listing leaves the color scale alone
+    ppb = frame[listings.PRICE] / frame[listings.BEDS]
+    row = (ppb - ppb.median()).abs().idxmin()
+    county = frame.loc[row, listings.FIPS]
+    others = {path.name: path.read_bytes() for path in paths['shards'].glob('*.js')
+              if path.stem != county}
+    frame.loc[row, listings.PRICE] += 1_000
+    frame.to_csv(paths['csv'], index=False)
+
+    second = build_shards(paths)
+    in_county = int((frame[listings.FIPS] == county).sum())
+    assert second['shards_rendered'] == 1
+    assert second['regenerated'] == in_county and second['reused'] == 300 - in_county
+    assert {name: (paths['shards'] / name).read_bytes() for name in others} == others
+
+
+def test_emptied_shard_is_removed(paths):
+    frame = listing_frame(90)
+    frame.to_csv(paths['csv'], index=False)
+    build_shards(paths)
+    county = frame[listings.FIPS].iloc[0]
+    frame[frame[listings.FIPS] != county].to_csv(paths['csv'], index=False)
+
+    assert build_shards(paths)['shards'] == 2
+    assert not (paths['shards'] / f"{county}.js").exists()
+    assert not (paths['shards'] / f"{county}.js.gz").exists()
+
+
+def test_marker_payload_decodes_to_the_listings():
+    data = listings.clean_listings(listing_frame(40))
+    _, colors = map_build.marker_colors(data)
+    data = data.loc[colors.index]
+    payload = json.loads(map_build.marker_payload(data, colors))
+
+    scale = payload['scale']
+    lat = (np.array(payload['lat']) + payload['lat0']) / scale
+    lon = (np.array(payload['lon']) + payload['lon0']) / scale
+    assert np.allclose(lat, data[listings.LAT].astype(float), atol=1 / scale)
+    assert np.allclose(lon, data[listings.LON].astype(float), atol=1 / scale)
+    assert [payload['palette'][i] for i in payload['color']] == colors.tolist()
+    assert payload['price'] == data[listings.PRICE].astype(float).round().astype(int).tolist()
+    assert payload['beds'] == data[listings.BEDS].astype(float).astype(int).tolist()
+    assert payload['id'] == data[listings.PROPERTY_ID].astype(int).tolist()
+
+
+def test_popup_endpoint_matches_the_listing_cache(app, client, listings_csv):
+    from listing_cache import open_listings
+    from markers import listing_popup_html
+
+    frame = listing_frame(30)
+    path = listings_csv(frame)
+    property_id = frame[listings.PROPERTY_ID].iloc[5]
+
+    response = client.get(f"/api/listings/{property_id}/popup")
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == app.config['POPUP_CACHE_CONTROL']
+    columns = open_listings(str(path), app.config['LISTING_CACHE_DIR'])
+    assert response.get_data(as_text=True) == listing_popup_html(columns, columns.find(property_id))
+    assert frame.loc[5, listings.ADDRESS] in response.get_data(as_text=True)
+
+    assert client.get("/api/listings/999/popup").status_code == 404
+    assert app.test_client().get(f"/api/listings/{property_id}/popup").status_code == 401
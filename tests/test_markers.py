@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip('matplotlib')
+
+from markers import build_markers, build_markers_iterrows, synthetic_listings  # noqa: E402
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_columnar_markers_match_the_iterrows_loop(seed):
+    data = synthetic_listings(2_000, seed=seed)
+    expected = build_markers_iterrows(data)
+    markers = build_markers(data)
+
+    assert len(markers) == len(expected) < len(data)  # zero-bed listings have no marker
+    actual = markers[['lat', 'lon', 'popup', 'color', 'zipcode']].to_dict('records')
+    assert actual == expected
@@ -0,0 +1,62 @@
+import pandas as pd
+
+import merge
+from merge import MergeStore, normalize_export
+
+
+def export(rows):
+    return pd.DataFrame(rows, dtype=str)
+
+
+def stored(store):
+    return {row['property_id']: row for frame in store for row in frame.fillna('').to_dict('records')}
+
+
+def test_upsert_updates_only_the_columns_an_export_carries(tmp_path):
+    store = MergeStore(tmp_path)
+    store.apply(export([{'property_id': '1', 'list_price': '100', 'status': 'for_sale'},
+                        {'property_id': '2', 'list_price': '200', 'status': 'for_sale'}]))
+    result = store.apply(export([{'property_id': '2', 'list_price': '250'},
+                                 {'property_id': '3', 'list_price': '300'}]))
+    assert (result.inserted, result.updated) == (['3'], ['2'])
+
+    rows = stored(MergeStore(tmp_path))
+    assert rows['2']['list_price'] == '250' and rows['2']['status'] == 'for_sale'
+    assert rows['3']['status'] == ''
+    assert MergeStore(tmp_path).rows == 3
+
+
+def test_delete_removes_rows_and_ignores_unknown_ids(tmp_path):
+    store = MergeStore(tmp_path)
+    store.apply(export([{'property_id': str(i), 'list_price': '1'} for i in range(5)]))
+    result = store.apply(pd.DataFrame(), deletes=['1', '3', 'missing'])
+    assert sorted(result.deleted) == ['1', '3']
+    assert sorted(stored(store)) == ['0', '2', '4']
+    assert store.rows == 3
+
+
+def test_whole_numbers_are_trimmed_only_in_numeric_columns():
+    data = normalize_export(export([{'property_id': '1', 'list_price': '250000.0',
+                                     'description/name': '12.0', 'flags/is_pending': 'FALSE',
+                                     'location/address/postal_code': '7424'}]))
+    row = data.loc['1']
+    assert row['list_price'] == '250000'
+    assert row['description/name'] == '12.0'
+    assert row['flags/is_pending'] == 'false'
+    assert row['location/address/postal_code'] == '07424'
+
+
+def test_bucket_count_grows_with_the_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(merge, 'BUCKET_ROWS', 10)
+    store = MergeStore(tmp_path, buckets=2)
+    ids = [str(i) for i in range(200)]
+    for start in range(0, 200, 50):
+        store.apply(export([{'property_id': pid, 'list_price': pid} for pid in ids[start:start + 50]]))
+    assert store.buckets == 32 and store.rows == 200
+
+    rows = stored(MergeStore(tmp_path))
+    assert sorted(rows) == sorted(ids)
+    assert all(row['list_price'] == pid for pid, row in rows.items())
+
+    # One changed id rewrites one bucket
+    assert store.apply(export([{'property_id': '7', 'list_price': '1'}])).buckets_touched == 1
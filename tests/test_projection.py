@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import projection
+from projection import parse_assumptions, parse_properties, project
+
+PORTFOLIO = [
+    {'property_value': '300000', 'monthly_rent': '2200', 'annual_expenses': '6000', 'monthly_debt_service': '1400'},
+    {'property_value': '450000', 'monthly_rent': '3100', 'annual_expenses': '9000', 'monthly_debt_service': '0'},
+]
+
+
+def bands(result):
+    return {key: value for key, value in result.items() if key not in ('elapsed_ms', 'workers')}
+
+
+def test_same_seed_gives_the_same_bands_with_any_worker_count(monkeypatch):
+    monkeypatch.setattr(projection, 'CHUNK_CELLS', 1_000)  # several chunks
+    properties = parse_properties(PORTFOLIO)
+    assumptions = parse_assumptions({'years': '5', 'paths': '3000', 'seed': '42'})
+
+    serial = project(properties, assumptions, workers=1)
+    assert serial['chunks'] == 6
+    assert bands(project(properties, assumptions, workers=2)) == bands(serial)
+    assert bands(project(properties, dict(assumptions, seed=43), workers=1)) != bands(serial)
+
+
+def test_bands_are_ordered():
+    result = project(parse_properties(PORTFOLIO), parse_assumptions({'years': '3', 'paths': '2000'}), workers=1)
+    for metric in projection.METRICS:
+        columns = np.array([result[metric][f"p{p}"] for p in projection.PERCENTILES])
+        assert (np.diff(columns, axis=0) >= 0).all()
+    # Debt service can push a bad year's cash flow negative
+    assert result['cash_flow']['p5'][0] < result['cash_flow']['p95'][0]
+
+
+@pytest.mark.parametrize('args, message', [
+    ({'years': '51'}, 'years must be between 1 and 50'),
+    ({'paths': 'many'}, 'paths must be a number'),
+    ({'vacancy_pct': '-1'}, 'vacancy_pct must be between 0 and 100'),
+])
+def test_invalid_assumptions_name_the_field(args, message):
+    with pytest.raises(ValueError, match=message):
+        parse_assumptions(args)
+
+
+def test_invalid_properties_name_the_field():
+    with pytest.raises(ValueError, match='monthly_rent must be a number'):
+        parse_properties([{'monthly_rent': 'lots'}])
+    with pytest.raises(ValueError, match='property_value cannot be negative'):
+        parse_properties([{'property_value': '-1'}])
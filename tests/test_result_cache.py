@@ -0,0 +1,38 @@
+from result_cache import ResultCache, form_key
+
+
+def test_numbers_are_compared_by_value():
+    assert form_key('calculate', {'price': '250000'}) == form_key('calculate', {'price': '2.5e5'})
+    assert form_key('calculate', {'price': '250000'}) == form_key('calculate', {'price': '250000.0'})
+    assert form_key('calculate', {'price': ' 250000 '}) == form_key('calculate', {'price': '250000'})
+
+
+def test_blank_fields_stay_distinct():
+    # /calculate reads "" as 0 but rejects whitespace
+    assert form_key('calculate', {'price': ''}) != form_key('calculate', {'price': '0'})
+    assert form_key('calculate', {'price': ''}) != form_key('calculate', {'price': '  '})
+
+
+def test_text_is_compared_exactly():
+    assert form_key('calculate', {'category': 'cash_flow'}) != form_key('calculate', {'category': 'cash_flow '})
+    assert form_key('calculate', {'category': 'cash_flow'}) != form_key('calculate', {'category': 'Cash_flow'})
+
+
+def test_field_order_and_ignored_fields_do_not_matter():
+    a = form_key('calculate', {'category': 'cash_flow', 'rent_revenue': '100', 'save': '1'})
+    b = form_key('calculate', {'rent_revenue': '100', 'category': 'cash_flow'})
+    assert a == b
+
+
+def test_routes_do_not_share_keys():
+    assert form_key('calculate', {'a': '1'}) != form_key('check_credit', {'a': '1'})
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=30, ttl=60)
+    cache.set('a', 'x' * 10)
+    cache.set('b', 'y' * 10)
+    assert cache.get('a') == 'x' * 10
+    cache.set('c', 'z' * 15)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 10
@@ -0,0 +1,53 @@
+import io
+import json
+
+from scenarios import INVALID_CATEGORY, INVALID_NUMBER, NEGATIVE_VALUE, iter_results, read_scenarios
+
+SCENARIOS = [
+    {'category': 'acquisition_cost', 'purchase_price': '250000', 'closing_costs': '5000',
+     'renovation_budget': '', 'downpayment': '50000'},
+    {'category': 'cash_flow', 'rent_revenue': '24000', 'coc_return_goal': '8'},
+    {'category': 'operating_expenses', 'homeowners_insurance': '-1', 'property_tax': '4000'},
+    {'category': 'annual_growth', 'rent_growth': '-2', 'appreciation': '3', 'other_cost': 'abc'},
+    {'category': 'annual_growth', 'rent_growth': '-2', 'appreciation': '3.5', 'other_cost': ''},
+    {'category': 'roof'},
+]
+
+
+def lines(raw, **kwargs):
+    return [json.loads(line) for chunk in iter_results(raw, **kwargs) for line in chunk.splitlines()]
+
+
+def test_results_match_the_form_rules():
+    *rows, summary = lines(read_scenarios(SCENARIOS), chunk_rows=4)
+    assert [row['row'] for row in rows] == list(range(6))
+    assert rows[0]['results'] == {'acquisition_cost': {'Total Fixed Costs': 305000.0}}
+    assert rows[1]['results'] == {'cash_flow': {'Annual Cash Flow': 1920.0}}
+    assert rows[2]['errors'] == {'operating_expenses': NEGATIVE_VALUE}
+    assert rows[3]['errors'] == {'annual_growth': INVALID_NUMBER}
+    # annual_growth allows negative rates
+    assert rows[4]['results'] == {'annual_growth': {'Annual Growth Total': 1.5}}
+    assert rows[5]['errors'] == {'roof': INVALID_CATEGORY}
+    assert summary['summary']['scenarios'] == 6 and summary['summary']['rows_with_errors'] == 3
+
+
+def test_rows_without_a_category_get_every_category():
+    (row, _) = lines(read_scenarios([{'rent_revenue': '1000', 'coc_return_goal': '10'}]))
+    assert set(row['results']) == {'acquisition_cost', 'operating_expenses', 'cash_flow', 'annual_growth'}
+    assert row['results']['cash_flow'] == {'Annual Cash Flow': 100.0}
+
+
+def test_csv_upload_matches_json(client):
+    csv = "category,rent_revenue,coc_return_goal\ncash_flow,24000,8\ncash_flow,x,8\n"
+    response = client.post('/api/calculate/batch', data={'file': (io.BytesIO(csv.encode()), 'batch.csv')})
+    from_csv = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    response = client.post('/api/calculate/batch', json=[
+        {'category': 'cash_flow', 'rent_revenue': '24000', 'coc_return_goal': '8'},
+        {'category': 'cash_flow', 'rent_revenue': 'x', 'coc_return_goal': '8'}])
+    from_json = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert from_csv[:2] == from_json[:2]
+    assert from_json[1]['errors'] == {'cash_flow': INVALID_NUMBER}
+
+
+def test_batch_needs_login(app):
+    assert app.test_client().post('/api/calculate/batch', json=[]).status_code == 401
@@ -0,0 +1,49 @@
+import numpy as np
+
+from sketch import QuantileSketch
+
+
+def test_quantiles_are_within_relative_accuracy():
+    values = np.random.default_rng(0).lognormal(12, 1, 20_000)
+    sketch = QuantileSketch(1, relative_accuracy=0.01)
+    sketch.add(values)
+    for q, estimate in zip([0.1, 0.5, 0.9], sketch.quantiles([0.1, 0.5, 0.9])[0]):
+        exact = np.quantile(values, q, method='lower')
+        assert abs(estimate - exact) <= 0.02 * exact
+
+
+def test_removing_values_restores_counts():
+    rng = np.random.default_rng(1)
+    base, extra = rng.normal(0, 1_000, 500), rng.normal(0, 1_000, 100)
+    rows = rng.integers(0, 4, 100)
+    sketch, expected = QuantileSketch(4), QuantileSketch(4)
+    sketch.add(base, np.arange(500) % 4)
+    expected.add(base, np.arange(500) % 4)
+
+    sketch.add(extra, rows)
+    sketch.add(extra, rows, weight=-1)
+    assert np.array_equal(sketch.positive, expected.positive)
+    assert np.array_equal(sketch.negative, expected.negative)
+    assert np.array_equal(sketch.zero, expected.zero)
+
+
+def test_negative_store_is_allocated_only_for_negative_values():
+    sketch = QuantileSketch(3)
+    sketch.add([5.0, 0.0, 7.0], [0, 1, 2])
+    assert sketch.negative is None
+    assert sketch.quantiles([0.5]).ravel().tolist() == sketch.quantiles([0.5], [0, 1, 2]).ravel().tolist()
+
+    sketch.add([-5.0], [1])
+    assert sketch.negative is not None
+    assert sketch.count().tolist() == [1, 2, 1]
+    assert sketch.quantiles([0.0], [1])[0, 0] < 0
+
+
+def test_dict_round_trip_and_merge():
+    sketch = QuantileSketch(2)
+    sketch.add([1.0, -2.0, 30.0, 0.0], [0, 0, 1, 1])
+    loaded = QuantileSketch.from_dict(sketch.to_dict())
+    assert np.array_equal(loaded.quantiles([0.25, 0.5, 0.75]), sketch.quantiles([0.25, 0.5, 0.75]))
+
+    merged = QuantileSketch(2).merge(loaded).merge(sketch)
+    assert merged.count().tolist() == [4, 4]
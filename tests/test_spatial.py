@@ -0,0 +1,47 @@
+import numpy as np
+
+import spatial
+from spatial import PropertyIndex
+
+
+def random_index(n, seed=0, lat=(38.9, 41.4), lon=(-75.6, -73.9)):
+    rng = np.random.default_rng(seed)
+    return PropertyIndex(rng.uniform(*lat, n), rng.uniform(*lon, n), rng.uniform(1e5, 1e6, n),
+                         rng.integers(1, 6, n))
+
+
+def brute_force(index, west, south, east, north):
+    return set(np.flatnonzero((index.lat >= south) & (index.lat <= north)
+                              & (index.lon >= west) & (index.lon <= east)).tolist())
+
+
+def test_points_match_brute_force():
+    index = random_index(20_000)
+    bbox = (-74.60, 40.20, -74.50, 40.25)
+    result = index.query(*bbox, zoom=15)
+    assert result['type'] == 'points' and result['zoom'] == 15
+    assert {point['id'] for point in result['points']} == brute_force(index, *bbox)
+
+
+def test_clusters_count_every_listing_in_view():
+    index = random_index(20_000)
+    result = index.query(-180, -85, 180, 85, zoom=3)
+    assert result['type'] == 'clusters'
+    assert result['total'] == len(index)
+    assert sum(cluster['count'] for cluster in result['clusters']) == len(index)
+
+
+def test_crowded_point_query_falls_back_to_clusters():
+    index = random_index(5_000, lat=(40.0, 40.01), lon=(-74.01, -74.0))
+    result = index.query(-74.02, 39.99, -73.99, 40.02, zoom=16)
+    assert result['type'] == 'clusters' and result['zoom'] == spatial.CLUSTER_MAX_ZOOM
+    assert result['total'] == 5_000
+
+
+def test_huge_box_at_high_zoom_is_capped():
+    index = random_index(50_000, lat=(-60, 70), lon=(-170, 170))
+    result = index.query(-180, -85, 180, 85, zoom=22)
+    assert result['type'] == 'clusters'
+    assert result['zoom'] < spatial.CLUSTER_MAX_ZOOM
+    assert len(result['clusters']) <= spatial.MAX_CLUSTERS
+    assert result['total'] == len(index)
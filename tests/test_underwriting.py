@@ -0,0 +1,56 @@
+import math
+
+import numpy as np
+import pytest
+
+from amortization import monthly_payment
+from conftest import listing_frame
+from underwriting import parse_assumptions, top, underwrite
+
+
+def test_metrics_match_a_hand_calculation():
+    a = parse_assumptions({'down_payment_pct': '25', 'interest_rate': '6', 'include_closing': 'true'})
+    result = underwrite([400_000], [3], a)
+
+    loan = 400_000 * 0.75 + 400_000 * 0.03
+    payment = loan * 0.005 / (1 - 1.005 ** -360)
+    rent = 3 * 900
+    expenses = 400_000 * 0.027 / 12 + rent * 0.13
+    assert result['loan_amount'][0] == pytest.approx(loan)
+    assert result['monthly_payment'][0] == pytest.approx(payment)
+    assert result['monthly_payment'][0] == pytest.approx(monthly_payment(loan, 6, 360))
+    assert result['monthly_cash_flow'][0] == pytest.approx(rent - expenses - payment)
+    assert result['cash_on_cash'][0] == pytest.approx((rent - expenses - payment) * 12 / 100_000 * 100)
+
+
+def test_nothing_invested_has_no_cash_on_cash():
+    a = parse_assumptions({'down_payment_pct': '0', 'include_closing': '1'})
+    assert math.isnan(underwrite([300_000], [2], a)['cash_on_cash'][0])
+
+
+def test_top_puts_nan_last():
+    values = np.array([3.0, np.nan, 7.0, 1.0, 5.0])
+    assert top(values, 3).tolist() == [2, 4, 0]
+    assert top(values, 10, descending=False).tolist() == [3, 0, 4, 2, 1]
+
+
+@pytest.mark.parametrize('args', [{'interest_rate': '31'}, {'loan_term': '0'}, {'rent_per_bed': 'lots'}])
+def test_invalid_assumptions_are_rejected(args):
+    with pytest.raises(ValueError):
+        parse_assumptions(args)
+
+
+def test_api_sorts_and_sends_null_for_nan(client, listings_csv):
+    listings_csv(listing_frame(120))
+    response = client.get('/api/underwriting?sort=monthly_cash_flow&limit=5')
+    assert response.status_code == 200
+    body = response.get_json()
+    flows = [row['monthly_cash_flow'] for row in body['listings']]
+    assert body['total'] == 120 and flows == sorted(flows, reverse=True)
+
+    response = client.get('/api/underwriting?down_payment_pct=0&include_closing=1&limit=3')
+    assert 'NaN' not in response.get_data(as_text=True)
+    assert [row['cash_on_cash'] for row in response.get_json()['listings']] == [None] * 3
+
+    assert client.get('/api/underwriting?interest_rate=99').status_code == 400
+    assert client.get('/api/underwriting?sort=price').status_code == 400
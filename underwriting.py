@@ -0,0 +1,106 @@
+"""
+Portfolio-wide underwriting over every cleaned listing.
+
+Applies one set of investment assumptions to all listings at once (loan
+amount, monthly payment, operating expenses, cash flow and cash-on-cash
+return) as array expressions over the columnar cache, using the
+annuity math in amortization.py.
+"""
+
+import numpy as np
+
+from amortization import monthly_payment
+
+# name: (default, minimum, maximum)
+ASSUMPTIONS = {
+    'down_payment_pct': (20.0, 0.0, 100.0),
+    'interest_rate': (7.0, 0.0, 30.0),          # annual %, like the sidebar
+    'loan_term': (30.0, 1.0, 50.0),             # years
+    'closing_cost_pct': (3.0, 0.0, 20.0),       # of purchase price
+    'renovation_budget': (0.0, 0.0, 1e9),       # flat, per property
+    'include_closing': (0.0, 0.0, 1.0),         # roll closing costs into the loan
+    'include_renovation': (0.0, 0.0, 1.0),      # roll the renovation budget into the loan
+    'rent_per_bed': (900.0, 0.0, 1e6),          # monthly rent per bedroom
+    'property_tax_pct': (2.2, 0.0, 20.0),       # annual, of purchase price
+    'insurance_pct': (0.5, 0.0, 20.0),          # annual, of purchase price
+    'vacancy_pct': (5.0, 0.0, 100.0),           # of rent
+    'maintenance_pct': (8.0, 0.0, 100.0),       # of rent
+    'other_monthly': (0.0, 0.0, 1e6),
+}
+
+METRICS = ['loan_amount', 'monthly_payment', 'monthly_rent', 'operating_expenses',
+           'monthly_cash_flow', 'annual_cash_flow', 'cash_invested', 'cash_on_cash']
+
+
+def parse_assumptions(args):
+    """Read assumptions from a mapping of strings, falling back to defaults.
+
+    Raises ``ValueError`` naming the first invalid or out-of-range value.
+    """
+    assumptions = {}
+    for name, (default, low, high) in ASSUMPTIONS.items():
+        raw = args.get(name)
+        if raw in (None, ''):
+            assumptions[name] = default
+            continue
+        if str(raw).lower() in ('true', 'on'):
+            raw = 1
+        elif str(raw).lower() in ('false', 'off'):
+            raw = 0
+        value = float(raw)
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low:g} and {high:g}")
+        assumptions[name] = value
+    return assumptions
+
+
+def underwrite(price, beds, assumptions):
+    """Investment metrics for every listing, as a dict of arrays."""
+    a = assumptions
+    price = np.asarray(price, dtype=float)
+    beds = np.asarray(beds, dtype=float)
+
+    down_payment = price * a['down_payment_pct'] / 100
+    closing = price * a['closing_cost_pct'] / 100
+    renovation = np.full_like(price, a['renovation_budget'])
+    rolled = closing * a['include_closing'] + renovation * a['include_renovation']
+
+    loan_amount = np.maximum(price + rolled - down_payment, 0)
+    payment = monthly_payment(loan_amount, a['interest_rate'], round(a['loan_term'] * 12))
+
+    rent = beds * a['rent_per_bed']
+    expenses = (price * (a['property_tax_pct'] + a['insurance_pct']) / 100 / 12
+                + rent * (a['vacancy_pct'] + a['maintenance_pct']) / 100
+                + a['other_monthly'])
+    cash_flow = rent - expenses - payment
+
+    cash_invested = (down_payment + closing * (1 - a['include_closing'])
+                     + renovation * (1 - a['include_renovation']))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coc = np.where(cash_invested > 0, cash_flow * 12 / cash_invested * 100, np.nan)
+
+    return {
+        'loan_amount': loan_amount,
+        'monthly_payment': payment,
+        'monthly_rent': rent,
+        'operating_expenses': expenses,
+        'monthly_cash_flow': cash_flow,
+        'annual_cash_flow': cash_flow * 12,
+        'cash_invested': cash_invested,
+        'cash_on_cash': coc,
+    }
+
+
+def top(values, n, descending=True):
+    """Indices of the ``n`` best values (NaNs last), best first.
+
+    Uses ``argpartition`` so only the selected rows are fully sorted.
+    """
+    values = np.asarray(values, dtype=float)
+    keys = -values if descending else values.copy()
+    keys[np.isnan(keys)] = np.inf
+    n = min(n, len(keys))
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    chosen = np.argpartition(keys, n - 1)[:n] if n < len(keys) else np.arange(len(keys))
+    return chosen[np.argsort(keys[chosen], kind='stable')]